@@ -9,11 +9,12 @@ openpyxl
 pyyaml
 """
 
+import sys
 import yaml
-import os
+import argparse
 from typing import Dict, Any
 
-from src.core.workflow import execute_comparison_workflow, execute_historical_workflow
+# 各子命令只在执行时导入所需模块：配置检查不导入 pandas，离线模式不导入 openai
 
 def load_config(path: str = 'config.yaml') -> Dict[str, Any]:
     """加载YAML配置文件。"""
@@ -27,55 +28,165 @@ def load_config(path: str = 'config.yaml') -> Dict[str, Any]:
         print(f"❌ 加载配置文件失败: {e}")
         return {}
 
-def main():
-    """项目主入口函数。"""
-    # 1. 加载配置
-    config = load_config()
+def _load_tasks(config_path: str):
+    """加载配置并准备分析任务列表；失败时返回 (None, None)。"""
+    from src.core.tasks import build_analysis_tasks
+
+    config = load_config(config_path)
     if not config:
         print("🔴 无法加载配置，程序终止")
-        return
-
-    # 2. 根据配置准备分析任务列表
-    analysis_tasks = []
-    mode = config.get('active_mode', 'FILES')
-
-    print("--- 配置检查 ---")
-    if mode == 'FILES':
-        files_to_compare = config.get('data_sources', {}).get('files', [])
-        print(f"ℹ️ 模式: 【文件对比】")
-        print(f"📚 文件列表: {', '.join([os.path.basename(f) for f in files_to_compare])}")
-        analysis_tasks = [{'file': f} for f in files_to_compare]
-    elif mode == 'SHEETS':
-        sheets_config = config.get('data_sources', {}).get('sheets_config', {})
-        file_path = sheets_config.get('file_path')
-        sheet_names = sheets_config.get('sheet_names')
-        if file_path and sheet_names:
-            print(f"ℹ️ 模式: 【工作表对比】")
-            print(f"📂 文件: {os.path.basename(file_path)}")
-            print(f"📑 工作表顺序: {', '.join(sheet_names)}")
-            analysis_tasks = [{'file': file_path, 'sheet': s} for s in sheet_names]
-        else:
-            print("❌ 'SHEETS' 模式配置不完整。")
-    else:
-        print(f"❌ 未知的对比模式: '{mode}'。")
-    print("------------------\n")
+        return None, None
+    return config, build_analysis_tasks(config)
+
+def _sample_fraction(value: str) -> float:
+    """解析 --sample 的抽样比例，必须在 (0, 1] 之间。"""
+    try:
+        fraction = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"抽样比例必须为数值: {value}")
+    if not 0 < fraction <= 1:
+        raise argparse.ArgumentTypeError(f"抽样比例必须在 (0, 1] 之间: {value}")
+    return fraction
 
+def run_command(args) -> bool:
+    """按配置执行对比或追溯分析。"""
+    config, analysis_tasks = _load_tasks(args.config)
+    if not config:
+        return False
     if not analysis_tasks:
         print("🔴 未执行分析，因为没有有效的分析任务。请检查您的配置。")
-        return
+        return False
+    if args.offline:
+        config.setdefault('llm', {})['enabled'] = False
+    if args.profile:
+        config.setdefault('metrics', {})['profile'] = True
+    if args.sample is not None or args.escalate:
+        # --escalate 隐含抽样预估；--sample 不带比例时使用 sampling.fraction
+        sampling_config = config.setdefault('sampling', {})
+        sampling_config['enabled'] = True
+        if isinstance(args.sample, float):
+            sampling_config['fraction'] = args.sample
+        if args.escalate:
+            sampling_config['escalate'] = True
+
+    from src.core.workflow import execute_analysis
+    return execute_analysis(analysis_tasks, config)
+
+def check_command(args) -> bool:
+    """检查配置和数据源是否可用，不读取数据，也不连接大模型服务。"""
+    from src.core.tasks import validate_config
+
+    config, analysis_tasks = _load_tasks(args.config)
+    if not config:
+        return False
+    if args.offline:
+        config.setdefault('llm', {})['enabled'] = False
+    problems = validate_config(config, analysis_tasks)
+    for problem in problems:
+        print(f"❌ {problem}")
+    if not problems:
+        print(f"✅ 配置检查通过，共 {len(analysis_tasks)} 个数据源。")
+    return not problems
+
+def batch_command(args) -> bool:
+    """按YAML任务清单批量执行多个分析任务。"""
+    from src.core.batch import run_batch
+
+    results = run_batch(args.manifest)
+    return all(r['status'] == '成功' for r in results)
+
+def serve_command(args) -> bool:
+    """以常驻服务模式启动。"""
+    from src.core.daemon import serve
+
+    serve(args.config, port=args.port)
+    return True
+
+def watch_command(args) -> bool:
+    """监视数据目录，新版本文件到达后执行增量对比与追溯。"""
+    config = load_config(args.config)
+    if not config:
+        print("🔴 无法加载配置，程序终止")
+        return False
+    if args.offline:
+        config.setdefault('llm', {})['enabled'] = False
+
+    from src.core.watch import watch
+    watch(config)
+    return True
+
+def bench_command(args) -> bool:
+    """运行性能基准套件并与基线对比。"""
+    from src.benchmark.suite import run_benchmarks
+
+    overrides = {
+        'rows': args.rows, 'versions': args.versions, 'change_rate': args.change_rate,
+        'add_rate': args.add_rate, 'delete_rate': args.delete_rate, 'mixed_rate': args.mixed_rate, 'seed': args.seed,
+    }
+    return run_benchmarks(
+        args.scenarios, overrides, args.baseline, args.save_baseline,
+        max_excel_rows=args.max_excel_rows, time_tolerance=args.tolerance,
+    )
+
+def main():
+    """项目主入口函数。不指定子命令时等同于 `run`。"""
+    parser = argparse.ArgumentParser(description='数据质量对比与追溯分析')
+    parser.add_argument('--config', default='config.yaml', help='配置文件路径（默认: config.yaml）')
+    subparsers = parser.add_subparsers(dest='command', metavar='命令')
+
+    run_parser = subparsers.add_parser('run', help='按配置执行对比或追溯分析（默认）')
+    run_parser.add_argument(
+        '--offline', action='store_true', help='离线模式：只保存差异明细/追溯轨迹表和Prompt，不请求大模型'
+    )
+    run_parser.add_argument('--profile', action='store_true', help='同时保存 cProfile 性能剖析文件')
+    run_parser.add_argument(
+        '--sample', type=_sample_fraction, nargs='?', const=True, metavar='FRACTION',
+        help='抽样快速预估：按关键键哈希抽取部分记录并输出预估变更数（默认比例见 sampling.fraction）'
+    )
+    run_parser.add_argument(
+        '--escalate', action='store_true',
+        help='抽样预估（隐含 --sample）的变更数达到 sampling.escalate_threshold 时继续执行完整分析'
+    )
+    run_parser.set_defaults(handler=run_command)
+
+    check_parser = subparsers.add_parser('check', help='检查配置和数据源，不读取数据')
+    check_parser.add_argument('--offline', action='store_true', help='按离线模式检查，不检查大模型相关配置')
+    check_parser.set_defaults(handler=check_command)
+
+    batch_parser = subparsers.add_parser('batch', help='按YAML任务清单批量执行多个分析任务')
+    batch_parser.add_argument('manifest', help='任务清单文件路径，格式见 batch.yaml')
+    batch_parser.set_defaults(handler=batch_command)
+
+    serve_parser = subparsers.add_parser('serve', help='以常驻服务模式启动，在本机HTTP端口上提供分析接口')
+    serve_parser.add_argument('--port', type=int, help='监听端口，默认使用配置中的 daemon.port')
+    serve_parser.set_defaults(handler=serve_command)
+
+    watch_parser = subparsers.add_parser('watch', help='监视数据目录，新版本文件到达后自动执行增量对比与追溯')
+    watch_parser.add_argument(
+        '--offline', action='store_true', help='离线模式：只保存差异明细/追溯轨迹表和Prompt，不请求大模型'
+    )
+    watch_parser.set_defaults(handler=watch_command)
 
-    # 3. 根据任务数量选择并执行相应的工作流
-    num_tasks = len(analysis_tasks)
-    if num_tasks < 2:
-        print("❌ 错误：至少需要提供两个数据源才能进行分析。")
-        return
+    bench_parser = subparsers.add_parser('bench', help='使用合成数据运行性能基准，并与保存的基线对比')
+    bench_parser.add_argument('scenarios', nargs='*', help='场景名：smoke（默认）、small、many_versions、medium、large')
+    bench_parser.add_argument('--rows', type=int, help='首个版本的行数（覆盖场景默认值）')
+    bench_parser.add_argument('--versions', type=int, help='版本数（覆盖场景默认值）')
+    bench_parser.add_argument('--change-rate', type=float, help='每个版本被修改的记录比例')
+    bench_parser.add_argument('--add-rate', type=float, help='每个版本新增的记录比例')
+    bench_parser.add_argument('--delete-rate', type=float, help='每个版本删除的记录比例')
+    bench_parser.add_argument('--mixed-rate', type=float, help='以不同文本形式或非数值出现的电量单元格比例')
+    bench_parser.add_argument('--seed', type=int, help='随机种子')
+    bench_parser.add_argument('--baseline', default='./benchmarks/baseline.json', help='基线文件路径')
+    bench_parser.add_argument('--save-baseline', action='store_true', help='将本次结果保存为基线')
+    bench_parser.add_argument('--tolerance', type=float, default=0.25, help='耗时回归的相对容差（默认: 0.25）')
+    bench_parser.add_argument('--max-excel-rows', type=int, default=100_000,
+                              help='行数不超过该值时才测量Excel读取阶段（默认: 100000）')
+    bench_parser.set_defaults(handler=bench_command)
 
-    if num_tasks == 2:
-        print(f"\n🚀 检测到 {num_tasks} 个数据源，已启动【双版本高精度比对分析】工作流...")
-        execute_comparison_workflow(analysis_tasks, config)
-    else:
-        print(f"\n🚀 检测到 {num_tasks} 个数据源，已启动【多版本历史追溯分析】工作流...")
-        execute_historical_workflow(analysis_tasks, config)
+    args = parser.parse_args()
+    if args.command is None:
+        args = parser.parse_args(sys.argv[1:] + ['run'])
+    sys.exit(0 if args.handler(args) else 1)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -1,85 +1,626 @@
 # -*- coding: utf-8 -*-
 
+import numpy as np
 import pandas as pd
-from typing import List, Optional
+from dataclasses import dataclass, field, replace
+from typing import Dict, Iterator, List, Optional, Tuple
 
-def _are_series_equal(s1: pd.Series, s2: pd.Series) -> pd.Series:
+from src.data.keys import KEY_CODE_COLUMN, KeyIndex, warn_duplicate_keys
+from src.data.schema import format_numeric_text, to_float_array
+from src.utils.file_handler import merge_sorted_runs
+
+# 变更类型常量
+CHANGE_ADDED = '新增'
+CHANGE_DELETED = '删除'
+CHANGE_MODIFIED = '修改'
+CHANGE_KINDS = [CHANGE_ADDED, CHANGE_DELETED, CHANGE_MODIFIED]
+
+# 长表格式中非关键列的列名
+COL_NAME = '列'
+COL_OLD = '旧值'
+COL_NEW = '新值'
+COL_KIND = '变更类型'
+
+# 渲染文本报告和导出结构化明细时每块处理的变更条数
+DEFAULT_RENDER_CHUNK_SIZE = 200_000
+
+
+def format_summary_line(added_count: int, deleted_count: int, modified_count: int) -> str:
+    """生成统一格式的“对比摘要”文本。"""
+    return f"对比摘要：【新增】{added_count}条，【删除】{deleted_count}条，【修改】{modified_count}条。"
+
+
+@dataclass
+class DiffResult:
+    """
+    结构化的双版本差异结果。
+
+    所有变更以长表格式保存在 `changes` 中，每行对应一处变更：
+    关键列 + '列' + '旧值' + '新值' + '变更类型'。
+    新增/删除记录的 '列'、'旧值'、'新值' 为空。
+    若提供了 `key_index`，长表中以整数复合键列 `_key_code` 代替关键列，关键列取值在访问 `keys` 时才解码。
+    文本报告仅在调用 `render()` / `str()` 时才生成；超大结果可用 `iter_lines()` / `iter_frames()` 分块流式输出。
+    """
+    key_columns: List[str]
+    changes: pd.DataFrame
+    added_count: int = 0
+    deleted_count: int = 0
+    modified_count: int = 0
+    hist_name: str = '历史版本'
+    latest_name: str = '最新版本'
+    value_columns: List[str] = field(default_factory=list)
+    key_index: Optional[KeyIndex] = None
+
+    @property
+    def keys(self) -> pd.DataFrame:
+        if self.key_index is not None:
+            return self.key_index.decode(self.changes[KEY_CODE_COLUMN], index=self.changes.index)
+        return self.changes[self.key_columns]
+
+    @property
+    def column(self) -> pd.Series:
+        return self.changes[COL_NAME]
+
+    @property
+    def old_value(self) -> pd.Series:
+        return self.changes[COL_OLD]
+
+    @property
+    def new_value(self) -> pd.Series:
+        return self.changes[COL_NEW]
+
+    @property
+    def kind(self) -> pd.Series:
+        return self.changes[COL_KIND]
+
+    @property
+    def modifications(self) -> pd.DataFrame:
+        return self.changes[self.changes[COL_KIND] == CHANGE_MODIFIED]
+
+    @property
+    def column_counts(self) -> Dict[str, int]:
+        """每个被检查列的【修改】单元格数量。"""
+        counts = self.modifications[COL_NAME].value_counts()
+        return {col: int(counts.get(col, 0)) for col in self.value_columns}
+
+    @property
+    def has_changes(self) -> bool:
+        return not self.changes.empty
+
+    @property
+    def summary_line(self) -> str:
+        return format_summary_line(self.added_count, self.deleted_count, self.modified_count)
+
+    def subset(self, mask) -> 'DiffResult':
+        """按布尔掩码截取部分变更，并重新统计新增、删除和修改（按唯一键计）的数量。"""
+        changes = self.changes[np.asarray(mask, dtype=bool)].reset_index(drop=True)
+        kind = changes[COL_KIND]
+        key_cols = [KEY_CODE_COLUMN] if self.key_index is not None else self.key_columns
+        return replace(
+            self,
+            changes=changes,
+            added_count=int((kind == CHANGE_ADDED).sum()),
+            deleted_count=int((kind == CHANGE_DELETED).sum()),
+            modified_count=len(changes.loc[kind == CHANGE_MODIFIED, key_cols].drop_duplicates()),
+        )
+
+    def decode_keys(self, start: int = 0, stop: Optional[int] = None) -> pd.DataFrame:
+        """解码第 start 至 stop 条变更的关键列。"""
+        changes = self.changes.iloc[start:stop]
+        if self.key_index is not None:
+            return self.key_index.decode(changes[KEY_CODE_COLUMN], index=changes.index)
+        return changes[self.key_columns]
+
+    def to_frame(self) -> pd.DataFrame:
+        """返回关键列已解码的变更长表（关键列 + '列' + '旧值' + '新值' + '变更类型'），用于导出。"""
+        detail = self.changes[[COL_NAME, COL_OLD, COL_NEW, COL_KIND]]
+        return pd.concat([self.keys, detail], axis=1).reset_index(drop=True)
+
+    def iter_frames(self, chunk_size: int = DEFAULT_RENDER_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+        """分块产出 `to_frame()` 的内容，每块只解码本块的关键列；没有变更时产出一个只有列结构的空表。"""
+        for start in range(0, max(len(self.changes), 1), chunk_size):
+            stop = start + chunk_size
+            detail = self.changes[[COL_NAME, COL_OLD, COL_NEW, COL_KIND]].iloc[start:stop]
+            yield pd.concat([self.decode_keys(start, stop), detail], axis=1).reset_index(drop=True)
+
+    def iter_lines(
+        self, chunk_size: int = DEFAULT_RENDER_CHUNK_SIZE, max_lines_in_memory: Optional[int] = None
+    ) -> Iterator[str]:
+        """
+        按排序后的顺序逐行产出详细变更记录。
+        每块变更分别渲染并排序后再多路归并；累积的行数超过 `max_lines_in_memory` 时先写入临时文件。
+        """
+        yield from merge_sorted_runs(_iter_sorted_runs(self, chunk_size), max_lines_in_memory)
+
+    def render(self) -> str:
+        return render_diff_report(self)
+
+    def __str__(self) -> str:
+        return self.render()
+
+
+def _is_numeric_column(s: pd.Series) -> bool:
+    return pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s)
+
+
+def _are_series_equal(s1: pd.Series, s2: pd.Series, tolerance: float = 0.0) -> pd.Series:
     """
     比较两个Series，尝试将其转换为数值进行比较，如果无法转换则作为字符串比较。
     这样可以避免数值与字符串形式的数值被误判为不同。
     例如 '123' 和 123 应该被认为是相等的。
     避免了传统比较方式的缺陷（比如把所有东西转成字符串后，100 和 100.0 可能会被误判为不相等）
+    完全相同的字符串始终视为相等（避免数值列中两个相同的非数值单元格因 NaN != NaN 被误判为修改）。
+    两侧均已是数值列（见 `src.data.schema`）时直接比较数值，两侧均为空视为相等。
+    `tolerance` 为数值比较的绝对容差，差值不超过该值时视为相等。
     """
+    if _is_numeric_column(s1) and _is_numeric_column(s2):
+        v1, v2 = s1.to_numpy(), s2.to_numpy()
+        equal = v1 == v2
+        if v1.dtype.kind == 'f' or v2.dtype.kind == 'f':
+            equal |= pd.isna(v1) & pd.isna(v2)
+        if tolerance:
+            with np.errstate(invalid='ignore'):
+                equal |= np.abs(v1.astype(float) - v2.astype(float)) <= tolerance
+        return pd.Series(equal, index=s1.index)
+
+    # 仅一侧为数值列时，先将其还原为读取时的文本
+    if _is_numeric_column(s1):
+        s1 = pd.Series(format_numeric_text(s1.to_numpy()), index=s1.index)
+    if _is_numeric_column(s2):
+        s2 = pd.Series(format_numeric_text(s2.to_numpy()), index=s2.index)
+
+    s1_str = s1.astype(str)
+    s2_str = s2.astype(str)
     s1_numeric = pd.to_numeric(s1, errors='coerce')
     s2_numeric = pd.to_numeric(s2, errors='coerce')
 
     if s1_numeric.isnull().all() or s2_numeric.isnull().all():
-        return s1.astype(str) == s2.astype(str)
+        return s1_str == s2_str
+    elif tolerance:
+        return ((s1_numeric - s2_numeric).abs() <= tolerance) | (s1_str == s2_str)
     else:
-        return s1_numeric == s2_numeric
+        return (s1_numeric == s2_numeric) | (s1_str == s2_str)
 
 
-def generate_precise_diff_report(
+def _cell_text(s: pd.Series, positions: np.ndarray) -> np.ndarray:
+    """取出指定位置的单元格值用于变更长表；数值列还原为读取时的文本形式。"""
+    if _is_numeric_column(s):
+        return format_numeric_text(s.to_numpy()[positions])
+    return s.to_numpy(dtype=object)[positions]
+
+
+def _build_changes_columns(
+    keys: pd.DataFrame, key_columns: List[str], column, old_values, new_values, kind: str
+) -> Dict[str, np.ndarray]:
+    """将一组变更组装为长表各列的数组（列式构造，不逐行创建对象）。"""
+    n = len(keys)
+    columns = {col: keys[col].to_numpy() for col in key_columns}
+    columns[COL_NAME] = np.full(n, column, dtype=object)
+    columns[COL_OLD] = old_values if old_values is not None else np.full(n, None, dtype=object)
+    columns[COL_NEW] = new_values if new_values is not None else np.full(n, None, dtype=object)
+    columns[COL_KIND] = np.full(n, kind, dtype=object)
+    return columns
+
+
+def _change_columns(key_columns: List[str]) -> List[str]:
+    return list(key_columns) + [COL_NAME, COL_OLD, COL_NEW, COL_KIND]
+
+
+def _assemble_changes(pieces: List[Dict[str, np.ndarray]], key_columns: List[str]) -> pd.DataFrame:
+    """将各变更片段的列数组拼接为长表，'变更类型' 列使用分类类型。"""
+    changes = pd.DataFrame({
+        col: np.concatenate([piece[col] for piece in pieces]) if pieces else np.empty(0, dtype=object)
+        for col in _change_columns(key_columns)
+    })
+    changes[COL_KIND] = pd.Categorical(changes[COL_KIND], categories=CHANGE_KINDS)
+    return changes
+
+
+def _hash_column(values: pd.Series) -> np.ndarray:
+    """逐行计算单列的64位哈希；分类列只对类别计算哈希，结果与对展开后的取值计算一致。"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        categories = np.append(values.cat.categories.to_numpy(dtype=object), np.nan)
+        # 缺失值的编码为-1，恰好取到追加在末尾的NaN
+        return pd.util.hash_array(categories)[values.cat.codes.to_numpy()]
+    return pd.util.hash_array(values.to_numpy())
+
+
+def _hash_rows(df: pd.DataFrame, columns: List[str], seed: Optional[np.ndarray] = None) -> np.ndarray:
+    """对指定列（按给定顺序）逐行计算64位哈希，可在已有行哈希 `seed` 的基础上继续累加。"""
+    row_hash = np.zeros(len(df), dtype=np.uint64) if seed is None else seed.copy()
+    for col in columns:
+        row_hash *= np.uint64(0x100000001B3)
+        row_hash ^= _hash_column(df[col])
+    return row_hash
+
+
+def _prefilter_identical_rows(
+    df_hist: pd.DataFrame, df_latest: pd.DataFrame, key_columns: List[str], value_cols: List[str]
+):
+    """
+    行哈希预过滤：剔除关键列与被检查列在两个版本中完全相同的记录，只保留新增、删除和修改的候选行。
+
+    Returns:
+        None 表示两个版本的内容完全一致；否则返回过滤后的 (df_hist, df_latest)。
+        存在重复关键键或被检查列缺失时不做过滤，原样返回。
+    """
+    hashed_cols = list(key_columns) + list(value_cols)
+    if not set(hashed_cols) <= set(df_hist.columns) or not set(hashed_cols) <= set(df_latest.columns):
+        return df_hist, df_latest
+
+    hist_keys = _hash_rows(df_hist, key_columns)
+    latest_keys = _hash_rows(df_latest, key_columns)
+    if pd.Index(hist_keys).has_duplicates or pd.Index(latest_keys).has_duplicates:
+        return df_hist, df_latest
+
+    hist_rows = _hash_rows(df_hist, value_cols, seed=hist_keys)
+    latest_rows = _hash_rows(df_latest, value_cols, seed=latest_keys)
+
+    # 整体指纹：行哈希的多重集合一致即视为两个版本完全相同
+    if len(hist_rows) == len(latest_rows) and np.array_equal(np.sort(hist_rows), np.sort(latest_rows)):
+        return None
+
+    hist_keep = ~pd.Index(hist_rows).isin(latest_rows)
+    latest_keep = ~pd.Index(latest_rows).isin(hist_rows)
+    return df_hist[hist_keep], df_latest[latest_keep]
+
+
+def compute_diff(
     df_hist: pd.DataFrame,
     df_latest: pd.DataFrame,
     key_columns: List[str],
     hist_name: str = '历史版本',
     latest_name: str = '最新版本',
-    # --- 新增参数 ---
-    # 允许调用者指定只检查哪些列。如果为None，则检查所有非关键列。
-    columns_to_check: Optional[List[str]] = None
-) -> str:
+    columns_to_check: Optional[List[str]] = None,
+    key_index: Optional[KeyIndex] = None,
+    tolerances: Optional[Dict[str, float]] = None
+) -> DiffResult:
     """
-    生成高精度的人类可读的数据差异项，对比两个DataFrame。
+    向量化的差异计算引擎：一次外连接后，按列以布尔掩码批量提取所有新增、删除和修改的单元格。
+    两个版本都带有共享编码的 `_key_code` 列且提供了 `key_index` 时，合并与去重均在整数复合键上进行。
+    `tolerances` 为各列的数值比较容差（列名 -> 绝对容差）。
     """
-    hist = df_hist.copy()
-    latest = df_latest.copy()
+    use_codes = key_index is not None and KEY_CODE_COLUMN in df_hist.columns and KEY_CODE_COLUMN in df_latest.columns
+    join_keys = [KEY_CODE_COLUMN] if use_codes else list(key_columns)
+    if not use_codes:
+        key_index = None
 
-    # --- 逻辑修改 ---
     # 如果未指定检查列，则默认检查所有非关键列
     if columns_to_check is None:
-        value_cols = sorted([col for col in df_hist.columns if col not in key_columns])
+        value_cols = sorted([col for col in df_hist.columns if col not in key_columns and col != KEY_CODE_COLUMN])
     else:
-        value_cols = columns_to_check
+        value_cols = list(columns_to_check)
+
+    prefiltered = _prefilter_identical_rows(df_hist, df_latest, join_keys, value_cols)
+    if prefiltered is None:
+        # 两个版本完全一致，无需合并即可得出“无变更”
+        return DiffResult(
+            key_columns=list(key_columns),
+            changes=_assemble_changes([], join_keys),
+            hist_name=hist_name,
+            latest_name=latest_name,
+            value_columns=value_cols,
+            key_index=key_index,
+        )
+    df_hist, df_latest = prefiltered
+    if use_codes:
+        # 关键列由复合键代表，不参与合并
+        df_hist = df_hist[[col for col in df_hist.columns if col not in key_columns]]
+        df_latest = df_latest[[col for col in df_latest.columns if col not in key_columns]]
 
     merged_df = pd.merge(
-        hist, latest, on=key_columns, how='outer', suffixes=('_hist', '_latest'), indicator=True
+        df_hist, df_latest, on=join_keys, how='outer', suffixes=('_hist', '_latest'), indicator=True
     )
+    merge_flag = merged_df['_merge'].to_numpy()
 
-    log_entries = []
+    deleted_keys = merged_df.loc[merge_flag == 'left_only', join_keys]
+    added_keys = merged_df.loc[merge_flag == 'right_only', join_keys]
+    both_df = merged_df.loc[merge_flag == 'both']
 
-    deleted_rows = merged_df[merged_df['_merge'] == 'left_only']
-    for _, row in deleted_rows.iterrows():
-        key_str = ", ".join([f"{col}: '{row[col]}'" for col in key_columns])
-        log_entries.append(f"【删除】源于 {hist_name} 的记录被删除。唯一键: [{key_str}]")
+    pieces = [
+        _build_changes_columns(deleted_keys, join_keys, None, None, None, CHANGE_DELETED),
+        _build_changes_columns(added_keys, join_keys, None, None, None, CHANGE_ADDED),
+    ]
 
-    added_rows = merged_df[merged_df['_merge'] == 'right_only']
-    for _, row in added_rows.iterrows():
-        key_str = ", ".join([f"{col}: '{row[col]}'" for col in key_columns])
-        log_entries.append(f"【新增】在 {latest_name} 发现新记录。唯一键: [{key_str}]")
-
-    both_df = merged_df[merged_df['_merge'] == 'both'].copy()
-    modified_keys = set()
-
-    # 现在的 value_cols 可能是所有非关键列，也可能是指定的列
+    both_keys = both_df[join_keys]
+    modified_rows = np.zeros(len(both_df), dtype=bool)
     for col in value_cols:
         col_hist, col_latest = f'{col}_hist', f'{col}_latest'
+        diff_mask = ~_are_series_equal(
+            both_df[col_hist], both_df[col_latest], (tolerances or {}).get(col, 0.0)
+        ).to_numpy()
+        if not diff_mask.any():
+            continue
+        modified_rows |= diff_mask
+        positions = np.flatnonzero(diff_mask)
+        pieces.append(_build_changes_columns(
+            both_keys.iloc[positions], join_keys, col,
+            _cell_text(both_df[col_hist], positions),
+            _cell_text(both_df[col_latest], positions),
+            CHANGE_MODIFIED
+        ))
+
+    changes = _assemble_changes(pieces, join_keys)
+
+    modified_count = len(both_keys[modified_rows].drop_duplicates())
+
+    return DiffResult(
+        key_columns=list(key_columns),
+        changes=changes,
+        added_count=len(added_keys),
+        deleted_count=len(deleted_keys),
+        modified_count=modified_count,
+        hist_name=hist_name,
+        latest_name=latest_name,
+        value_columns=value_cols,
+        key_index=key_index,
+    )
+
 
-        are_equal = _are_series_equal(both_df[col_hist], both_df[col_latest])
-        diff_mask = ~are_equal
+@dataclass
+class NWayDiffResult:
+    """
+    多版本一次对齐后的差异结构。
+
+    所有版本按关键键只对齐一次：`keys` 为全部唯一键（按关键列排序；提供 `key_index` 时为 `_key_code`），
+    `positions[i, j]` 为第i个键在第j个版本中的行号（不存在时为-1）。
+    相邻版本的全列差异 `steps`、任意两个版本的比对（如首尾摘要）和历史追溯所需的“键 × 版本”矩阵
+    均由该结构直接得出，不再逐对合并。同一版本内的重复键以最后一行为准。
+    """
+    key_columns: List[str]
+    version_names: List[str]
+    frames: List[pd.DataFrame]
+    keys: pd.DataFrame
+    positions: np.ndarray
+    steps: List[DiffResult] = field(default_factory=list)
+    key_index: Optional[KeyIndex] = None
+    tolerances: Dict[str, float] = field(default_factory=dict)
+    # 各版本按 `hashed_columns`（所有版本共有的非关键列）计算的行哈希，用于跳过内容完全相同的行
+    row_hashes: Optional[List[np.ndarray]] = field(default=None, repr=False)
+    hashed_columns: List[str] = field(default_factory=list, repr=False)
 
-        changed_df = both_df[diff_mask]
+    @property
+    def present(self) -> np.ndarray:
+        return self.positions >= 0
 
-        for _, row in changed_df.iterrows():
-            key_tuple = tuple(row[k] for k in key_columns)
-            modified_keys.add(key_tuple)
+    @property
+    def join_keys(self) -> List[str]:
+        return [KEY_CODE_COLUMN] if self.key_index is not None else list(self.key_columns)
 
-            key_str = ", ".join([f"{k}: '{v}'" for k, v in zip(key_columns, key_tuple)])
-            log_entries.append(
-                f"【修改】唯一键: [{key_str}] | 列 '{col}': 值从 '{row[col_hist]}' 变为 '{row[col_latest]}'"
+    def compare(self, i: int, j: int, columns_to_check: Optional[List[str]] = None) -> DiffResult:
+        """
+        基于对齐结构比对第i与第j个版本，结果与对这两个版本调用 `compute_diff` 一致。
+        未指定 `columns_to_check` 时检查两个版本共有的所有非关键列。
+        """
+        df_old, df_new = self.frames[i], self.frames[j]
+        if columns_to_check is None:
+            value_cols = sorted(
+                col for col in df_old.columns
+                if col in df_new.columns and col not in self.key_columns and col != KEY_CODE_COLUMN
             )
+        else:
+            value_cols = list(columns_to_check)
+
+        old_pos, new_pos = self.positions[:, i], self.positions[:, j]
+        in_old, in_new = old_pos >= 0, new_pos >= 0
+        deleted = np.flatnonzero(in_old & ~in_new)
+        added = np.flatnonzero(~in_old & in_new)
+        both = np.flatnonzero(in_old & in_new)
+        if self.row_hashes is not None and set(value_cols) <= set(self.hashed_columns):
+            # 所有非关键列都相同的行不可能有被检查列的变更
+            both = both[self.row_hashes[i][old_pos[both]] != self.row_hashes[j][new_pos[both]]]
+
+        join_keys = self.join_keys
+        pieces = [
+            _build_changes_columns(self.keys.iloc[deleted], join_keys, None, None, None, CHANGE_DELETED),
+            _build_changes_columns(self.keys.iloc[added], join_keys, None, None, None, CHANGE_ADDED),
+        ]
+        modified_rows = np.zeros(len(both), dtype=bool)
+        for col in value_cols:
+            old_values = df_old[col].iloc[old_pos[both]].reset_index(drop=True)
+            new_values = df_new[col].iloc[new_pos[both]].reset_index(drop=True)
+            diff_mask = ~_are_series_equal(old_values, new_values, self.tolerances.get(col, 0.0)).to_numpy()
+            if not diff_mask.any():
+                continue
+            modified_rows |= diff_mask
+            changed = np.flatnonzero(diff_mask)
+            pieces.append(_build_changes_columns(
+                self.keys.iloc[both[changed]], join_keys, col,
+                _cell_text(old_values, changed), _cell_text(new_values, changed), CHANGE_MODIFIED
+            ))
+
+        return DiffResult(
+            key_columns=list(self.key_columns),
+            changes=_assemble_changes(pieces, join_keys),
+            added_count=len(added),
+            deleted_count=len(deleted),
+            modified_count=int(modified_rows.sum()),
+            hist_name=self.version_names[i],
+            latest_name=self.version_names[j],
+            value_columns=value_cols,
+            key_index=self.key_index,
+        )
+
+    def summary_line(self, columns_to_check: Optional[List[str]] = None) -> str:
+        """首尾版本的“对比摘要”。"""
+        return self.compare(0, len(self.frames) - 1, columns_to_check).summary_line
 
-    summary = f"对比摘要：【新增】{len(added_rows)}条，【删除】{len(deleted_rows)}条，【修改】{len(modified_keys)}条。"
-    details = "\n".join(sorted(log_entries))
+    def version_matrix(self, value_column: str) -> Tuple[pd.DataFrame, np.ndarray, np.ndarray]:
+        """
+        生成历史追溯所需的“键 × 版本”矩阵，结果与 `historical.build_version_matrix` 一致：
+        keys_df 为唯一键及最近一次出现（非空）时的其他属性列，values 为数值列的float64矩阵，present 标记是否出现。
+        """
+        present = self.present
+        values = np.full(self.positions.shape, np.nan)
+        attr_columns = list(dict.fromkeys(
+            col for df in self.frames for col in df.columns
+            if col not in self.key_columns and col not in (KEY_CODE_COLUMN, value_column)
+        ))
+        attrs = {col: np.full(len(self.keys), None, dtype=object) for col in attr_columns}
+        for j, df in enumerate(self.frames):
+            rows = np.flatnonzero(present[:, j])
+            source_rows = self.positions[rows, j]
+            values[rows, j] = to_float_array(df[value_column])[source_rows]
+            for col in attr_columns:
+                if col in df.columns:
+                    taken = df[col].to_numpy(dtype=object)[source_rows]
+                    valid = ~pd.isna(taken)
+                    attrs[col][rows[valid]] = taken[valid]
 
-    return f"  {summary}\n\n--- 详细变更记录 ---\n{details}" if details else summary
\ No newline at end of file
+        keys_df = self.keys.reset_index(drop=True)
+        if attr_columns:
+            keys_df = pd.concat([keys_df, pd.DataFrame(attrs)], axis=1)
+        return keys_df, values, present
+
+    def step_summary(self) -> pd.DataFrame:
+        """相邻版本的变更统计：每个版本区间一行，包含新增、删除、修改记录数及各列的修改单元格数。"""
+        columns = list(dict.fromkeys(col for step in self.steps for col in step.value_columns))
+        rows = []
+        for step in self.steps:
+            column_counts = step.column_counts
+            rows.append({
+                '版本区间': f"{step.hist_name} -> {step.latest_name}",
+                CHANGE_ADDED: step.added_count,
+                CHANGE_DELETED: step.deleted_count,
+                CHANGE_MODIFIED: step.modified_count,
+                **{col: column_counts.get(col, 0) for col in columns},
+            })
+        return pd.DataFrame(rows, columns=['版本区间', CHANGE_ADDED, CHANGE_DELETED, CHANGE_MODIFIED] + columns)
+
+    def to_frame(self) -> pd.DataFrame:
+        """返回所有相邻版本的变更长表（'起始版本' + '目标版本' + 关键列 + '列' + '旧值' + '新值' + '变更类型'），用于导出。"""
+        frames = list(self.iter_frames())
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    def iter_frames(self, chunk_size: int = DEFAULT_RENDER_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+        """按版本区间分块产出 `to_frame()` 的内容。"""
+        for step in self.steps:
+            for frame in step.iter_frames(chunk_size):
+                frame.insert(0, '目标版本', step.latest_name)
+                frame.insert(0, '起始版本', step.hist_name)
+                yield frame
+
+
+def _align_versions(
+    frames: List[pd.DataFrame], key_columns: List[str], key_index: Optional[KeyIndex],
+    version_names: Optional[List[str]] = None
+) -> Tuple[pd.DataFrame, np.ndarray]:
+    """
+    将所有版本按关键键对齐，返回按关键列排序的唯一键和“键 × 版本”行号矩阵。
+    同一版本内的重复键只保留最后一行，并打印重复行数的警告。
+    """
+    version_ids = np.repeat(np.arange(len(frames)), [len(df) for df in frames])
+    row_ids = np.concatenate([np.arange(len(df)) for df in frames]) if frames else np.empty(0, dtype=np.int64)
+    if key_index is not None:
+        codes = np.concatenate([df[KEY_CODE_COLUMN].to_numpy() for df in frames])
+        unique_codes, key_ids = np.unique(codes, return_inverse=True)
+        keys = pd.DataFrame({KEY_CODE_COLUMN: unique_codes})
+    else:
+        combined = pd.concat([df[key_columns] for df in frames], ignore_index=True)
+        grouper = combined.groupby(key_columns, sort=True, dropna=False, observed=True)
+        key_ids = grouper.ngroup().to_numpy()
+        keys = grouper.size().reset_index()[key_columns]
+
+    warn_duplicate_keys(key_ids, version_ids, len(frames), version_names)
+    positions = np.full((len(keys), len(frames)), -1, dtype=np.int64)
+    positions[key_ids.ravel(), version_ids] = row_ids
+    return keys, positions
+
+
+def compute_nway_diff(
+    frames: List[pd.DataFrame],
+    key_columns: List[str],
+    version_names: Optional[List[str]] = None,
+    key_index: Optional[KeyIndex] = None,
+    tolerances: Optional[Dict[str, float]] = None
+) -> NWayDiffResult:
+    """
+    多版本差异引擎：所有版本按关键键只对齐一次，每个版本的行哈希只计算一次，
+    再由对齐结构得出每一对相邻版本在所有非关键列上的差异（代替N-1次独立的合并）。
+    """
+    use_codes = key_index is not None and all(KEY_CODE_COLUMN in df.columns for df in frames)
+    key_index = key_index if use_codes else None
+    version_names = version_names or [f"版本{i + 1}" for i in range(len(frames))]
+
+    keys, positions = _align_versions(frames, key_columns, key_index, version_names)
+    hashed_columns = sorted(set.intersection(*[
+        {col for col in df.columns if col not in key_columns and col != KEY_CODE_COLUMN} for df in frames
+    ])) if frames else []
+    result = NWayDiffResult(
+        key_columns=list(key_columns),
+        version_names=list(version_names),
+        frames=frames,
+        keys=keys,
+        positions=positions,
+        key_index=key_index,
+        tolerances=dict(tolerances or {}),
+        row_hashes=[_hash_rows(df, hashed_columns) for df in frames],
+        hashed_columns=hashed_columns,
+    )
+    result.steps = [result.compare(i, i + 1) for i in range(len(frames) - 1)]
+    return result
+
+
+def _format_key_strings(keys: pd.DataFrame, key_columns: List[str]) -> pd.Series:
+    """以向量化字符串拼接生成 "列: '值', ..." 形式的唯一键文本。"""
+    key_str = None
+    for i, col in enumerate(key_columns):
+        part = f"{col}: '" + keys[col].astype(str) + "'"
+        key_str = part if i == 0 else key_str + ", " + part
+    return key_str
+
+
+def format_change_lines(result: DiffResult, start: int = 0, stop: Optional[int] = None) -> pd.Series:
+    """逐条渲染第 start 至 stop 条（默认全部）变更记录的文本，结果与 `changes` 的行一一对应（未排序）。"""
+    changes = result.changes.iloc[start:stop]
+    key_str = _format_key_strings(result.decode_keys(start, stop), result.key_columns)
+    kind = changes[COL_KIND].astype(object).to_numpy()
+    lines = pd.Series(index=changes.index, dtype=object)
+
+    deleted = kind == CHANGE_DELETED
+    lines[deleted] = f"【删除】源于 {result.hist_name} 的记录被删除。唯一键: [" + key_str[deleted] + "]"
+
+    added = kind == CHANGE_ADDED
+    lines[added] = f"【新增】在 {result.latest_name} 发现新记录。唯一键: [" + key_str[added] + "]"
+
+    modified = kind == CHANGE_MODIFIED
+    mod = changes[modified]
+    lines[modified] = (
+        "【修改】唯一键: [" + key_str[modified] + "] | 列 '" + mod[COL_NAME].astype(str)
+        + "': 值从 '" + mod[COL_OLD].astype(str) + "' 变为 '" + mod[COL_NEW].astype(str) + "'"
+    )
+    return lines
+
+
+def _iter_sorted_runs(result: DiffResult, chunk_size: int) -> Iterator[List[str]]:
+    """分块渲染变更记录，逐块产出排序后的文本行。"""
+    for start in range(0, len(result.changes), chunk_size):
+        yield np.sort(format_change_lines(result, start, start + chunk_size).to_numpy()).tolist()
+
+
+def render_diff_report(result: DiffResult) -> str:
+    """将 DiffResult 渲染为人类可读的差异报告文本。"""
+    summary = result.summary_line
+    details = "\n".join(result.iter_lines())
+    return f"  {summary}\n\n--- 详细变更记录 ---\n{details}" if details else summary
+
+
+def generate_precise_diff_report(
+    df_hist: pd.DataFrame,
+    df_latest: pd.DataFrame,
+    key_columns: List[str],
+    hist_name: str = '历史版本',
+    latest_name: str = '最新版本',
+    # 允许调用者指定只检查哪些列。如果为None，则检查所有非关键列。
+    columns_to_check: Optional[List[str]] = None,
+    key_index: Optional[KeyIndex] = None,
+    tolerances: Optional[Dict[str, float]] = None
+) -> DiffResult:
+    """
+    生成高精度的数据差异结果，对比两个DataFrame。
+
+    返回结构化的 DiffResult；需要文本报告时调用 `render()` 或 `str()`。
+    """
+    return compute_diff(
+        df_hist, df_latest, key_columns, hist_name, latest_name, columns_to_check, key_index, tolerances
+    )
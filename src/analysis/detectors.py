@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+
+"""
+内置异常检测器的名称及说明。
+
+本模块只依赖标准库，配置检查无需导入 pandas 即可识别检测器名称；检测器的实现见 `src.analysis.historical`。
+"""
+
+# 检测器名称 -> 说明（用于Prompt中描述异常得分的构成）
+BUILTIN_DETECTORS = {
+    'mod_count': '修改频率',
+    'max_pct_change': '变化幅度',
+    'zscore': '相对自身历史的偏离',
+    'mad': '相对自身历史中位数的稳健偏离',
+    'spike_revert': '突变后回落',
+    'group_deviation': '与同组总体趋势的偏离',
+}
@@ -2,25 +2,389 @@
 
 import pandas as pd
 import numpy as np
-from typing import List, Dict, Optional
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Dict, Optional, Tuple
 
-def _calculate_anomaly_score(row: pd.Series) -> float:
-    """计算单行记录的异常得分，用于筛选最值得关注的变更。"""
-    WEIGHT_MOD_COUNT = 0.6
-    WEIGHT_MAX_PCT_CHANGE = 0.4
+from src.analysis.detectors import BUILTIN_DETECTORS
+from src.data.keys import KEY_CODE_COLUMN, KeyIndex, warn_duplicate_keys
+from src.data.schema import to_float_array
 
-    mod_count_score = row['修改次数']
-    pct_changes = [abs(c) for c in row['历史变化率列表(%)'] if np.isfinite(c)]
-    max_pct_change_score = max(pct_changes) if pct_changes else 0.0
+# 异常得分权重：综合修改次数与最大变化幅度
+WEIGHT_MOD_COUNT = 0.6
+WEIGHT_MAX_PCT_CHANGE = 0.4
 
-    score = (WEIGHT_MOD_COUNT * mod_count_score) + (WEIGHT_MAX_PCT_CHANGE * (max_pct_change_score / 100.0))
-    return score
+# 未配置 `anomaly_scoring.detectors` 时使用的检测器及权重
+DEFAULT_DETECTORS = {
+    'mod_count': {'weight': WEIGHT_MOD_COUNT},
+    'max_pct_change': {'weight': WEIGHT_MAX_PCT_CHANGE},
+}
+
+# MAD 及平均绝对偏差换算为标准差的系数（正态分布下）
+_MAD_SCALE = 1.4826
+_MEAN_AD_SCALE = 1.2533
+
+@dataclass
+class TraceFeatures:
+    """
+    异常检测器的输入。
+
+    `packed` 等为有变化的键（`changed` 为其在全部键中的行号）左移对齐后的历史序列，
+    `values` / `present` 为全部键的“键 × 版本”矩阵，供需要同组其他记录作为基线的检测器使用。
+    """
+    packed: np.ndarray
+    counts: np.ndarray
+    diffs: np.ndarray
+    pct_changes: np.ndarray
+    step_valid: np.ndarray
+    mod_counts: np.ndarray
+    max_pct_changes: np.ndarray
+    values: np.ndarray
+    present: np.ndarray
+    changed: np.ndarray
+    keys_df: pd.DataFrame
+    key_index: Optional[KeyIndex] = None
+
+    @property
+    def numeric(self) -> np.ndarray:
+        """历史序列中有效且可解析为数值的位置。"""
+        return (np.arange(self.packed.shape[1]) < self.counts[:, None]) & ~np.isnan(self.packed)
+
+# 检测器名称 -> (说明, 函数)。函数接收 TraceFeatures 和该检测器的配置，返回每条有变化记录的得分（越大越异常）
+AnomalyDetector = Callable[[TraceFeatures, Dict], np.ndarray]
+ANOMALY_DETECTORS: Dict[str, Tuple[str, AnomalyDetector]] = {}
+
+def register_detector(name: str, label: str):
+    """注册异常检测器，之后即可在 `anomaly_scoring.detectors` 中按名称启用并设置权重。"""
+    def decorator(func: AnomalyDetector) -> AnomalyDetector:
+        ANOMALY_DETECTORS[name] = (label, func)
+        return func
+    return decorator
+
+@register_detector('mod_count', BUILTIN_DETECTORS['mod_count'])
+def _detect_mod_count(features: TraceFeatures, options: Dict) -> np.ndarray:
+    """修改次数。"""
+    return features.mod_counts
+
+@register_detector('max_pct_change', BUILTIN_DETECTORS['max_pct_change'])
+def _detect_max_pct_change(features: TraceFeatures, options: Dict) -> np.ndarray:
+    """相邻版本的最大变化率（以小数计，100% 为 1）。"""
+    return features.max_pct_changes / 100.0
+
+@register_detector('zscore', BUILTIN_DETECTORS['zscore'])
+def _detect_zscore(features: TraceFeatures, options: Dict) -> np.ndarray:
+    """各版本取值相对该键自身历史均值的最大Z分数；历史取值完全相同时为0。"""
+    numeric = features.numeric
+    x = np.where(numeric, features.packed, 0.0)
+    n = np.maximum(numeric.sum(axis=1), 1)
+    mean = x.sum(axis=1) / n
+    deviation = np.where(numeric, np.abs(x - mean[:, None]), 0.0)
+    std = np.sqrt((deviation ** 2).sum(axis=1) / n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(std > 0, deviation.max(axis=1) / std, 0.0)
+
+def _row_medians(x: np.ndarray, n: np.ndarray) -> np.ndarray:
+    """逐行中位数：x 中无效位置为NaN，n 为每行有效个数（排序后NaN位于末尾）。"""
+    sorted_x = np.sort(x, axis=1)
+    rows = np.arange(len(x))
+    lower = sorted_x[rows, np.maximum(n - 1, 0) // 2]
+    upper = sorted_x[rows, n // 2]
+    return (lower + upper) / 2
+
+@register_detector('mad', BUILTIN_DETECTORS['mad'])
+def _detect_mad(features: TraceFeatures, options: Dict) -> np.ndarray:
+    """
+    各版本取值相对该键历史中位数的最大稳健Z分数（偏差 / (1.4826 × MAD)）；
+    MAD 为0时改用平均绝对偏差（× 1.2533）作为尺度，两者均为0时得分为0。
+    """
+    numeric = features.numeric
+    n = numeric.sum(axis=1)
+    x = np.where(numeric, features.packed, np.nan)
+    deviation = np.abs(x - _row_medians(x, n)[:, None])
+    mad = _row_medians(deviation, n)
+    mean_ad = np.where(numeric, deviation, 0.0).sum(axis=1) / np.maximum(n, 1)
+    scale = np.where(mad > 0, _MAD_SCALE * mad, _MEAN_AD_SCALE * mean_ad)
+    max_deviation = np.where(numeric, deviation, 0.0).max(axis=1, initial=0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(scale > 0, max_deviation / scale, 0.0)
+
+@register_detector('spike_revert', BUILTIN_DETECTORS['spike_revert'])
+def _detect_spike_revert(features: TraceFeatures, options: Dict) -> np.ndarray:
+    """
+    突增后回落（或突降后回升）的最大幅度：连续三个取值 a -> b -> c 方向相反时，
+    取 min(|b - a|, |c - b|) / max(|a|, |c|)（以小数计）。
+    """
+    packed = features.packed
+    if packed.shape[1] < 3:
+        return np.zeros(len(packed))
+    a, b, c = packed[:, :-2], packed[:, 1:-1], packed[:, 2:]
+    rise, fall = b - a, c - b
+    base = np.maximum(np.abs(a), np.abs(c))
+    valid = (np.arange(a.shape[1]) < (features.counts - 2)[:, None]) & (rise * fall < 0) & (base > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        magnitude = np.minimum(np.abs(rise), np.abs(fall)) / base
+    return np.where(valid, magnitude, 0.0).max(axis=1, initial=0.0)
+
+def _group_codes(features: TraceFeatures, column: str) -> Optional[np.ndarray]:
+    """全部键在分组列上的整数编码；分组列可以是关键列或属性列，找不到该列时返回None。"""
+    keys_df = features.keys_df
+    if column in keys_df.columns:
+        return pd.factorize(keys_df[column], use_na_sentinel=False)[0]
+    if features.key_index is not None and column in features.key_index.key_columns:
+        return features.key_index.column_codes(keys_df[KEY_CODE_COLUMN], column)
+    return None
+
+@register_detector('group_deviation', BUILTIN_DETECTORS['group_deviation'])
+def _detect_group_deviation(features: TraceFeatures, options: Dict) -> np.ndarray:
+    """
+    相邻版本之间该键的变化率与同组（`group_by` 列取值相同的全部键）总量变化率之差的最大绝对值（以小数计）。
+    只统计该键在两个版本中均有数值、且分母不为0的版本区间。
+    """
+    group_by = options.get('group_by')
+    groups = _group_codes(features, group_by) if group_by else None
+    if groups is None:
+        print(f"⚠️ 异常检测器 group_deviation 的分组列 '{group_by}' 不存在，已跳过。")
+        return np.zeros(len(features.changed))
+
+    values, present = features.values, features.present
+    n_groups, n_versions = int(groups.max(initial=-1)) + 1, values.shape[1]
+    if n_versions < 2:
+        return np.zeros(len(features.changed))
+    contributes = present & ~np.isnan(values)
+    cells = (groups[:, None] * n_versions + np.arange(n_versions)).ravel()
+    totals = np.bincount(
+        cells, weights=np.where(contributes, values, 0.0).ravel(), minlength=n_groups * n_versions
+    ).reshape(n_groups, n_versions)
+
+    sub_values = values[features.changed]
+    sub_valid = contributes[features.changed]
+    sub_totals = totals[groups[features.changed]]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        key_rates = (sub_values[:, 1:] - sub_values[:, :-1]) / sub_values[:, :-1]
+        group_rates = (sub_totals[:, 1:] - sub_totals[:, :-1]) / sub_totals[:, :-1]
+        deviation = np.abs(key_rates - group_rates)
+    valid = sub_valid[:, 1:] & sub_valid[:, :-1] & np.isfinite(deviation)
+    return np.where(valid, deviation, 0.0).max(axis=1, initial=0.0)
+
+def get_detector_config(scoring_config: Optional[Dict]) -> Dict[str, Dict]:
+    """读取 `anomaly_scoring.detectors`；未配置时返回默认的检测器及权重。配置不是字典的检测器会被跳过。"""
+    detectors = (scoring_config or {}).get('detectors')
+    if not detectors:
+        return DEFAULT_DETECTORS
+    result = {}
+    for name, options in detectors.items():
+        if options is not None and not isinstance(options, dict):
+            print(f"⚠️ 异常检测器 '{name}' 的配置应为字典（如 {{weight: 0.2}}），当前为 {options!r}，已跳过。")
+            continue
+        result[name] = options or {}
+    return result
+
+def describe_anomaly_scoring(scoring_config: Optional[Dict]) -> str:
+    """以检测器说明描述异常得分的构成，用于Prompt（如“修改频率和变化幅度”）。"""
+    labels = [
+        ANOMALY_DETECTORS[name][0] for name, options in get_detector_config(scoring_config).items()
+        if name in ANOMALY_DETECTORS and options.get('weight', 1.0)
+    ]
+    if len(labels) <= 1:
+        return "".join(labels)
+    return "、".join(labels[:-1]) + "和" + labels[-1]
+
+def _calculate_anomaly_scores(features: TraceFeatures, scoring_config: Optional[Dict] = None) -> np.ndarray:
+    """按配置的检测器及权重批量计算异常得分（各检测器得分的加权和），用于筛选最值得关注的变更。"""
+    scores = np.zeros(len(features.changed))
+    for name, options in get_detector_config(scoring_config).items():
+        weight = options.get('weight', 1.0)
+        if name not in ANOMALY_DETECTORS:
+            print(f"⚠️ 未知的异常检测器 '{name}'（可选: {', '.join(ANOMALY_DETECTORS)}），已跳过。")
+            continue
+        if not weight:
+            continue
+        detector_scores = np.nan_to_num(ANOMALY_DETECTORS[name][1](features, options), nan=0.0)
+        scores = scores + weight * detector_scores
+    return scores
+
+def build_version_matrix(
+    all_dfs: List[pd.DataFrame], key_columns: List[str], value_column: str,
+    key_index: Optional[KeyIndex] = None
+) -> Tuple[pd.DataFrame, np.ndarray, np.ndarray]:
+    """
+    将多个版本对齐为“键 × 版本”的矩阵。
+
+    提供 `key_index` 且各版本都带有 `_key_code` 列时，直接在整数复合键上分组，
+    此时 `keys_df` 以 `_key_code` 代替关键列（复合键顺序即关键列的字典序）。
+    同一版本内关键键重复时只保留该版本中的最后一行（打印重复行数的警告），
+    不再像早期按列表分组的实现那样把每个重复行都计入追溯序列。
+
+    Returns:
+        keys_df: 每个唯一键一行（按关键列排序），包含关键列及最近一次出现时的其他属性列。
+        values: float64矩阵，values[i, j] 为第i个键在第j个版本中的数值（无法解析为数值时为NaN）；
+            数值列已在读取时转换（见 `src.data.schema`）时直接取用，不再解析字符串。
+        present: 布尔矩阵，标记该键是否出现在该版本中。
+    """
+    version_ids = np.repeat(np.arange(len(all_dfs)), [len(df) for df in all_dfs])
+
+    if key_index is not None and all(KEY_CODE_COLUMN in df.columns for df in all_dfs):
+        combined = pd.concat(
+            [df[[col for col in df.columns if col not in key_columns]] for df in all_dfs], ignore_index=True
+        )
+        unique_codes, key_ids = np.unique(combined[KEY_CODE_COLUMN].to_numpy(), return_inverse=True)
+        attr_columns = [col for col in combined.columns if col not in [KEY_CODE_COLUMN, value_column]]
+        keys_df = pd.DataFrame({KEY_CODE_COLUMN: unique_codes})
+        if attr_columns:
+            last_attrs = combined[attr_columns].groupby(key_ids).last().reset_index(drop=True)
+            keys_df = pd.concat([keys_df, last_attrs], axis=1)
+    else:
+        combined = pd.concat(all_dfs, ignore_index=True)
+        grouper = combined.groupby(key_columns, sort=True, dropna=False, observed=True)
+        key_ids = grouper.ngroup().to_numpy()
+
+        attr_columns = [col for col in combined.columns if col not in key_columns + [value_column]]
+        keys_df = grouper[attr_columns].last().reset_index() if attr_columns else \
+            grouper.size().reset_index()[key_columns]
+
+    warn_duplicate_keys(key_ids, version_ids, len(all_dfs))
+    values = np.full((len(keys_df), len(all_dfs)), np.nan)
+    present = np.zeros(values.shape, dtype=bool)
+    values[key_ids, version_ids] = to_float_array(combined[value_column])
+    present[key_ids, version_ids] = True
+    return keys_df, values, present
+
+def _left_pack(values: np.ndarray, present: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    将每行中实际出现的版本取值按顺序左移对齐，得到每个键的历史值序列及其长度。
+    仅对中间存在缺失版本的行执行重排。
+    """
+    counts = present.sum(axis=1)
+    packed_mask = np.arange(values.shape[1]) < counts[:, None]
+    packed = values.copy()
+    gap_rows = np.flatnonzero((present != packed_mask).any(axis=1))
+    if len(gap_rows):
+        order = np.argsort(~present[gap_rows], axis=1, kind='stable')
+        packed[gap_rows] = np.take_along_axis(values[gap_rows], order, axis=1)
+    packed[~packed_mask] = np.nan
+    return packed, counts
+
+def _count_distinct(packed: np.ndarray, counts: np.ndarray, tolerance: float = 0.0) -> np.ndarray:
+    """
+    统计每行历史值中不同取值的个数，与 `len(set(values))` 一致（每个NaN都视为不同的取值）。
+    指定 `tolerance` 时，排序后只有比上一个计入的取值大出容差以上的取值才计为新取值
+    （100、100.6、101.2 在容差为1时计为两个取值），
+    因此最大值与最小值之差超过容差的键至少有两个取值，与 `_has_multiple_values` 及首尾比对的判断一致。
+
+    容差判断依赖上一个计入的取值，无法一次性按相邻差值比较，因此逐版本（列）循环，每步对所有行向量化计算：
+    开销为 版本数 × 行数 次元素运算，与排序本身同一量级，调用方只对取值有变化的键调用本函数。
+    """
+    valid = np.arange(packed.shape[1]) < counts[:, None]
+    nan_counts = (valid & np.isnan(packed)).sum(axis=1)
+    sorted_values = np.sort(packed, axis=1)  # NaN 排在末尾
+    is_new = ~np.isnan(sorted_values)
+    if tolerance:
+        accepted = sorted_values[:, 0].copy()
+        with np.errstate(invalid='ignore'):
+            for j in range(1, sorted_values.shape[1]):
+                new = (sorted_values[:, j] - accepted) > tolerance
+                is_new[:, j] &= new
+                accepted = np.where(new, sorted_values[:, j], accepted)
+    else:
+        is_new[:, 1:] &= sorted_values[:, 1:] != sorted_values[:, :-1]
+    return is_new.sum(axis=1) + nan_counts
+
+def _has_multiple_values(packed: np.ndarray, counts: np.ndarray, tolerance: float = 0.0) -> np.ndarray:
+    """快速判断每行是否含有两个及以上的不同取值，用于在精确统计前先过滤掉未变化的键。"""
+    valid = np.arange(packed.shape[1]) < counts[:, None]
+    is_nan = np.isnan(packed)
+    numeric = valid & ~is_nan
+    with np.errstate(invalid='ignore'):
+        spread = (np.where(numeric, packed, -np.inf).max(axis=1)
+                  - np.where(numeric, packed, np.inf).min(axis=1)) > tolerance
+    return (counts > 1) & ((valid & is_nan).any(axis=1) | spread)
+
+def _step_changes(packed: np.ndarray, counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    相邻取值的差值、变化率（%，前值为0时为inf）、有效步标记，以及每行有限变化率绝对值的最大值。
+    """
+    diffs = packed[:, 1:] - packed[:, :-1]
+    previous = packed[:, :-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pct_changes = np.where(previous == 0, np.inf, (diffs / previous) * 100)
+    step_valid = np.arange(diffs.shape[1]) < (counts - 1)[:, None]
+
+    abs_pct = np.abs(pct_changes)
+    finite_pct = step_valid & np.isfinite(abs_pct)
+    max_pct_changes = np.where(finite_pct, abs_pct, 0.0).max(axis=1, initial=0.0)
+    return diffs, pct_changes, step_valid, max_pct_changes
+
+def _select_top_n(scores: np.ndarray, mod_counts: np.ndarray, top_n: Optional[int]) -> np.ndarray:
+    """
+    按(异常得分降序, 修改次数降序, 键顺序)返回行序号。
+    指定 top_n 时先用部分选择确定候选集合，只对候选集合排序。
+    """
+    candidates = np.arange(len(scores))
+    if top_n and 0 < top_n < len(scores):
+        threshold = np.partition(scores, len(scores) - top_n)[len(scores) - top_n]
+        candidates = np.flatnonzero(scores >= threshold)
+    order = np.lexsort((candidates, -mod_counts[candidates], -scores[candidates]))
+    selected = candidates[order]
+    return selected[:top_n] if top_n and top_n > 0 else selected
+
+def score_trace_matrix(
+    keys_df: pd.DataFrame, values: np.ndarray, present: np.ndarray, top_n: Optional[int],
+    key_index: Optional[KeyIndex] = None, tolerance: float = 0.0, scoring_config: Optional[Dict] = None
+) -> pd.DataFrame:
+    """
+    基于“键 × 版本”矩阵计算差值、变化率、修改次数和异常得分，并筛选出Top-N条记录。
+    `keys_df` 的行顺序决定同分记录的先后顺序；若其以 `_key_code` 代替关键列，仅对入选记录解码。
+    `tolerance` 为数值列的比较容差，变化幅度不超过容差的取值视为未修改。
+    `scoring_config` 为 `anomaly_scoring` 配置，决定异常得分使用的检测器及权重。
+    """
+    packed, counts = _left_pack(values, present)
+    changed = np.flatnonzero(_has_multiple_values(packed, counts, tolerance))
+    if len(changed) == 0:
+        return pd.DataFrame()
+    packed, counts = packed[changed], counts[changed]
+
+    print("  - 正在计算每条记录的异常得分...")
+    mod_counts = _count_distinct(packed, counts, tolerance) - 1
+    # 修改次数为0的键（所有取值都在容差以内）不计入轨迹表
+    kept = np.flatnonzero(mod_counts > 0)
+    if len(kept) < len(changed):
+        changed, packed, counts, mod_counts = changed[kept], packed[kept], counts[kept], mod_counts[kept]
+        if len(changed) == 0:
+            return pd.DataFrame()
+
+    diffs, pct_changes, step_valid, max_pct_changes = _step_changes(packed, counts)
+    scores = _calculate_anomaly_scores(TraceFeatures(
+        packed, counts, diffs, pct_changes, step_valid, mod_counts, max_pct_changes,
+        values, present, changed, keys_df, key_index
+    ), scoring_config)
+
+    print(f"  - 成功生成轨迹表，共发现 {len(changed)} 条有变化的记录。")
+    if top_n and top_n > 0:
+        print(f"  - 根据配置，筛选出异常得分最高的 Top {top_n} 条记录进行分析。")
+    selected = _select_top_n(scores, mod_counts, top_n)
+
+    # 仅为最终入选的记录展开列表形式的历史序列
+    sel_counts = counts[selected]
+    result = keys_df.iloc[changed[selected]].reset_index(drop=True)
+    if key_index is not None and KEY_CODE_COLUMN in result.columns:
+        result = pd.concat(
+            [key_index.decode(result[KEY_CODE_COLUMN]), result.drop(columns=KEY_CODE_COLUMN)], axis=1
+        )
+    result['历史值列表'] = [row[:n].tolist() for row, n in zip(packed[selected], sel_counts)]
+    result['历史差值列表'] = [row[:n - 1].tolist() for row, n in zip(diffs[selected], sel_counts)]
+    result['历史变化率列表(%)'] = [row[:n - 1].tolist() for row, n in zip(pct_changes[selected], sel_counts)]
+    result['最新值'] = packed[selected, sel_counts - 1]
+    result['修改次数'] = mod_counts[selected]
+    result['异常得分'] = scores[selected]
+    return result
 
 def generate_historical_trace_table(
     all_dfs: List[pd.DataFrame],
     key_columns: List[str],
     value_column: str,
-    top_n: Optional[int]
+    top_n: Optional[int],
+    key_index: Optional[KeyIndex] = None,
+    tolerance: float = 0.0,
+    scoring_config: Optional[Dict] = None
 ) -> pd.DataFrame:
     """
     根据多个版本的DataFrame生成历史轨迹表，并根据“异常得分”筛选出Top-N条记录。
@@ -28,77 +392,72 @@ def generate_historical_trace_table(
     if not all_dfs:
         return pd.DataFrame()
 
-    for i, df in enumerate(all_dfs):
-        df[value_column] = pd.to_numeric(df[value_column], errors='coerce')
-        df['_version_index'] = i
-
-    combined_df = pd.concat(all_dfs, ignore_index=True)
-    combined_df.sort_values(by=key_columns + ['_version_index'], inplace=True)
-
     print("  - 正在聚合所有版本数据...")
-    aggregated = combined_df.groupby(key_columns).agg(
-        历史值列表=(value_column, list),
-        **{col: (col, 'last') for col in combined_df.columns if col not in key_columns + [value_column, '_version_index']}
-    ).reset_index()
-
-    aggregated = aggregated[aggregated['历史值列表'].apply(lambda x: len(set(x)) > 1)].copy()
-    if aggregated.empty:
-        return pd.DataFrame()
-
-    def get_diff_list(h):
-        return [h[i] - h[i - 1] for i in range(1, len(h))]
+    keys_df, values, present = build_version_matrix(all_dfs, key_columns, value_column, key_index)
+    return score_trace_matrix(keys_df, values, present, top_n, key_index, tolerance, scoring_config)
 
-    def get_pct_change_list(h):
-        return [np.inf if h[i-1] == 0 else ((h[i] - h[i-1]) / h[i-1]) * 100 for i in range(1, len(h))]
+# 渲染追溯表Markdown时每块处理的行数
+DEFAULT_TRACE_CHUNK_SIZE = 50_000
 
-    aggregated['历史差值列表'] = aggregated['历史值列表'].apply(get_diff_list)
-    aggregated['历史变化率列表(%)'] = aggregated['历史值列表'].apply(get_pct_change_list)
-    aggregated['最新值'] = aggregated['历史值列表'].apply(lambda x: x[-1] if x else None)
-    aggregated['修改次数'] = aggregated['历史值列表'].apply(lambda x: len(set(x)) - 1)
+def _format_trace_cells(col_name: str, values: list, key_columns: List[str]) -> List[str]:
+    """按列将追溯表的一块取值格式化为单元格文本。"""
+    if col_name in key_columns or col_name == '修改次数':
+        return [str(value) for value in values]
+    if col_name == '历史值列表':
+        return [" -> ".join([f"{v:.2f}" for v in value]) for value in values]
+    if col_name in ('最新值', '异常得分'):
+        return [f"{value:.2f}" for value in values]
+    if col_name == '历史差值列表':
+        return [" -> ".join([f"{v:+.2f}" for v in value]) or "无变化" for value in values]
+    if col_name == '历史变化率列表(%)':
+        return [
+            " -> ".join(["∞" if np.isinf(v) else f"{v:+.2f}%" for v in value]) or "无变化" for value in values
+        ]
+    return [str(value) for value in values]
 
-    print("  - 正在计算每条记录的异常得分...")
-    aggregated['异常得分'] = aggregated.apply(_calculate_anomaly_score, axis=1)
-    aggregated.sort_values(by=['异常得分', '修改次数'], ascending=[False, False], inplace=True)
+def iter_historical_trace_markdown(
+    df: pd.DataFrame, key_columns: List[str], chunk_size: int = DEFAULT_TRACE_CHUNK_SIZE
+) -> Iterator[str]:
+    """逐行产出历史追溯表的Markdown文本；按列分块格式化，每次只在内存中保留一块的单元格文本。"""
+    if df.empty:
+        yield "在所有数据版本中，未发现任何记录的核心数值发生过变化。"
+        return
 
-    print(f"  - 成功生成轨迹表，共发现 {len(aggregated)} 条有变化的记录。")
-    if top_n and top_n > 0:
-        print(f"  - 根据配置，筛选出异常得分最高的 Top {top_n} 条记录进行分析。")
-        return aggregated.head(top_n)
+    display_columns = key_columns + ['历史值列表', '最新值', '历史差值列表', '历史变化率列表(%)', '修改次数', '异常得分']
+    headers = key_columns + ['历史值演变轨迹', '最新值', '历史差值列表', '历史变化率列表(%)', '总修改次数', '异常得分']
+    yield "| " + " | ".join(headers) + " |"
+    yield "| " + " | ".join(['---'] * len(headers)) + " |"
 
-    return aggregated
+    for start in range(0, len(df), chunk_size):
+        chunk = df.iloc[start:start + chunk_size]
+        cells = [
+            _format_trace_cells(col_name, chunk[col_name].astype(object).tolist(), key_columns)
+            for col_name in display_columns
+        ]
+        for row_values in zip(*cells):
+            yield "| " + " | ".join(row_values) + " |"
 
 def create_historical_trace_markdown(df: pd.DataFrame, key_columns: List[str]) -> str:
     """根据历史追溯DataFrame创建Markdown表格。"""
-    if df.empty:
-        return "在所有数据版本中，未发现任何记录的核心数值发生过变化。"
+    return "\n".join(iter_historical_trace_markdown(df, key_columns))
 
-    display_columns = key_columns + ['历史值列表', '最新值', '历史差值列表', '历史变化率列表(%)', '修改次数', '异常得分']
-    headers = key_columns + ['历史值演变轨迹', '最新值', '历史差值列表', '历史变化率列表(%)', '总修改次数', '异常得分']
-    df_display = df[display_columns].copy()
-
-    header_line = "| " + " | ".join(headers) + " |"
-    separator_line = "| " + " | ".join(['---'] * len(headers)) + " |"
-    markdown_lines = [header_line, separator_line]
-
-    for _, row in df_display.iterrows():
-        row_values = []
-        for col_name in display_columns:
-            value = row[col_name]
-            if col_name in key_columns or col_name == '修改次数':
-                formatted_value = str(value)
-            elif col_name == '历史值列表':
-                formatted_value = " -> ".join([f"{v:.2f}" for v in value])
-            elif col_name == '最新值':
-                formatted_value = f"{value:.2f}"
-            elif col_name == '历史差值列表':
-                formatted_value = " -> ".join([f"{v:+.2f}" for v in value]) or "无变化"
-            elif col_name == '历史变化率列表(%)':
-                formatted_value = " -> ".join([f"∞" if np.isinf(v) else f"{v:+.2f}%" for v in value]) or "无变化"
-            elif col_name == '异常得分':
-                formatted_value = f"{value:.2f}"
-            else:
-                formatted_value = str(value)
-            row_values.append(formatted_value)
-        markdown_lines.append("| " + " | ".join(row_values) + " |")
-
-    return "\n".join(markdown_lines)
\ No newline at end of file
+def create_step_summary_markdown(step_summary: pd.DataFrame) -> str:
+    """
+    根据相邻版本的变更统计（`NWayDiffResult.step_summary()`）创建Markdown表格。
+    只列出有变更的版本区间和有修改的列。
+    """
+    count_columns = list(step_summary.columns[1:])
+    changed = step_summary[step_summary[count_columns].sum(axis=1) > 0] if len(step_summary) else step_summary
+    if changed.empty:
+        return "所有相邻版本之间均未发现任何变更。"
+
+    fixed_columns = count_columns[:3]
+    modified_columns = [col for col in count_columns[3:] if changed[col].sum() > 0]
+    headers = ['版本区间'] + [f'{col}记录' for col in fixed_columns] + [f"'{col}'修改" for col in modified_columns]
+    markdown_lines = [
+        "| " + " | ".join(headers) + " |",
+        "| " + " | ".join(['---'] * len(headers)) + " |",
+    ]
+    for row in changed[['版本区间'] + fixed_columns + modified_columns].itertuples(index=False):
+        markdown_lines.append("| " + " | ".join(str(value) for value in row) + " |")
+    return "\n".join(markdown_lines)
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+
+"""
+按关键键哈希分区的双版本差异计算，适用于无法整体装入内存的数据。
+
+两个版本的数据逐块读取，按关键列的64位哈希划分到磁盘上的若干分区（Arrow IPC文件），
+同一唯一键在两个版本中必然落入同一分区；再在进程池中逐对比对各分区，最后合并各分区的变更与统计。
+由于关键键不跨分区，新增、删除和修改（按唯一键计）的数量与整体比对完全一致；
+单个进程的峰值内存取决于分区大小，而不是数据总量。
+
+分区比对不进行列类型转换（`schema`），按读取时的文本比较，比较语义与整体比对相同。
+"""
+
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.analysis.comparison import DiffResult, compute_diff, _assemble_changes, _hash_rows
+
+DEFAULT_PARTITIONS = 16
+
+
+def _writer_schema(table):
+    """以分区的第一块数据确定文件结构；全为空的列按字符串类型处理。"""
+    import pyarrow as pa
+
+    return pa.schema([
+        field.with_type(pa.string()) if pa.types.is_null(field.type) else field for field in table.schema
+    ])
+
+
+class _PartitionWriter:
+    """将一个版本的数据块按关键键哈希追加写入各分区文件，只在首次写入某分区时创建文件。"""
+
+    def __init__(self, directory: str, prefix: str, key_columns: List[str], n_partitions: int):
+        self.directory = directory
+        self.prefix = prefix
+        self.key_columns = key_columns
+        self.n_partitions = n_partitions
+        self.columns: Optional[List[str]] = None
+        self.n_rows = 0
+        self._writers = {}
+
+    def path(self, partition: int) -> str:
+        return os.path.join(self.directory, f"{self.prefix}_{partition:04d}.arrow")
+
+    def write(self, chunk: pd.DataFrame):
+        import pyarrow as pa
+
+        if self.columns is None:
+            self.columns = list(chunk.columns)
+        self.n_rows += len(chunk)
+        if chunk.empty:
+            return
+        # 分类列按取值写入，各分块的类别不同也不影响追加
+        chunk = chunk.astype({
+            col: object for col in chunk.columns if isinstance(chunk[col].dtype, pd.CategoricalDtype)
+        })
+        partition_ids = (_hash_rows(chunk, self.key_columns) % np.uint64(self.n_partitions)).astype(np.int64)
+        order = np.argsort(partition_ids, kind='stable')
+        bounds = np.searchsorted(partition_ids[order], np.arange(self.n_partitions + 1))
+        for partition in np.flatnonzero(np.diff(bounds)):
+            rows = order[bounds[partition]:bounds[partition + 1]]
+            table = pa.Table.from_pandas(chunk.iloc[rows], preserve_index=False)
+            if partition not in self._writers:
+                schema = _writer_schema(table)
+                self._writers[partition] = (pa.ipc.new_file(self.path(partition), schema), schema)
+            writer, schema = self._writers[partition]
+            writer.write_table(table.cast(schema))
+
+    def close(self) -> List[Optional[str]]:
+        """关闭所有分区文件，返回各分区的文件路径（没有数据的分区为None）。"""
+        for writer, _ in self._writers.values():
+            writer.close()
+        return [self.path(p) if p in self._writers else None for p in range(self.n_partitions)]
+
+
+def _read_partition(path: Optional[str], columns: List[str]) -> pd.DataFrame:
+    import pyarrow as pa
+
+    if path is None:
+        return pd.DataFrame({col: pd.Series(dtype=object) for col in columns})
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).read_all().to_pandas()
+
+
+def _diff_partition(
+    hist_path: Optional[str], latest_path: Optional[str], hist_columns: List[str], latest_columns: List[str],
+    key_columns: List[str], value_columns: List[str], tolerances: Dict[str, float]
+) -> Tuple[pd.DataFrame, int, int, int]:
+    """在子进程中比对一对分区，返回 (变更长表, 新增数, 删除数, 修改数)。"""
+    result = compute_diff(
+        _read_partition(hist_path, hist_columns), _read_partition(latest_path, latest_columns), key_columns,
+        columns_to_check=value_columns, tolerances=tolerances
+    )
+    return result.changes, result.added_count, result.deleted_count, result.modified_count
+
+
+def compute_partitioned_diff(
+    hist_chunks: Iterable[pd.DataFrame],
+    latest_chunks: Iterable[pd.DataFrame],
+    key_columns: List[str],
+    hist_name: str = '历史版本',
+    latest_name: str = '最新版本',
+    columns_to_check: Optional[List[str]] = None,
+    tolerances: Optional[Dict[str, float]] = None,
+    partition_config: Optional[Dict] = None
+) -> DiffResult:
+    """
+    分区比对两个版本，结果与对完整数据调用 `compute_diff` 一致（变更行的顺序按分区排列）。
+
+    Args:
+        hist_chunks / latest_chunks: 逐块产出的两个版本数据，同一版本的各块列结构相同。
+        partition_config: `partitioned_diff` 配置：
+            partitions   分区数，越大则单个分区越小
+            max_workers  并行比对的进程数，设为 null 则使用CPU核数
+            directory    分区文件的临时目录，设为 null 则使用系统临时目录；比对结束后删除
+    """
+    partition_config = partition_config or {}
+    n_partitions = max(1, int(partition_config.get('partitions') or DEFAULT_PARTITIONS))
+    max_workers = max(1, int(partition_config.get('max_workers') or os.cpu_count() or 1))
+    base_dir = partition_config.get('directory')
+    if base_dir:
+        os.makedirs(base_dir, exist_ok=True)
+
+    with tempfile.TemporaryDirectory(prefix='dqct_partitions_', dir=base_dir) as tmp_dir:
+        writers = [_PartitionWriter(tmp_dir, prefix, key_columns, n_partitions) for prefix in ('hist', 'latest')]
+        for writer, chunks in zip(writers, (hist_chunks, latest_chunks)):
+            for chunk in chunks:
+                writer.write(chunk)
+        hist_writer, latest_writer = writers
+        hist_paths, latest_paths = hist_writer.close(), latest_writer.close()
+        hist_columns = hist_writer.columns or list(key_columns)
+        latest_columns = latest_writer.columns or list(key_columns)
+        print(
+            f"  - 已按关键键哈希划分为 {n_partitions} 个分区"
+            f"（{hist_name}: {hist_writer.n_rows} 行，{latest_name}: {latest_writer.n_rows} 行），正在并行比对..."
+        )
+
+        if columns_to_check is None:
+            value_columns = sorted(col for col in hist_columns if col not in key_columns)
+        else:
+            value_columns = list(columns_to_check)
+        jobs = [
+            (hist_path, latest_path) for hist_path, latest_path in zip(hist_paths, latest_paths)
+            if hist_path is not None or latest_path is not None
+        ]
+        args = (hist_columns, latest_columns, list(key_columns), value_columns, dict(tolerances or {}))
+        if max_workers == 1 or len(jobs) <= 1:
+            results = [_diff_partition(h, l, *args) for h, l in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=min(max_workers, len(jobs))) as executor:
+                futures = [executor.submit(_diff_partition, h, l, *args) for h, l in jobs]
+                results = [future.result() for future in futures]
+
+    changes = [result[0] for result in results if not result[0].empty]
+    return DiffResult(
+        key_columns=list(key_columns),
+        changes=pd.concat(changes, ignore_index=True) if changes else _assemble_changes([], list(key_columns)),
+        added_count=sum(result[1] for result in results),
+        deleted_count=sum(result[2] for result in results),
+        modified_count=sum(result[3] for result in results),
+        hist_name=hist_name,
+        latest_name=latest_name,
+        value_columns=value_columns,
+    )
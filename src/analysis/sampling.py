@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+"""
+按关键键哈希抽样的快速预估。
+
+对每个唯一键计算64位哈希并映射到 [0, 1)，小于抽样比例 `fraction` 的键入选。同一唯一键在所有版本中的入选结果相同，
+每次运行的样本也相同（确定性抽样）。在样本上执行与完整分析相同的比对和追溯逻辑，再按 1/fraction 放大计数。
+
+每个键以概率 p 独立入选，样本计数 c 对应的总体估计为 c/p，标准误为 sqrt(c·(1-p))/p；
+置信区间按正态近似计算，下限不低于样本计数本身。c 为 0 时上限取 -ln(1-置信度)/p（95% 时约为 3/p）。
+"""
+
+import math
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+from statistics import NormalDist
+from typing import Dict, List, Optional
+
+from src.analysis.comparison import DiffResult, CHANGE_ADDED, CHANGE_DELETED, CHANGE_MODIFIED, _hash_rows
+
+DEFAULT_SAMPLE_FRACTION = 0.05
+DEFAULT_CONFIDENCE = 0.95
+
+# 按分组列输出预估变更数时最多列出的分组数
+DEFAULT_MAX_GROUPS = 10
+
+
+@dataclass
+class Estimate:
+    """由样本计数放大得到的总体计数估计及其置信区间。"""
+    sample_count: int
+    estimate: float
+    lower: float
+    upper: float
+
+    def format(self) -> str:
+        return f"约{self.estimate:.0f}条（{self.lower:.0f}~{self.upper:.0f}）"
+
+
+def estimate_count(sample_count: int, fraction: float, confidence: float = DEFAULT_CONFIDENCE) -> Estimate:
+    """将样本中的计数按抽样比例放大为总体估计，并计算置信区间。"""
+    if fraction >= 1:
+        return Estimate(sample_count, sample_count, sample_count, sample_count)
+    if sample_count == 0:
+        return Estimate(0, 0.0, 0.0, -math.log(1 - confidence) / fraction)
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    estimate = sample_count / fraction
+    margin = z * math.sqrt(sample_count * (1 - fraction)) / fraction
+    return Estimate(sample_count, estimate, max(float(sample_count), estimate - margin), estimate + margin)
+
+
+def sample_mask(df: pd.DataFrame, key_columns: List[str], fraction: float) -> np.ndarray:
+    """返回关键键哈希落入抽样比例内的行（布尔掩码）。"""
+    if fraction >= 1:
+        return np.ones(len(df), dtype=bool)
+    # 取哈希的高53位映射到 [0, 1)，避免float64舍入
+    unit = (_hash_rows(df, key_columns) >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+    return unit < fraction
+
+
+def sample_frames(frames: List[pd.DataFrame], key_columns: List[str], fraction: float) -> List[pd.DataFrame]:
+    """对每个版本按关键键哈希抽样；同一唯一键在所有版本中同时入选或同时落选。"""
+    return [df[sample_mask(df, key_columns, fraction)].reset_index(drop=True) for df in frames]
+
+
+def _group_counts(keys: pd.DataFrame, group_by: Optional[str]) -> Optional[pd.Series]:
+    """按分组列统计有变化的唯一键数量；分组列不在关键列中时返回None。"""
+    if not group_by or group_by not in keys.columns:
+        return None
+    return keys.drop_duplicates()[group_by].astype(object).value_counts()
+
+
+def estimate_diff(
+    result: DiffResult, fraction: float, confidence: float = DEFAULT_CONFIDENCE, group_by: Optional[str] = None
+) -> Dict:
+    """
+    由样本上的比对结果估计完整比对的新增、删除、修改记录数，各列的修改单元格数，
+    以及（`group_by` 为关键列时）各分组有变化的记录数。
+    """
+    estimates = {
+        CHANGE_ADDED: estimate_count(result.added_count, fraction, confidence),
+        CHANGE_DELETED: estimate_count(result.deleted_count, fraction, confidence),
+        CHANGE_MODIFIED: estimate_count(result.modified_count, fraction, confidence),
+        'columns': {
+            col: estimate_count(count, fraction, confidence) for col, count in result.column_counts.items()
+        },
+        'groups': {},
+    }
+    if group_by:
+        counts = _group_counts(result.decode_keys(), group_by)
+        if counts is None:
+            print(f"⚠️ 抽样预估的分组列 '{group_by}' 不是关键列，已跳过按分组统计。")
+        else:
+            estimates['groups'] = {
+                value: estimate_count(int(count), fraction, confidence) for value, count in counts.items()
+            }
+    return estimates
+
+
+def estimate_trace_groups(
+    trace_df: pd.DataFrame, group_by: Optional[str], fraction: float, confidence: float = DEFAULT_CONFIDENCE
+) -> Dict:
+    """由样本上的追溯轨迹表（每行一个唯一键）估计各分组在历史中有变化的记录数，分组列可为任意属性列。"""
+    if not group_by or trace_df.empty:
+        return {}
+    if group_by not in trace_df.columns:
+        print(f"⚠️ 抽样预估的分组列 '{group_by}' 不存在，已跳过按分组统计。")
+        return {}
+    counts = trace_df[group_by].astype(object).value_counts()
+    return {value: estimate_count(int(count), fraction, confidence) for value, count in counts.items()}
+
+
+def estimated_total_changes(estimates: Dict) -> float:
+    """预估的变更记录总数（新增 + 删除 + 修改）。"""
+    return sum(estimates[kind].estimate for kind in (CHANGE_ADDED, CHANGE_DELETED, CHANGE_MODIFIED))
+
+
+def format_estimated_summary(estimates: Dict) -> str:
+    """与“对比摘要”格式对应的预估摘要。"""
+    return (
+        f"预估对比摘要：【新增】{estimates[CHANGE_ADDED].format()}，【删除】{estimates[CHANGE_DELETED].format()}，"
+        f"【修改】{estimates[CHANGE_MODIFIED].format()}。"
+    )
+
+
+def format_breakdown(
+    estimates: Dict, group_by: Optional[str], groups: Optional[Dict] = None, max_groups: int = DEFAULT_MAX_GROUPS
+) -> List[str]:
+    """各列修改单元格数和各分组变更记录数的预估（按估计值从大到小），每项一行。"""
+    lines = []
+    columns = {col: est for col, est in estimates['columns'].items() if est.sample_count}
+    if columns:
+        lines.append("各列修改单元格数（预估）：")
+        for col, est in sorted(columns.items(), key=lambda item: -item[1].estimate):
+            lines.append(f"  - {col}: {est.format()}")
+    groups = estimates['groups'] if groups is None else groups
+    if groups:
+        lines.append(f"按 {group_by} 统计的变更记录数（预估，前 {min(max_groups, len(groups))} 项）：")
+        for value, est in sorted(groups.items(), key=lambda item: -item[1].estimate)[:max_groups]:
+            lines.append(f"  - {value}: {est.format()}")
+    return lines
@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+
+"""
+增量历史追溯的本地持久化状态。
+
+目录结构：
+    manifest.json          关键列、数值列、容差以及已入库版本的文件信息（路径、工作表、大小、修改时间、内容哈希）
+    keys.arrow             每个唯一键一行：关键列 + 最近一次出现时的其他属性列 + 滚动聚合量
+    versions/00000.arrow   每个版本一个只追加文件：(_key_id, _value)
+
+滚动聚合量（见 `_AGGREGATE_COLUMNS`）包括出现次数、首次/最近一次出现的版本及取值、修改次数和最大变化率；
+取值出现过变化的键还保存其完整的历史值序列，取值始终相同的键的序列可由出现次数和最近取值还原。
+追加新版本时只读取新文件并更新这些聚合量，轨迹表和首尾摘要都直接由聚合量生成，历史版本文件不会被重新读取或改写
+（只有启用需要按版本对齐的检测器时才读取版本文件）。
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+from typing import List, Dict, Optional, Tuple
+
+from src.analysis import historical
+from src.analysis.comparison import format_summary_line
+from src.data.keys import KEY_CODE_COLUMN, warn_duplicate_keys
+from src.data.loader import get_file_content_hash
+from src.data.schema import to_float_array
+
+DEFAULT_STATE_DIRECTORY = './.cache/trace_state'
+
+# 状态格式的版本号，格式变化后旧状态不再沿用
+_STATE_FORMAT = 2
+_MANIFEST_FILE = 'manifest.json'
+_KEYS_FILE = 'keys.arrow'
+_VERSIONS_DIR = 'versions'
+_KEY_ID = '_key_id'
+_VALUE = '_value'
+
+# keys.arrow 中每个键的滚动聚合量
+_COUNT = '_count'
+_FIRST_VERSION = '_first_version'
+_FIRST = '_first'
+_LAST_VERSION = '_last_version'
+_LAST = '_last'
+_MOD_COUNT = '_mod_count'
+_MAX_PCT_CHANGE = '_max_pct_change'
+_HISTORY = '_history'
+_AGGREGATE_COLUMNS = {
+    _COUNT: 0, _FIRST_VERSION: -1, _FIRST: np.nan, _LAST_VERSION: -1, _LAST: np.nan,
+    _MOD_COUNT: 0, _MAX_PCT_CHANGE: 0.0, _HISTORY: None,
+}
+
+# 需要全部键按版本对齐的取值（而非每个键自身的历史序列）的异常检测器
+_VERSION_ALIGNED_DETECTORS = {'group_deviation'}
+
+def get_state_directory(
+    base_directory: str, first_task: Dict, key_columns: List[str], value_column: str,
+    formatting_rules: Optional[Dict] = None, schema_config: Optional[Dict] = None, tolerance: float = 0.0
+) -> str:
+    """
+    按追溯的起始文件和影响追溯结果的全部参数（关键列、数值列、格式化规则、列类型配置、容差）
+    为每条追溯链分配独立的状态目录；任一参数变化时使用新的状态目录，不会沿用按旧参数计算的状态。
+    """
+    identity = json.dumps([
+        _STATE_FORMAT, os.path.abspath(first_task['file']), first_task.get('sheet'), list(key_columns), value_column,
+        formatting_rules or {}, schema_config or {}, tolerance,
+    ], ensure_ascii=False, sort_keys=True, default=str)
+    return os.path.join(base_directory, hashlib.sha256(identity.encode('utf-8')).hexdigest()[:16])
+
+def _read_manifest(state_dir: str) -> Optional[Dict]:
+    path = os.path.join(state_dir, _MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _write_manifest(state_dir: str, manifest: Dict):
+    path = os.path.join(state_dir, _MANIFEST_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+def _write_arrow(df: pd.DataFrame, path: str):
+    from pyarrow import feather
+
+    tmp_path = f"{path}.tmp"
+    feather.write_feather(df, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, path)
+
+def _read_arrow(path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    from pyarrow import feather
+
+    return feather.read_table(path, columns=columns, memory_map=True).to_pandas()
+
+def _version_path(state_dir: str, version_index: int) -> str:
+    return os.path.join(state_dir, _VERSIONS_DIR, f"{version_index:05d}.arrow")
+
+def _file_stat(task: Dict) -> Tuple[int, int]:
+    stat = os.stat(task['file'])
+    return stat.st_size, stat.st_mtime_ns
+
+def _matches_version(entry: Dict, task: Dict) -> bool:
+    """
+    判断已入库的版本是否就是当前任务的文件：路径和工作表相同，且大小和修改时间未变；
+    大小或修改时间变化时才重新计算内容哈希，内容未变则更新记录的大小和修改时间。
+    """
+    if entry['path'] != os.path.abspath(task['file']) or entry.get('sheet') != task.get('sheet'):
+        return False
+    size, mtime_ns = _file_stat(task)
+    if (entry['size'], entry['mtime_ns']) == (size, mtime_ns):
+        return True
+    if get_file_content_hash(task['file']) != entry['content_hash']:
+        return False
+    entry['size'], entry['mtime_ns'] = size, mtime_ns
+    return True
+
+def prepare_trace_state(
+    state_dir: str, tasks: List[Dict], key_columns: List[str], value_column: str, tolerance: float = 0.0
+) -> int:
+    """
+    校验已有状态是否可以沿用，返回已入库的版本数。
+
+    仅当已入库版本恰好是当前版本列表的前缀、且关键列、数值列和容差一致时才沿用，
+    否则清空状态并从头构建。
+    """
+    manifest = _read_manifest(state_dir)
+    if manifest is not None:
+        stored = manifest['versions']
+        if (
+            manifest['key_columns'] == list(key_columns)
+            and manifest['value_column'] == value_column
+            and manifest['tolerance'] == tolerance
+            and len(stored) <= len(tasks)
+            and all(_matches_version(entry, task) for entry, task in zip(stored, tasks))
+        ):
+            _write_manifest(state_dir, manifest)
+            return len(stored)
+        print("  - 已有追溯状态与当前版本列表不一致，将重新构建。")
+
+    shutil.rmtree(state_dir, ignore_errors=True)
+    os.makedirs(os.path.join(state_dir, _VERSIONS_DIR), exist_ok=True)
+    _write_manifest(state_dir, {
+        'key_columns': list(key_columns),
+        'value_column': value_column,
+        'tolerance': tolerance,
+        'versions': [],
+    })
+    return 0
+
+def _pack_histories(histories) -> Tuple[np.ndarray, np.ndarray]:
+    """将各键的历史值序列左对齐为矩阵（末尾补NaN），返回矩阵及每行的序列长度。"""
+    counts = np.array([len(history) for history in histories], dtype=np.int64)
+    packed = np.full((len(counts), int(counts.max(initial=0))), np.nan)
+    for row, history in enumerate(histories):
+        packed[row, :len(history)] = history
+    return packed, counts
+
+def _update_aggregates(keys_df: pd.DataFrame, target_ids: np.ndarray, values: np.ndarray, version_index: int,
+                       tolerance: float):
+    """
+    用新版本中出现的键（`target_ids`，各不相同）及其取值更新滚动聚合量。
+    取值首次与此前不同的键由出现次数和最近取值还原出历史序列，此后每个版本向序列追加一个取值；
+    只为这些键重新计算修改次数和最大变化率。
+    """
+    counts = keys_df[_COUNT].to_numpy(dtype=np.int64)
+    last = keys_df[_LAST].to_numpy(dtype=np.float64)
+    histories = keys_df[_HISTORY].to_numpy(dtype=object)
+    prev_counts, prev_last = counts[target_ids], last[target_ids]
+    had_history = np.array([histories[key_id] is not None for key_id in target_ids], dtype=bool)
+    seen = prev_counts > 0
+    # NaN 与任何取值（包括NaN）都不相等，与 `len(set(values))` 的计数方式一致
+    varied = seen & (had_history | (values != prev_last))
+    for i in np.flatnonzero(varied):
+        key_id = target_ids[i]
+        history = histories[key_id] if had_history[i] else np.full(prev_counts[i], prev_last[i])
+        histories[key_id] = np.append(history, values[i])
+
+    first_ids = target_ids[~seen]
+    keys_df.loc[first_ids, _FIRST_VERSION] = version_index
+    keys_df.loc[first_ids, _FIRST] = values[~seen]
+    keys_df.loc[target_ids, _COUNT] = prev_counts + 1
+    keys_df.loc[target_ids, _LAST_VERSION] = version_index
+    keys_df.loc[target_ids, _LAST] = values
+    keys_df[_HISTORY] = histories
+
+    varied_ids = target_ids[varied]
+    if len(varied_ids):
+        packed, history_counts = _pack_histories(histories[varied_ids])
+        keys_df.loc[varied_ids, _MOD_COUNT] = historical._count_distinct(packed, history_counts, tolerance) - 1
+        keys_df.loc[varied_ids, _MAX_PCT_CHANGE] = historical._step_changes(packed, history_counts)[3]
+
+def append_version(state_dir: str, df: pd.DataFrame, task: Dict, source_name: str):
+    """
+    将一个新版本并入追溯状态：为新出现的键分配编号，刷新键的最新属性和滚动聚合量，并写入该版本的数值文件。
+    """
+    manifest = _read_manifest(state_dir)
+    key_columns, value_column = manifest['key_columns'], manifest['value_column']
+    version_index = len(manifest['versions'])
+
+    keys_path = os.path.join(state_dir, _KEYS_FILE)
+    if os.path.exists(keys_path):
+        keys_df = _read_arrow(keys_path)
+    else:
+        keys_df = pd.DataFrame(columns=key_columns + list(_AGGREGATE_COLUMNS), dtype=object)
+
+    # --- 为本版本的每一行匹配键编号，新键追加到末尾 ---
+    # 持久化状态跨多次运行，只保存关键列的原始取值，不依赖单次运行内的整数编码
+    df = df[[col for col in df.columns if col != KEY_CODE_COLUMN]].astype({col: object for col in key_columns})
+    new_index = pd.MultiIndex.from_frame(df[key_columns])
+    key_ids = pd.MultiIndex.from_frame(keys_df[key_columns]).get_indexer(new_index) \
+        if len(keys_df) else np.full(len(df), -1)
+    unseen = key_ids == -1
+    if unseen.any():
+        new_keys = df.loc[unseen, key_columns].drop_duplicates().reset_index(drop=True)
+        new_ids = pd.MultiIndex.from_frame(new_keys).get_indexer(new_index[unseen]) + len(keys_df)
+        key_ids[unseen] = new_ids
+        for col, default in _AGGREGATE_COLUMNS.items():
+            new_keys[col] = default
+        keys_df = pd.concat([keys_df, new_keys], ignore_index=True) if len(keys_df) else new_keys
+    keys_df = keys_df.astype({
+        _COUNT: np.int64, _FIRST_VERSION: np.int64, _FIRST: np.float64, _LAST_VERSION: np.int64,
+        _LAST: np.float64, _MOD_COUNT: np.int64, _MAX_PCT_CHANGE: np.float64, _HISTORY: object,
+    })
+
+    # --- 刷新键的最新属性和滚动聚合量（同一版本内重复的键以最后一行为准）---
+    warn_duplicate_keys(key_ids, np.zeros(len(df), dtype=np.int64), 1, [source_name])
+    attr_columns = [c for c in df.columns if c not in key_columns + [value_column]]
+    last_rows = pd.Series(np.arange(len(df))).groupby(key_ids).last()
+    target_ids, source_rows = last_rows.index.to_numpy(), last_rows.to_numpy()
+    for col in attr_columns:
+        if col not in keys_df.columns:
+            keys_df[col] = None
+        keys_df[col] = keys_df[col].astype(object)
+        keys_df.loc[target_ids, col] = df[col].to_numpy()[source_rows]
+
+    values = to_float_array(df[value_column])
+    _update_aggregates(keys_df, target_ids, values[source_rows], version_index, manifest['tolerance'])
+    _write_arrow(pd.DataFrame({_KEY_ID: key_ids.astype(np.int64), _VALUE: values}),
+                 _version_path(state_dir, version_index))
+    _write_arrow(keys_df, keys_path)
+
+    size, mtime_ns = _file_stat(task)
+    manifest['versions'].append({
+        'path': os.path.abspath(task['file']),
+        'sheet': task.get('sheet'),
+        'size': size,
+        'mtime_ns': mtime_ns,
+        'content_hash': get_file_content_hash(task['file']),
+        'source_name': source_name,
+        'rows': len(df),
+    })
+    _write_manifest(state_dir, manifest)
+
+def _load_version_matrix(state_dir: str, manifest: Dict, keys_df: pd.DataFrame):
+    """从各版本文件还原“键 × 版本”矩阵，键按关键列排序，与全量计算的键顺序一致。"""
+    n_versions = len(manifest['versions'])
+
+    values = np.full((len(keys_df), n_versions), np.nan)
+    present = np.zeros(values.shape, dtype=bool)
+    for i in range(n_versions):
+        version_df = _read_arrow(_version_path(state_dir, i))
+        key_ids = version_df[_KEY_ID].to_numpy()
+        values[key_ids, i] = version_df[_VALUE].to_numpy()
+        present[key_ids, i] = True
+
+    order = keys_df.sort_values(manifest['key_columns'], kind='stable').index.to_numpy()
+    return keys_df.iloc[order].reset_index(drop=True), values[order], present[order]
+
+def _needs_version_matrix(scoring_config: Optional[Dict]) -> bool:
+    return any(
+        name in _VERSION_ALIGNED_DETECTORS and options.get('weight', 1.0)
+        for name, options in historical.get_detector_config(scoring_config).items()
+    )
+
+def generate_trace_table_from_state(
+    state_dir: str, top_n: Optional[int], tolerance: float = 0.0, scoring_config: Optional[Dict] = None
+) -> pd.DataFrame:
+    """
+    基于持久化状态生成历史轨迹表，结果与全量计算一致。
+    只展开修改次数大于0的键的历史序列；启用需要按版本对齐的检测器时才读取各版本文件还原完整矩阵。
+    """
+    manifest = _read_manifest(state_dir)
+    if not manifest or not manifest['versions']:
+        return pd.DataFrame()
+    keys_df = _read_arrow(os.path.join(state_dir, _KEYS_FILE))
+    aggregates = keys_df[list(_AGGREGATE_COLUMNS)]
+    keys_df = keys_df.drop(columns=list(_AGGREGATE_COLUMNS))
+
+    if _needs_version_matrix(scoring_config):
+        print("  - 异常检测器需要按版本对齐的数据，正在从增量追溯状态还原各版本数据...")
+        keys_df, values, present = _load_version_matrix(state_dir, manifest, keys_df)
+        return historical.score_trace_matrix(
+            keys_df, values, present, top_n, tolerance=tolerance, scoring_config=scoring_config
+        )
+
+    changed = np.flatnonzero(aggregates[_MOD_COUNT].to_numpy() > 0)
+    if len(changed) == 0:
+        return pd.DataFrame()
+    print(f"  - 正在从增量追溯状态读取 {len(changed)} 条有变化记录的历史序列...")
+    keys_df = keys_df.iloc[changed].sort_values(manifest['key_columns'], kind='stable')
+    packed, counts = _pack_histories(aggregates[_HISTORY].to_numpy(dtype=object)[keys_df.index.to_numpy()])
+    present = np.arange(packed.shape[1]) < counts[:, None]
+    return historical.score_trace_matrix(
+        keys_df.reset_index(drop=True), packed, present, top_n, tolerance=tolerance, scoring_config=scoring_config
+    )
+
+def summarize_first_last(state_dir: str, tolerance: float = 0.0) -> str:
+    """
+    基于状态中记录的每个键在首个版本和最近版本中的取值生成“对比摘要”，无需读取任何版本的数据。
+    数值比较规则与 `comparison._are_series_equal` 的数值分支一致（两侧均为空视为相等）；
+    状态只保存数值，数值列未转换类型时两个不同的非数值文本也视为相等。
+    """
+    manifest = _read_manifest(state_dir)
+    aggregates = _read_arrow(
+        os.path.join(state_dir, _KEYS_FILE), columns=[_FIRST_VERSION, _FIRST, _LAST_VERSION, _LAST]
+    )
+    in_first = aggregates[_FIRST_VERSION].to_numpy() == 0
+    in_last = aggregates[_LAST_VERSION].to_numpy() == len(manifest['versions']) - 1
+    first_values, last_values = aggregates[_FIRST].to_numpy(), aggregates[_LAST].to_numpy()
+    # 两侧均为空（或无法解析为数值）视为相等
+    equal = (first_values == last_values) | (np.isnan(first_values) & np.isnan(last_values))
+    if tolerance:
+        with np.errstate(invalid='ignore'):
+            equal |= np.abs(first_values - last_values) <= tolerance
+    modified = in_first & in_last & ~equal
+    return format_summary_line(int((in_last & ~in_first).sum()), int((in_first & ~in_last).sum()), int(modified.sum()))
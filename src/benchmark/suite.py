@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+
+"""
+性能基准套件：用合成数据测量各处理阶段的吞吐量和峰值内存，并与保存的基线对比。
+
+    python main.py bench                       # 运行默认场景 smoke
+    python main.py bench small medium          # 运行指定场景
+    python main.py bench --rows 200000 --versions 8 --change-rate 0.05
+    python main.py bench small --save-baseline # 将结果保存为基线
+
+测量的阶段：
+    load          从Excel读取并格式化前两个版本（不使用解析缓存；行数超过 `max_excel_rows` 时跳过）
+    load_cached   命中Arrow解析缓存时的读取
+    schema        列类型转换（电量声明为数值列，其余列为分类文本列），之后的阶段均在转换后的数据上进行
+    encode        所有版本的关键列共享编码
+    diff          首个与第二个版本的精确比对（generate_precise_diff_report）
+    partitioned_diff  同一对版本的分区比对（compute_partitioned_diff，按块写入磁盘分区后在进程池中比对；
+                  峰值内存只统计主进程）
+    diff_render   差异报告的文本渲染
+    trace         所有版本的历史追溯（generate_historical_trace_table，不截取Top-N）
+    trace_render  追溯结果的Markdown渲染
+    nway_diff     所有版本一次对齐后的相邻版本全列差异（compute_nway_diff）
+
+与基线对比时，耗时或峰值内存超出容差，或结果行数与基线不一致（生成器是确定性的），均判定为回归，命令以非0状态退出。
+基线与机器相关，应在同一台机器上生成和对比。
+"""
+
+import os
+import io
+import sys
+import json
+import shutil
+import platform
+import tempfile
+import contextlib
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from src.benchmark.synthetic import KEY_COLUMNS, VALUE_COLUMN, generate_versions, write_versions_to_excel
+from src.data.keys import encode_key_columns
+from src.data.loader import load_task_dataframes
+from src.data.schema import apply_schema
+from src.analysis import comparison, historical, partitioned
+from src.utils.metrics import WorkflowMetrics
+
+DEFAULT_BASELINE_PATH = './benchmarks/baseline.json'
+DEFAULT_OUTPUT_DIRECTORY = './logs/benchmarks'
+DEFAULT_DATA_DIRECTORY = './.cache/benchmark'
+DEFAULT_MAX_EXCEL_ROWS = 100_000
+# 分区比对阶段每次写入分区的行数
+PARTITION_CHUNK_ROWS = 100_000
+# 回归判定的容差：相对增幅超过比例且绝对增量超过下限时才视为回归，避免小耗时的计时噪声
+DEFAULT_TIME_TOLERANCE = 0.25
+DEFAULT_MEMORY_TOLERANCE = 0.20
+MIN_TIME_DELTA_SECONDS = 0.05
+MIN_MEMORY_DELTA_MB = 20.0
+
+SCENARIOS = {
+    'smoke': {'rows': 10_000, 'versions': 3},
+    'small': {'rows': 100_000, 'versions': 5},
+    'many_versions': {'rows': 50_000, 'versions': 100},
+    'medium': {'rows': 1_000_000, 'versions': 10},
+    # 约需 8GB 内存
+    'large': {'rows': 10_000_000, 'versions': 2},
+}
+DEFAULT_RATES = {'change_rate': 0.01, 'add_rate': 0.001, 'delete_rate': 0.001, 'mixed_rate': 0.01, 'seed': 0}
+# 不参与回归判定的计数字段
+_STAGE_TIMING_FIELDS = {
+    'stage', 'wall_seconds', 'cpu_seconds', 'peak_rss_mb', 'peak_rss_scope', 'rows_per_second', 'memory_mb'
+}
+_FORMATTING_RULES = {'行业编码': {'type': 'zfill', 'width': 4}}
+
+def _scenario_name(params: Dict) -> str:
+    return (f"r{params['rows']}_v{params['versions']}_c{params['change_rate']}_a{params['add_rate']}"
+            f"_d{params['delete_rate']}_m{params['mixed_rate']}_s{params['seed']}")
+
+def _measure_load(metrics: WorkflowMetrics, versions: List[pd.DataFrame], params: Dict, data_dir: str):
+    """测量前两个版本的Excel读取，以及命中解析缓存时的读取。"""
+    paths = write_versions_to_excel(versions[:2], data_dir, _scenario_name(params))
+    tasks = [{'file': path} for path in paths]
+    n_rows = sum(len(df) for df in versions[:2])
+    cache_dir = tempfile.mkdtemp(prefix='dqct_bench_cache_')
+    try:
+        config = {'loading': {'max_workers': 1}, 'cache': {'enabled': False}}
+        with metrics.stage('load') as stage:
+            load_task_dataframes(tasks, KEY_COLUMNS, _FORMATTING_RULES, config)
+            stage['rows'] = n_rows
+        # 先写入缓存，再测量命中缓存的读取
+        config['cache'] = {'enabled': True, 'directory': cache_dir}
+        load_task_dataframes(tasks, KEY_COLUMNS, _FORMATTING_RULES, config)
+        with metrics.stage('load_cached') as stage:
+            load_task_dataframes(tasks, KEY_COLUMNS, _FORMATTING_RULES, config)
+            stage['rows'] = n_rows
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+def run_scenario(params: Dict, max_excel_rows: int = DEFAULT_MAX_EXCEL_ROWS,
+                 data_dir: str = DEFAULT_DATA_DIRECTORY) -> Dict:
+    """运行单个场景，返回各阶段的指标。分析函数的进度输出不显示。"""
+    metrics = WorkflowMetrics('benchmark')
+    with metrics.stage('generate') as stage:
+        versions = generate_versions(
+            params['rows'], params['versions'], params['change_rate'], params['add_rate'],
+            params['delete_rate'], params['mixed_rate'], params['seed'],
+        )
+        stage['rows'] = sum(len(df) for df in versions)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        if params['rows'] <= max_excel_rows:
+            _measure_load(metrics, versions, params, data_dir)
+
+        with metrics.stage('schema') as stage:
+            schema_config = {'enabled': True, 'columns': {VALUE_COLUMN: {'type': 'numeric'}}}
+            versions = apply_schema(versions, KEY_COLUMNS, schema_config, _FORMATTING_RULES)
+            stage.update(rows=sum(len(df) for df in versions),
+                         memory_mb=round(sum(df.memory_usage(deep=True).sum() for df in versions) / 1024 / 1024, 1))
+
+        with metrics.stage('encode') as stage:
+            key_index, versions = encode_key_columns(versions, KEY_COLUMNS)
+            stage['rows'] = sum(len(df) for df in versions)
+
+        with metrics.stage('diff') as stage:
+            diff_result = comparison.generate_precise_diff_report(
+                versions[0], versions[1], KEY_COLUMNS, key_index=key_index
+            )
+            stage.update(rows=len(versions[0]) + len(versions[1]), changes=len(diff_result.changes))
+        with metrics.stage('partitioned_diff') as stage:
+            chunks = [
+                (df.iloc[start:start + PARTITION_CHUNK_ROWS] for start in range(0, len(df), PARTITION_CHUNK_ROWS))
+                for df in versions[:2]
+            ]
+            partitioned_result = partitioned.compute_partitioned_diff(*chunks, KEY_COLUMNS)
+            stage.update(rows=len(versions[0]) + len(versions[1]), changes=len(partitioned_result.changes))
+        with metrics.stage('diff_render') as stage:
+            report = diff_result.render()
+            stage.update(rows=len(diff_result.changes), chars=len(report))
+
+        with metrics.stage('trace') as stage:
+            trace_df = historical.generate_historical_trace_table(
+                versions, KEY_COLUMNS, VALUE_COLUMN, None, key_index
+            )
+            stage.update(rows=sum(len(df) for df in versions), trace_rows=len(trace_df))
+        with metrics.stage('trace_render') as stage:
+            markdown = historical.create_historical_trace_markdown(trace_df, KEY_COLUMNS)
+            stage.update(rows=len(trace_df), chars=len(markdown))
+
+        with metrics.stage('nway_diff') as stage:
+            nway = comparison.compute_nway_diff(versions, KEY_COLUMNS, key_index=key_index)
+            stage.update(rows=sum(len(df) for df in versions), changes=sum(len(step.changes) for step in nway.steps))
+
+    result = metrics.to_dict(success=True)
+    for stage in result['stages']:
+        if stage.get('rows') and stage['wall_seconds'] > 0:
+            stage['rows_per_second'] = round(stage['rows'] / stage['wall_seconds'])
+    return {'params': params, 'wall_seconds': result['wall_seconds'], 'stages': result['stages']}
+
+def _baseline_stages(scenario: str, result: Dict, baseline: Dict) -> Dict[str, Dict]:
+    """返回基线中该场景各阶段的指标；基线中没有该场景或生成参数不同时返回空字典。"""
+    base = (baseline.get('scenarios') or {}).get(scenario)
+    if not base or base['params'] != result['params']:
+        return {}
+    return {stage['stage']: stage for stage in base['stages']}
+
+def compare_with_baseline(
+    scenario: str, result: Dict, baseline: Dict,
+    time_tolerance: float = DEFAULT_TIME_TOLERANCE, memory_tolerance: float = DEFAULT_MEMORY_TOLERANCE
+) -> List[str]:
+    """返回该场景相对基线的回归描述列表；基线中没有该场景或参数不同时返回空列表。"""
+    base_stages = _baseline_stages(scenario, result, baseline)
+    regressions = []
+    for stage in result['stages']:
+        name = stage['stage']
+        if name == 'generate' or name not in base_stages:
+            continue
+        ref = base_stages[name]
+        if (stage['wall_seconds'] > ref['wall_seconds'] * (1 + time_tolerance)
+                and stage['wall_seconds'] - ref['wall_seconds'] > MIN_TIME_DELTA_SECONDS):
+            regressions.append(
+                f"{scenario}/{name}: 耗时 {stage['wall_seconds']:.3f}s，基线 {ref['wall_seconds']:.3f}s "
+                f"(+{stage['wall_seconds'] / ref['wall_seconds'] - 1:.0%})"
+            )
+        if (stage['peak_rss_mb'] > ref['peak_rss_mb'] * (1 + memory_tolerance)
+                and stage['peak_rss_mb'] - ref['peak_rss_mb'] > MIN_MEMORY_DELTA_MB):
+            regressions.append(
+                f"{scenario}/{name}: 峰值内存 {stage['peak_rss_mb']:.0f}MB，基线 {ref['peak_rss_mb']:.0f}MB"
+            )
+        for field, value in stage.items():
+            if field not in _STAGE_TIMING_FIELDS and field in ref and ref[field] != value:
+                regressions.append(f"{scenario}/{name}: 结果 {field}={value}，与基线 {ref[field]} 不一致")
+    return regressions
+
+def _print_result(scenario: str, result: Dict, baseline: Dict):
+    base_stages = _baseline_stages(scenario, result, baseline)
+    params = result['params']
+    print(f"\n📏 场景 {scenario}: {params['rows']:,} 行 × {params['versions']} 个版本"
+          f"（修改率 {params['change_rate']}，新增率 {params['add_rate']}，删除率 {params['delete_rate']}，"
+          f"混合格式率 {params['mixed_rate']}）")
+    print(f"  {'阶段':<18}{'耗时(s)':>10}{'吞吐(行/s)':>14}{'峰值内存(MB)':>14}{'基线耗时(s)':>13}")
+    for stage in result['stages']:
+        ref = base_stages.get(stage['stage'])
+        throughput = f"{stage['rows_per_second']:,}" if stage.get('rows_per_second') else '-'
+        ref_time = f"{ref['wall_seconds']:.3f}" if ref else '-'
+        print(f"  {stage['stage']:<18}{stage['wall_seconds']:>10.3f}{throughput:>14}"
+              f"{stage['peak_rss_mb']:>14.1f}{ref_time:>13}")
+
+def _machine_info() -> Dict:
+    return {
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'cpu_count': os.cpu_count(),
+    }
+
+def run_benchmarks(
+    scenarios: List[str],
+    overrides: Optional[Dict] = None,
+    baseline_path: str = DEFAULT_BASELINE_PATH,
+    save_baseline: bool = False,
+    output_directory: str = DEFAULT_OUTPUT_DIRECTORY,
+    max_excel_rows: int = DEFAULT_MAX_EXCEL_ROWS,
+    time_tolerance: float = DEFAULT_TIME_TOLERANCE,
+) -> bool:
+    """
+    运行指定场景（`overrides` 中的参数覆盖场景默认值，若提供则只运行一个自定义场景），
+    保存结果并与基线对比。存在回归时返回False。
+    """
+    overrides = {k: v for k, v in (overrides or {}).items() if v is not None}
+    runs = {}
+    if overrides and not scenarios:
+        params = {**DEFAULT_RATES, **SCENARIOS['smoke'], **overrides}
+        runs['custom_' + _scenario_name(params)] = params
+    for name in scenarios or ([] if overrides else ['smoke']):
+        if name not in SCENARIOS:
+            print(f"❌ 未知的基准场景: '{name}'，可选: {', '.join(SCENARIOS)}")
+            return False
+        runs[name] = {**DEFAULT_RATES, **SCENARIOS[name], **overrides}
+
+    baseline = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    results, regressions, n_compared = {}, [], 0
+    for name, params in runs.items():
+        results[name] = run_scenario(params, max_excel_rows)
+        _print_result(name, results[name], baseline)
+        n_compared += bool(_baseline_stages(name, results[name], baseline))
+        regressions += compare_with_baseline(name, results[name], baseline, time_tolerance)
+
+    report = {'created_at': datetime.now().isoformat(timespec='seconds'), 'machine': _machine_info(),
+              'scenarios': results}
+    os.makedirs(output_directory, exist_ok=True)
+    output_path = os.path.join(output_directory, f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n📄 基准结果已保存至: {output_path}")
+
+    if save_baseline:
+        merged = {**baseline, 'created_at': report['created_at'], 'machine': report['machine'],
+                  'scenarios': {**(baseline.get('scenarios') or {}), **results}}
+        os.makedirs(os.path.dirname(baseline_path) or '.', exist_ok=True)
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            json.dump(merged, f, ensure_ascii=False, indent=2)
+        print(f"📌 已更新基线: {baseline_path}")
+        return True
+
+    if not n_compared:
+        print(f"ℹ️ 基线 {baseline_path} 中没有参数相同的场景可供对比，可使用 --save-baseline 生成。")
+        return True
+    if baseline.get('machine') != report['machine']:
+        print("⚠️ 基线来自不同的机器或环境，对比结果仅供参考。")
+    if regressions:
+        print("\n❌ 检测到性能回归:", file=sys.stderr)
+        for line in regressions:
+            print(f"  - {line}", file=sys.stderr)
+        return False
+    print(f"✅ {n_compared} 个场景均未发现性能回归。")
+    return True
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+"""
+确定性的合成版本数据生成器，结构与真实数据一致（时间、省份、行业编码、行业名称、电量）。
+
+生成的DataFrame与 `load_task_dataframes` 未启用列类型转换时的输出形式相同（所有列均为字符串，空值为''），可直接用于比对和追溯。
+相同参数和随机种子总是生成完全相同的数据。
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from typing import List
+
+KEY_COLUMNS = ['时间', '省份', '行业编码']
+VALUE_COLUMN = '电量'
+ATTRIBUTE_COLUMN = '行业名称'
+
+PROVINCES = [
+    '北京', '天津', '河北', '山西', '内蒙古', '辽宁', '吉林', '黑龙江', '上海', '江苏', '浙江',
+    '安徽', '福建', '江西', '山东', '河南', '湖北', '湖南', '广东', '广西', '海南', '重庆',
+    '四川', '贵州', '云南', '西藏', '陕西', '甘肃', '青海', '宁夏', '新疆',
+]
+_MAX_INDUSTRIES = 999
+_DAYS_PER_BLOCK = 30
+# 非数值占位符，模拟真实数据中的缺报单元格
+_PLACEHOLDER = '-'
+
+def _key_layout(n_keys: int):
+    """确定行业数和天数，使 省份×行业×天数 不少于 `n_keys`。"""
+    n_industries = int(np.clip(-(-n_keys // (len(PROVINCES) * _DAYS_PER_BLOCK)), 1, _MAX_INDUSTRIES))
+    n_days = -(-n_keys // (len(PROVINCES) * n_industries))
+    return n_industries, n_days
+
+def _build_keys(n_keys: int) -> pd.DataFrame:
+    """生成前 `n_keys` 个唯一键（按 时间→省份→行业 顺序排列），各列中相同的字符串共享同一对象。"""
+    n_industries, n_days = _key_layout(n_keys)
+    i = np.arange(n_keys)
+    per_day = len(PROVINCES) * n_industries
+    dates = pd.date_range('2025-01-01', periods=n_days, freq='D').strftime('%Y%m%d').to_numpy(dtype=object)
+    codes = np.array([f"{(j + 1) * 10:04d}" for j in range(n_industries)], dtype=object)
+    names = np.array([f"行业{code}" for code in codes], dtype=object)
+    industry = i % n_industries
+    return pd.DataFrame({
+        '时间': dates[i // per_day],
+        '省份': np.array(PROVINCES, dtype=object)[(i // n_industries) % len(PROVINCES)],
+        '行业编码': codes[industry],
+        ATTRIBUTE_COLUMN: names[industry],
+    })
+
+def _format_values(values: np.ndarray) -> np.ndarray:
+    """按Excel读取为字符串时的形式格式化数值：整数值不带小数部分，其余取最短表示。"""
+    text = pd.Series(values).astype(str)
+    return text.str.removesuffix('.0').to_numpy(dtype=object)
+
+def generate_versions(
+    n_rows: int,
+    n_versions: int,
+    change_rate: float = 0.01,
+    add_rate: float = 0.001,
+    delete_rate: float = 0.001,
+    mixed_rate: float = 0.01,
+    seed: int = 0,
+) -> List[pd.DataFrame]:
+    """
+    生成 `n_versions` 个版本，首个版本包含 `n_rows` 行。
+
+    之后每个版本相对上一版本：
+        - 约 `change_rate` 比例的现存记录的电量被修改（多数为小幅波动，少数为数量级跳变）；
+        - 约 `delete_rate` 比例的现存记录被删除，并新增约 `add_rate × n_rows` 条此前未出现的记录；
+    每个版本中约 `mixed_rate` 比例的电量单元格以不同的文本形式出现（如 '12.50' 与 '12.5'，数值相等），
+    其中约十分之一为非数值占位符 '-'。
+    """
+    rng = np.random.default_rng(seed)
+    n_added = int(round(n_rows * add_rate))
+    n_universe = n_rows + n_added * max(n_versions - 1, 0)
+    keys = _build_keys(n_universe)
+
+    values = np.round(rng.lognormal(mean=10, sigma=2, size=n_universe), 2)
+    present = np.zeros(n_universe, dtype=bool)
+    present[:n_rows] = True
+    next_new = n_rows
+
+    versions = []
+    for version in range(n_versions):
+        if version > 0:
+            alive = np.flatnonzero(present)
+            n_changed = int(round(len(alive) * change_rate))
+            changed = rng.choice(alive, size=n_changed, replace=False)
+            factors = 1 + rng.normal(0, 0.05, size=n_changed)
+            jumps = rng.random(n_changed) < 0.05
+            factors[jumps] = rng.choice([0.001, 100.0, 1000.0], size=int(jumps.sum()))
+            values[changed] = np.round(values[changed] * factors, 2)
+
+            n_deleted = int(round(len(alive) * delete_rate))
+            present[rng.choice(alive, size=n_deleted, replace=False)] = False
+            present[next_new:next_new + n_added] = True
+            next_new += n_added
+
+        rows = np.flatnonzero(present)
+        df = keys.iloc[rows].reset_index(drop=True)
+        text = _format_values(values[rows])
+        mixed = np.flatnonzero(rng.random(len(rows)) < mixed_rate)
+        if len(mixed):
+            text[mixed] = np.char.mod('%.3f', values[rows][mixed]).astype(object)
+            text[mixed[rng.random(len(mixed)) < 0.1]] = _PLACEHOLDER
+        df[VALUE_COLUMN] = text
+        versions.append(df[KEY_COLUMNS + [ATTRIBUTE_COLUMN, VALUE_COLUMN]])
+    return versions
+
+def write_versions_to_excel(versions: List[pd.DataFrame], directory: str, prefix: str) -> List[str]:
+    """
+    将各版本写入Excel文件（电量写为数值单元格，无法解析的保留为文本），返回文件路径列表。
+    文件已存在时直接复用，因此相同参数只需生成一次。
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i, df in enumerate(versions, start=1):
+        path = os.path.join(directory, f"{prefix}_v{i}.xlsx")
+        if not os.path.exists(path):
+            out = df.copy()
+            numeric = pd.to_numeric(out[VALUE_COLUMN], errors='coerce')
+            out[VALUE_COLUMN] = numeric.astype(object).where(numeric.notna(), out[VALUE_COLUMN])
+            tmp_path = f"{path}.{os.getpid()}.tmp.xlsx"
+            out.to_excel(tmp_path, index=False)
+            os.replace(tmp_path, path)
+        paths.append(path)
+    return paths
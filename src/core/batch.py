@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+
+"""
+批量任务运行器：按任务清单在进程池中执行多个分析任务。
+
+清单为YAML文件，格式如下：
+
+    base_config: './config.yaml'     # 各任务共用的基础配置
+    max_workers: 4                   # 同时执行的任务数，留空则使用CPU核数
+    summary_directory: './logs/batch'
+    jobs:
+      - name: '6月文件对比'
+        data_sources:
+          files: ['./data/历史数据v1.xlsx', './data/最新数据v2.xlsx']
+      - name: '综合工作表追溯'
+        active_mode: 'SHEETS'
+        data_sources:
+          sheets_config: {file_path: './data/综合数据.xlsx', sheet_names: ['版本1', '版本2', '版本3']}
+        output: {report_directory: './reports/sheets'}
+
+每个任务中除 `name` 外的字段会深度合并到基础配置之上，之后与 `main.py` 一样执行对比或追溯工作流。
+所有任务用到的每个不同的文件/工作表只在主进程中读取并格式化一次，写入临时的Arrow文件后由各任务共享读取，
+因此批量总耗时主要取决于不重复输入的读取成本，而不是各任务读取成本之和。
+"""
+
+import os
+import re
+import copy
+import json
+import time
+import tempfile
+import contextlib
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+import yaml
+
+from src.core.tasks import build_analysis_tasks
+from src.core.workflow import execute_analysis
+from src.data.loader import (
+    load_task_dataframes, get_shared_frame_key, write_shared_frame, register_shared_frames, get_source_name,
+    get_known_content_hashes, register_content_hashes
+)
+
+DEFAULT_SUMMARY_DIRECTORY = './logs/batch'
+
+# 影响数据读取方式的配置节；这些配置不同的任务分别预加载
+_LOADING_SECTIONS = ('loading', 'cache', 'streaming')
+
+def merge_config(base: Dict, override: Dict) -> Dict:
+    """将 `override` 递归合并到配置 `base` 的副本上，字典逐层合并，其他值直接覆盖。"""
+    merged = copy.deepcopy(base)
+    for key, value in (override or {}).items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_config(merged[key], value)
+        else:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+def load_manifest(path: str) -> Dict:
+    """读取批量任务清单。"""
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = yaml.safe_load(f) or {}
+    if not manifest.get('jobs'):
+        raise ValueError(f"任务清单 '{path}' 中没有任何任务（jobs）。")
+    return manifest
+
+def build_jobs(manifest: Dict) -> List[Dict]:
+    """将清单展开为任务列表：每个任务包含名称、合并后的完整配置和分析任务列表。"""
+    with open(manifest.get('base_config') or 'config.yaml', 'r', encoding='utf-8') as f:
+        base_config = yaml.safe_load(f) or {}
+
+    jobs = []
+    for i, job_spec in enumerate(manifest['jobs'], start=1):
+        overrides = {k: v for k, v in job_spec.items() if k != 'name'}
+        name = job_spec.get('name') or f'job_{i}'
+        config = merge_config(base_config, overrides)
+        print(f"\n📋 任务 {i}: {name}")
+        jobs.append({'name': name, 'config': config, 'tasks': build_analysis_tasks(config)})
+    return jobs
+
+def _preload_shared_inputs(jobs: List[Dict], store_dir: str) -> Dict[str, str]:
+    """
+    在主进程中一次性读取并格式化所有任务用到的不重复输入，写入 `store_dir` 下的Arrow文件。
+    关键列、格式化规则和读取配置（`loading`、`cache`、`streaming`）都相同的输入分为一组，
+    组内按该组的配置通过 `load_task_dataframes` 并行读取。
+    """
+    groups: Dict[str, Dict] = {}
+    for job in jobs:
+        config = job['config']
+        params = config['analysis_params']
+        key_columns, formatting_rules = params['key_columns'], params.get('formatting_rules')
+        loading_config = {section: config.get(section) for section in _LOADING_SECTIONS}
+        group = groups.setdefault(
+            json.dumps([key_columns, formatting_rules, loading_config], ensure_ascii=False, sort_keys=True),
+            {'key_columns': key_columns, 'formatting_rules': formatting_rules, 'config': config, 'inputs': {}}
+        )
+        for task in job['tasks']:
+            try:
+                frame_key = get_shared_frame_key(task, key_columns, formatting_rules)
+            except OSError as e:
+                # 无法访问的输入不预加载，由对应任务自行报错
+                print(f"⚠️ 跳过预加载 {get_source_name(task)}: {e}")
+                continue
+            group['inputs'].setdefault(frame_key, task)
+
+    shared_frames = {}
+    for group in groups.values():
+        frame_keys, tasks = list(group['inputs'].keys()), list(group['inputs'].values())
+        for task in tasks:
+            print(f"  - 正在预加载: {get_source_name(task)}")
+        try:
+            # 共享数据保存格式化后的原始文本，列类型由各任务按自己的 `schema` 配置转换
+            frames = load_task_dataframes(
+                tasks, group['key_columns'], group['formatting_rules'], dict(group['config'], schema=None)
+            )
+        except Exception as e:
+            print(f"⚠️ 预加载失败，相关任务将各自读取数据源: {e}")
+            continue
+        for frame_key, df in zip(frame_keys, frames):
+            path = os.path.join(store_dir, f"{frame_key}.arrow")
+            write_shared_frame(df, path)
+            shared_frames[frame_key] = path
+    return shared_frames
+
+def _safe_filename(name: str) -> str:
+    """将任务名转换为可用作文件名的文本：替换路径分隔符等非法字符和 '..'，避免日志写到日志目录之外。"""
+    name = re.sub(r'[\\/:*?"<>|\x00-\x1f]', '_', str(name)).replace('..', '_').strip(' .')
+    return name or 'job'
+
+def _run_job(job: Dict, shared_frames: Dict[str, str], content_hashes: Dict, log_path: str) -> Dict:
+    """
+    在工作进程中执行单个任务，控制台输出和错误堆栈写入任务日志，返回执行状态和耗时。
+    `content_hashes` 为主进程预加载时已计算的文件内容哈希，工作进程查找共享数据时不再重新读取文件计算哈希。
+    """
+    register_content_hashes(content_hashes)
+    register_shared_frames(shared_frames)
+    config = copy.deepcopy(job['config'])
+    # 任务本身已在进程池中并行，任务内部不再另起加载进程池
+    config.setdefault('loading', {})['max_workers'] = 1
+
+    start = time.perf_counter()
+    error = None
+    with open(log_path, 'w', encoding='utf-8') as log_file, \
+            contextlib.redirect_stdout(log_file), contextlib.redirect_stderr(log_file):
+        try:
+            succeeded = bool(job['tasks']) and execute_analysis(job['tasks'], config)
+        except Exception as e:
+            succeeded, error = False, str(e)
+    return {
+        'name': job['name'],
+        'status': '成功' if succeeded else '失败',
+        'seconds': round(time.perf_counter() - start, 2),
+        'sources': len(job['tasks']),
+        'log': log_path,
+        'error': error or (None if succeeded else '详见任务日志'),
+    }
+
+def _print_summary(results: List[Dict], total_seconds: float, preload_seconds: float):
+    print("\n--- 批量任务汇总 ---")
+    for result in results:
+        icon = '✅' if result['status'] == '成功' else '❌'
+        seconds = '-' if result['seconds'] is None else f"{result['seconds']:.2f}"
+        print(f"{icon} {result['name']}: {result['status']}，耗时 {seconds} 秒，日志: {result['log']}")
+    n_failed = sum(result['status'] != '成功' for result in results)
+    print(f"共 {len(results)} 个任务，成功 {len(results) - n_failed} 个，失败 {n_failed} 个；"
+          f"预加载耗时 {preload_seconds:.2f} 秒，总耗时 {total_seconds:.2f} 秒。")
+
+def run_batch(manifest_path: str) -> List[Dict]:
+    """执行任务清单中的所有任务，返回每个任务的执行结果，并将汇总写入 `summary_directory`。"""
+    batch_start = time.perf_counter()
+    manifest = load_manifest(manifest_path)
+    jobs = build_jobs(manifest)
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    summary_dir = manifest.get('summary_directory') or DEFAULT_SUMMARY_DIRECTORY
+    log_dir = os.path.join(summary_dir, f'batch_{timestamp}')
+    os.makedirs(log_dir, exist_ok=True)
+
+    max_workers = max(1, int(manifest.get('max_workers') or os.cpu_count() or 1))
+    with tempfile.TemporaryDirectory(prefix='dqct_batch_') as store_dir:
+        print(f"\n📦 正在预加载 {len(jobs)} 个任务用到的数据源...")
+        preload_start = time.perf_counter()
+        runnable = [job for job in jobs if job['tasks']]
+        shared_frames = _preload_shared_inputs(runnable, store_dir)
+        content_hashes = get_known_content_hashes()
+        preload_seconds = time.perf_counter() - preload_start
+
+        print(f"\n🚀 正在以 {min(max_workers, len(jobs))} 个进程执行 {len(jobs)} 个任务...")
+        run_start = time.perf_counter()
+        log_paths = [
+            os.path.join(log_dir, f'{i:03d}_{_safe_filename(job["name"])}.log') for i, job in enumerate(jobs, start=1)
+        ]
+        if max_workers == 1:
+            results = [_run_job(job, shared_frames, content_hashes, path) for job, path in zip(jobs, log_paths)]
+        else:
+            with ProcessPoolExecutor(max_workers=min(max_workers, len(jobs))) as executor:
+                futures = [
+                    executor.submit(_run_job, job, shared_frames, content_hashes, path)
+                    for job, path in zip(jobs, log_paths)
+                ]
+                results = []
+                for job, path, future in zip(jobs, log_paths, futures):
+                    try:
+                        results.append(future.result())
+                    except Exception as e:
+                        # 工作进程异常退出（如内存不足被终止）时没有任务自身的耗时，记录从开始执行到发现失败的时间
+                        results.append({'name': job['name'], 'status': '失败',
+                                        'seconds': round(time.perf_counter() - run_start, 2),
+                                        'sources': len(job['tasks']), 'log': path, 'error': str(e) or type(e).__name__})
+
+    total_seconds = time.perf_counter() - batch_start
+    # 先保存汇总文件，打印汇总出错时也不会丢失各任务的结果
+    summary_path = os.path.join(log_dir, 'summary.json')
+    with open(summary_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'manifest': manifest_path,
+            'total_seconds': round(total_seconds, 2),
+            'preload_seconds': round(preload_seconds, 2),
+            'jobs': results,
+        }, f, ensure_ascii=False, indent=2)
+    _print_summary(results, total_seconds, preload_seconds)
+    print(f"\n📄 批量任务汇总已保存至: {summary_path}")
+    return results
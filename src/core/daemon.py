@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+"""
+常驻分析服务：在本机HTTP端口上提供对比与追溯分析，已加载的数据常驻内存。
+
+接口：
+    GET  /status   返回服务运行时长、常驻数据和已处理请求数。
+    POST /analyze  请求体为JSON，格式与批量任务清单中的单个任务相同（除 `name` 外的字段深度合并到基础配置），
+                   例如 {"data_sources": {"files": ["./data/最新数据v2.xlsx", "./data/最新数据v3.xlsx"]}}；
+                   空请求体则按基础配置执行。返回 {"success", "seconds", "output"}，`output` 为本次分析的控制台输出。
+
+基础配置文件在磁盘上变化后会在下一次请求时重新读取。分析请求逐个执行，/status 可随时访问。
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import threading
+import contextlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+import yaml
+
+from src.core.batch import merge_config
+from src.core.tasks import build_analysis_tasks
+from src.core.workflow import execute_analysis
+from src.data.loader import set_resident_cache, load_task_dataframes
+from src.data.resident import ResidentFrameCache, DEFAULT_MAX_MEMORY_MB
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+class AnalysisDaemon:
+    """持有基础配置、常驻数据缓存和分析锁的服务状态。"""
+
+    def __init__(self, config_path: str):
+        self.config_path = config_path
+        self._config: Optional[Dict] = None
+        self._config_mtime: Optional[int] = None
+        self.daemon_config = self.base_config().get('daemon') or {}
+        self.cache = ResidentFrameCache(self.daemon_config.get('max_memory_mb') or DEFAULT_MAX_MEMORY_MB)
+        self.started_at = time.time()
+        self.requests = 0
+        # 控制台输出按请求重定向，分析请求需逐个执行
+        self._analysis_lock = threading.Lock()
+
+    def base_config(self) -> Dict:
+        """返回基础配置；配置文件修改后重新读取。"""
+        mtime = os.stat(self.config_path).st_mtime_ns
+        if self._config is None or mtime != self._config_mtime:
+            with open(self.config_path, 'r', encoding='utf-8') as f:
+                self._config = yaml.safe_load(f) or {}
+            self._config_mtime = mtime
+        return self._config
+
+    def preload(self):
+        """按基础配置中的数据源预先加载数据。"""
+        config = self.base_config()
+        tasks = build_analysis_tasks(config)
+        if tasks:
+            params = config['analysis_params']
+            load_task_dataframes(tasks, params['key_columns'], params.get('formatting_rules'), config)
+
+    def analyze(self, overrides: Dict) -> Dict:
+        config = merge_config(self.base_config(), overrides)
+        buffer = io.StringIO()
+        with self._analysis_lock:
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(buffer), contextlib.redirect_stderr(buffer):
+                try:
+                    tasks = build_analysis_tasks(config)
+                    success = bool(tasks) and execute_analysis(tasks, config)
+                except Exception as e:
+                    print(f"❌ 分析请求执行失败: {e}")
+                    success = False
+            seconds = time.perf_counter() - start
+            self.requests += 1
+        return {'success': success, 'seconds': round(seconds, 3), 'output': buffer.getvalue()}
+
+    def status(self) -> Dict:
+        return {
+            'uptime_seconds': round(time.time() - self.started_at, 1),
+            'requests': self.requests,
+            'config': os.path.abspath(self.config_path),
+            'resident': self.cache.stats(),
+        }
+
+def _make_handler(daemon: AnalysisDaemon):
+    class Handler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, payload: Dict):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/status':
+                self._send_json(200, daemon.status())
+            else:
+                self._send_json(404, {'error': f'未知接口: {self.path}'})
+
+        def do_POST(self):
+            if self.path != '/analyze':
+                self._send_json(404, {'error': f'未知接口: {self.path}'})
+                return
+            try:
+                length = int(self.headers.get('Content-Length') or 0)
+                overrides = json.loads(self.rfile.read(length) or b'{}') if length else {}
+                if not isinstance(overrides, dict):
+                    raise ValueError('请求体应为JSON对象')
+            except ValueError as e:
+                self._send_json(400, {'error': f'无效的请求体: {e}'})
+                return
+            result = daemon.analyze(overrides)
+            status = '✅' if result['success'] else '❌'
+            # 写入服务自身的控制台，不受其他请求的输出重定向影响
+            print(f"{status} POST /analyze 耗时 {result['seconds']:.3f} 秒", file=sys.__stdout__, flush=True)
+            self._send_json(200, result)
+
+        def log_message(self, format, *args):
+            # 请求日志由 do_POST 输出，避免默认日志在分析期间写入被重定向的输出
+            pass
+
+    return Handler
+
+def serve(config_path: str = 'config.yaml', host: Optional[str] = None, port: Optional[int] = None):
+    """启动常驻分析服务，直至收到中断信号。"""
+    daemon = AnalysisDaemon(config_path)
+    daemon_config = daemon.daemon_config
+    set_resident_cache(daemon.cache)
+
+    if daemon_config.get('preload', True):
+        print("📦 正在预加载数据源...")
+        try:
+            daemon.preload()
+        except Exception as e:
+            print(f"⚠️ 预加载失败，将在首次请求时加载: {e}")
+
+    host = host or daemon_config.get('host') or DEFAULT_HOST
+    port = port or daemon_config.get('port') or DEFAULT_PORT
+    server = ThreadingHTTPServer((host, port), _make_handler(daemon))
+    print(f"🚀 常驻分析服务已启动: http://{host}:{port}（POST /analyze, GET /status），按 Ctrl+C 停止")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 服务已停止")
+    finally:
+        server.server_close()
+        set_resident_cache(None)
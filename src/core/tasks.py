@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+"""
+根据配置准备分析任务列表。
+
+本模块只依赖标准库，配置检查等不读取数据的命令无需导入 pandas 和大模型客户端。
+"""
+
+import os
+from typing import List, Dict
+
+from src.analysis.detectors import BUILTIN_DETECTORS
+from src.utils.file_handler import EXPORT_FORMATS
+
+def build_analysis_tasks(config: Dict) -> List[Dict]:
+    """根据配置的分析模式准备分析任务列表，并打印配置检查信息。"""
+    analysis_tasks = []
+    mode = config.get('active_mode', 'FILES')
+
+    print("--- 配置检查 ---")
+    if mode == 'FILES':
+        files_to_compare = config.get('data_sources', {}).get('files', [])
+        print(f"ℹ️ 模式: 【文件对比】")
+        print(f"📚 文件列表: {', '.join([os.path.basename(f) for f in files_to_compare])}")
+        analysis_tasks = [{'file': f} for f in files_to_compare]
+    elif mode == 'SHEETS':
+        sheets_config = config.get('data_sources', {}).get('sheets_config', {})
+        file_path = sheets_config.get('file_path')
+        sheet_names = sheets_config.get('sheet_names')
+        if file_path and sheet_names:
+            print(f"ℹ️ 模式: 【工作表对比】")
+            print(f"📂 文件: {os.path.basename(file_path)}")
+            print(f"📑 工作表顺序: {', '.join(sheet_names)}")
+            analysis_tasks = [{'file': file_path, 'sheet': s} for s in sheet_names]
+        else:
+            print("❌ 'SHEETS' 模式配置不完整。")
+    else:
+        print(f"❌ 未知的对比模式: '{mode}'。")
+    print("------------------\n")
+    return analysis_tasks
+
+def validate_config(config: Dict, analysis_tasks: List[Dict]) -> List[str]:
+    """检查运行所需的配置项和数据源文件是否齐全，返回发现的问题列表（为空表示检查通过）。"""
+    problems = []
+    params = config.get('analysis_params') or {}
+    if not params.get('key_columns'):
+        problems.append("未配置 analysis_params.key_columns（关键列）。")
+    if len(analysis_tasks) > 2 and not params.get('value_column'):
+        problems.append("历史追溯模式需要配置 analysis_params.value_column。")
+    output = config.get('output') or {}
+    for key in ('log_directory', 'report_directory'):
+        if not output.get(key):
+            problems.append(f"未配置 output.{key}。")
+    export_format = (output.get('export') or {}).get('format')
+    if export_format is not None and export_format not in EXPORT_FORMATS:
+        problems.append(f"output.export.format 只能为 {', '.join(repr(fmt) for fmt in EXPORT_FORMATS)}。")
+    for col, spec in ((config.get('schema') or {}).get('columns') or {}).items():
+        spec = spec or {}
+        if spec.get('type') not in (None, 'numeric', 'text'):
+            problems.append(f"schema.columns.{col}.type 只能为 'numeric' 或 'text'。")
+        tolerance = spec.get('tolerance')
+        if tolerance is not None and (not isinstance(tolerance, (int, float)) or tolerance < 0):
+            problems.append(f"schema.columns.{col}.tolerance 必须为非负数。")
+    for name, options in ((config.get('anomaly_scoring') or {}).get('detectors') or {}).items():
+        if name not in BUILTIN_DETECTORS:
+            problems.append(
+                f"未知的异常检测器 anomaly_scoring.detectors.{name}（可选: {', '.join(BUILTIN_DETECTORS)}）。"
+            )
+        if options is not None and not isinstance(options, dict):
+            problems.append(f"anomaly_scoring.detectors.{name} 必须为字典（如 {{weight: 0.2}}）。")
+            continue
+        weight = (options or {}).get('weight')
+        if weight is not None and not isinstance(weight, (int, float)):
+            problems.append(f"anomaly_scoring.detectors.{name}.weight 必须为数值。")
+    partitions = (config.get('partitioned_diff') or {}).get('partitions')
+    if partitions is not None and (not isinstance(partitions, int) or partitions < 1):
+        problems.append("partitioned_diff.partitions 必须为正整数。")
+    fraction = (config.get('sampling') or {}).get('fraction')
+    if fraction is not None and (not isinstance(fraction, (int, float)) or not 0 < fraction <= 1):
+        problems.append("sampling.fraction 必须为 (0, 1] 之间的数值。")
+    watch_order = (config.get('watch') or {}).get('order')
+    if watch_order is not None and watch_order not in ('name', 'mtime'):
+        problems.append("watch.order 只能为 'name' 或 'mtime'。")
+
+    if len(analysis_tasks) < 2:
+        problems.append("至少需要提供两个数据源才能进行分析。")
+    for path in dict.fromkeys(task['file'] for task in analysis_tasks):
+        if not os.path.isfile(path):
+            problems.append(f"数据源文件不存在: {path}")
+
+    llm_config = config.get('llm') or {}
+    if llm_config.get('enabled', True):
+        if not llm_config.get('model_name'):
+            problems.append("未配置 llm.model_name。")
+        from src.llm.client import get_client_settings
+        try:
+            get_client_settings()
+        except ValueError as e:
+            problems.append(f"{e}（如只需生成差异明细和Prompt，可使用离线模式）")
+    return problems
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+
+"""
+监视模式：轮询数据目录，新版本文件到达后只执行增量分析。
+
+    python main.py watch [--offline]
+
+目录中文件名匹配 `watch.pattern` 的文件视为同一数据的各个版本，按 `watch.order` 排序（配置中的 `data_sources` 不使用）。
+新增或被覆盖的文件在 `settle_seconds` 内大小和修改时间都不再变化（xlsx 还需是完整的压缩包）才视为写入完成；
+Excel 的临时锁文件（~$ 开头）和隐藏文件会被忽略。每次轮询中写入完成的版本：
+    1. 各自与排序在它之前的版本做双版本比对；
+    2. 整批只以增量模式更新一次历史追溯（见 `incremental`），追溯状态中已有的版本不重新读取。
+已解析的版本常驻内存（容量上限为 `watch.max_memory_mb`），新文件只解析一次，先前的版本不重新解析。
+启动时目录中已有的版本视为已到达；`process_existing` 为 true 时先为它们建立追溯状态。
+"""
+
+import os
+import re
+import time
+import fnmatch
+import zipfile
+from typing import Dict, List, Optional, Tuple
+
+from src.core.batch import merge_config
+from src.core.workflow import execute_comparison_workflow, execute_historical_workflow
+from src.data.loader import set_resident_cache, get_source_name
+from src.data.resident import ResidentFrameCache, DEFAULT_MAX_MEMORY_MB
+
+DEFAULT_WATCH_DIRECTORY = './data'
+DEFAULT_PATTERN = '*.xlsx'
+DEFAULT_POLL_INTERVAL_SECONDS = 2.0
+DEFAULT_SETTLE_SECONDS = 3.0
+
+Signature = Tuple[int, int]
+
+def _natural_key(path: str) -> List:
+    """文件名的自然排序键：数字部分按数值比较（v2 排在 v10 之前）。"""
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', os.path.basename(path))]
+
+def _is_complete(path: str) -> bool:
+    """xlsx/xlsm 文件需是完整的压缩包（写入中断或尚未写完的文件缺少末尾的目录结构）。"""
+    if os.path.splitext(path)[1].lower() in ('.xlsx', '.xlsm'):
+        return zipfile.is_zipfile(path)
+    return True
+
+class DirectoryWatcher:
+    """轮询目录中匹配模式的文件；文件新增或变化后，签名（大小、修改时间）保持不变超过防抖时间才报告。"""
+
+    def __init__(self, directory: str, pattern: str, settle_seconds: float):
+        self.directory = directory
+        self.pattern = pattern
+        self.settle_seconds = settle_seconds
+        # 已报告的文件及其签名
+        self.known: Dict[str, Signature] = {}
+        # 等待写入完成的文件：路径 -> (签名, 签名最近一次变化的时间)
+        self._pending: Dict[str, Tuple[Signature, float]] = {}
+
+    def scan(self) -> Dict[str, Signature]:
+        """返回目录中所有匹配文件的当前签名。"""
+        signatures = {}
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return signatures
+        for name in names:
+            if name.startswith(('~$', '.')) or not fnmatch.fnmatch(name, self.pattern):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if os.path.isfile(path):
+                signatures[path] = (stat.st_size, stat.st_mtime_ns)
+        return signatures
+
+    def prime(self) -> List[str]:
+        """将当前已有的文件视为已就绪，返回这些文件。"""
+        self.known = self.scan()
+        return list(self.known)
+
+    def poll(self, now: Optional[float] = None) -> Tuple[List[str], List[str]]:
+        """检查一次目录，返回 (写入完成的新增或变化文件, 已删除的文件)。"""
+        now = time.monotonic() if now is None else now
+        current = self.scan()
+        removed = [path for path in self.known if path not in current]
+        for path in removed:
+            del self.known[path]
+        for path in [path for path in self._pending if path not in current]:
+            del self._pending[path]
+
+        ready = []
+        for path, signature in current.items():
+            if self.known.get(path) == signature:
+                continue
+            pending = self._pending.get(path)
+            if pending is None or pending[0] != signature:
+                self._pending[path] = (signature, now)
+            elif now - pending[1] >= self.settle_seconds and _is_complete(path):
+                del self._pending[path]
+                self.known[path] = signature
+                ready.append(path)
+        return ready, removed
+
+def _sort_versions(paths: List[str], order: str) -> List[str]:
+    if order == 'mtime':
+        return sorted(paths, key=lambda path: (os.stat(path).st_mtime_ns, _natural_key(path)))
+    return sorted(paths, key=_natural_key)
+
+def _version_config(config: Dict, files: List[str], incremental: bool = False) -> Dict:
+    overrides = {'active_mode': 'FILES', 'data_sources': {'files': files}}
+    if incremental:
+        overrides['incremental'] = {'enabled': True}
+    return merge_config(config, overrides)
+
+def _update_history(config: Dict, versions: List[str]) -> bool:
+    """以增量模式对所有版本执行历史追溯；只有两个版本时没有可追溯的历史。"""
+    if len(versions) < 3:
+        return True
+    tasks = [{'file': path} for path in versions]
+    return execute_historical_workflow(tasks, _version_config(config, versions, incremental=True))
+
+def _process_versions(config: Dict, versions: List[str], ready: List[str]) -> bool:
+    """
+    对一次轮询中写入完成的所有版本逐个执行相邻版本比对，再对整批版本只执行一次增量历史追溯（生成一份报告）。
+    """
+    start = time.perf_counter()
+    success = True
+    for path in ready:
+        index = versions.index(path)
+        print(f"\n📥 检测到新版本: {get_source_name({'file': path})}（第 {index + 1}/{len(versions)} 个版本）")
+        if index == 0:
+            continue
+        pair = [versions[index - 1], path]
+        success = execute_comparison_workflow([{'file': p} for p in pair], _version_config(config, pair)) and success
+    success = _update_history(config, versions) and success
+    status = '✅' if success else '❌'
+    print(f"{status} 本批 {len(ready)} 个新版本处理完成，耗时 {time.perf_counter() - start:.2f} 秒")
+    return success
+
+def watch(config: Dict):
+    """监视数据目录并处理到达的新版本，直至收到中断信号。"""
+    watch_config = config.get('watch') or {}
+    directory = watch_config.get('directory') or DEFAULT_WATCH_DIRECTORY
+    pattern = watch_config.get('pattern') or DEFAULT_PATTERN
+    order = watch_config.get('order') or 'name'
+    poll_interval = watch_config.get('poll_interval_seconds') or DEFAULT_POLL_INTERVAL_SECONDS
+    settle_seconds = watch_config.get('settle_seconds')
+    watcher = DirectoryWatcher(directory, pattern, DEFAULT_SETTLE_SECONDS if settle_seconds is None else settle_seconds)
+    set_resident_cache(ResidentFrameCache(watch_config.get('max_memory_mb') or DEFAULT_MAX_MEMORY_MB))
+
+    versions = _sort_versions(watcher.prime(), order)
+    print(f"👀 正在监视目录 {directory}（文件名模式: {pattern}），已有 {len(versions)} 个版本:")
+    for path in versions:
+        print(f"  - {get_source_name({'file': path})}")
+    if watch_config.get('process_existing', True) and len(versions) >= 3:
+        print("📦 正在为已有版本建立增量追溯状态...")
+        try:
+            _update_history(config, versions)
+        except Exception as e:
+            print(f"❌ 为已有版本建立追溯状态时发生错误: {e}")
+
+    try:
+        while True:
+            time.sleep(poll_interval)
+            ready, removed = watcher.poll()
+            for path in removed:
+                print(f"⚠️ 版本文件已删除: {get_source_name({'file': path})}")
+            if not ready:
+                continue
+            versions = _sort_versions(list(watcher.known), order)
+            try:
+                _process_versions(config, versions, _sort_versions(ready, order))
+            except Exception as e:
+                print(f"❌ 处理新版本时发生错误: {e}")
+    except KeyboardInterrupt:
+        print("\n🛑 监视已停止")
+    finally:
+        set_resident_cache(None)
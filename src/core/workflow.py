@@ -1,17 +1,134 @@
 # -*- coding: utf-8 -*-
 
-import pandas as pd
+import os
+from datetime import datetime
 from typing import List, Dict
 
 # 从项目模块中导入
-from src.data.loader import read_and_validate_excel, apply_formatting_rules, get_source_name
-from src.analysis import comparison, historical
-from src.llm.client import get_llm_client, request_llm_analysis
+from src.data.loader import (
+    load_task_dataframes, iter_task_chunks, get_source_name, get_resident_cache,
+    set_resident_cache
+)
+from src.data.resident import ResidentFrameCache
+from src.data.keys import encode_key_columns
+from src.data.schema import get_column_tolerances
+from src.analysis import comparison, historical, partitioned, sampling, trace_state
+from src.llm import map_reduce
+from src.llm import cache as llm_cache
+from src.llm.client import get_llm_client, request_llm_analysis, stream_llm_analysis
 from src.llm.prompts import create_comparison_prompt, create_historical_prompt
-from src.utils.file_handler import save_text_file, save_markdown_report
+from src.llm.compaction import estimate_tokens
+from src.utils.file_handler import (
+    save_text_file, save_text_lines, save_markdown_report, export_frames, StreamingReportWriter
+)
+from src.utils.metrics import WorkflowMetrics
 
-def execute_comparison_workflow(analysis_tasks: List[Dict], config: Dict):
-    """执行双版本高精度比对分析工作流。"""
+# 抽样预估后升级为完整分析时，临时缓存已读取数据的内存上限(MB)
+DEFAULT_SAMPLING_MEMORY_MB = 4096
+
+def _save_analysis_outputs(assistant_response: str, output_config: Dict, result_name: str, report_prefix: str):
+    """保存结果日志并输出、保存最终报告。"""
+    save_text_file(f"{output_config['log_directory']}/results", result_name, assistant_response)
+    print(f"\n✅ **最终综合分析报告**:\n{assistant_response}")
+    save_markdown_report(output_config['report_directory'], report_prefix, assistant_response)
+
+def _get_export_config(config: Dict, offline: bool) -> Dict:
+    """读取 `output.export` 配置；离线模式始终导出，在线模式仅在启用时导出（未导出时返回空字典）。"""
+    export_config = (config.get('output') or {}).get('export') or {}
+    if not offline and not export_config.get('enabled', False):
+        return {}
+    return {
+        'format': export_config.get('format') or 'csv',
+        'chunk_size': export_config.get('chunk_size') or comparison.DEFAULT_RENDER_CHUNK_SIZE,
+        'full_report': export_config.get('full_report', False),
+        'max_lines_in_memory': export_config.get('max_lines_in_memory'),
+    }
+
+def _iter_report_lines(diff_result, export_config: Dict):
+    """逐行产出与 `render()` 相同的完整差异报告，不在内存中拼接整份报告。"""
+    if not diff_result.has_changes:
+        yield diff_result.summary_line
+        return
+    yield f"  {diff_result.summary_line}"
+    yield ""
+    yield "--- 详细变更记录 ---"
+    yield from diff_result.iter_lines(export_config['chunk_size'], export_config['max_lines_in_memory'])
+
+def _iter_step_report_lines(steps, export_config: Dict):
+    """逐行产出各相邻版本区间的完整差异报告，每个区间以标题行分隔。"""
+    for i, step in enumerate(steps):
+        if i:
+            yield ""
+        yield f"=== {step.hist_name} -> {step.latest_name} ==="
+        yield from _iter_report_lines(step, export_config)
+
+def _record_prompt(stage: Dict, prompt: str):
+    stage['prompt_chars'] = len(prompt)
+    stage['prompt_tokens_estimated'] = int(estimate_tokens(prompt)[0])
+
+def _save_metrics(metrics: WorkflowMetrics, config: Dict, prefix: str, success: bool, cache_stats_before: Dict):
+    """汇总本次运行的大模型响应缓存命中情况，并将运行指标保存到报告目录（或 `metrics.directory`）。"""
+    metrics_config = config.get('metrics') or {}
+    if not metrics_config.get('enabled', True):
+        return
+    cache_stats = llm_cache.get_cache_stats()['session']
+    metrics.add(llm_cache={key: cache_stats[key] - cache_stats_before[key] for key in cache_stats})
+    directory = metrics_config.get('directory') or (config.get('output') or {}).get('report_directory') or '.'
+    metrics.save(directory, prefix, success)
+
+def _request_and_save_analysis(
+    prompt: str, system_prompt: str, llm_config: Dict, output_config: Dict, result_name: str, report_prefix: str,
+    metrics: WorkflowMetrics
+) -> str:
+    """
+    请求大模型分析（优先使用响应缓存）并保存结果日志和报告。
+    启用流式输出时，内容边接收边回显到控制台并追加写入结果日志和报告，中途失败时保留已接收的部分。
+    请求耗时、Token用量和首Token耗时记录在 `metrics` 的 'llm' 阶段中。
+    """
+    model = llm_config['model_name']
+    streaming = bool((llm_config.get('streaming') or {}).get('enabled'))
+    streamed = False
+    usage = {}
+    timings = {}
+
+    def request() -> str:
+        nonlocal streamed, timings
+        if not streaming:
+            return request_llm_analysis(
+                client=get_llm_client(), model=model, system_prompt=system_prompt, user_prompt=prompt, usage=usage
+            )
+        client = get_llm_client()
+        streamed = True
+        print("\n✅ **最终综合分析报告**:")
+        with StreamingReportWriter(
+            f"{output_config['log_directory']}/results", result_name, output_config['report_directory'], report_prefix
+        ) as writer:
+            content, timings = stream_llm_analysis(client, model, system_prompt, prompt, writer.write, usage)
+        ttft = timings['ttft_seconds']
+        print(f"  - 首Token耗时: {f'{ttft:.2f} 秒' if ttft is not None else '未收到内容'}，"
+              f"总生成耗时: {timings['total_seconds']:.2f} 秒")
+        return content
+
+    with metrics.stage('llm') as stage:
+        hits_before = llm_cache.get_cache_stats()['session']['hits']
+        assistant_response = llm_cache.cached_llm_request(
+            llm_config.get('response_cache'), model, system_prompt, prompt, request
+        )
+        cached = llm_cache.get_cache_stats()['session']['hits'] > hits_before
+        ttft, total = timings.get('ttft_seconds'), timings.get('total_seconds')
+        stage.update(streaming=streaming and not cached, cached=cached, usage=usage,
+                     ttft_seconds=None if ttft is None else round(ttft, 4),
+                     stream_total_seconds=None if total is None else round(total, 4),
+                     response_chars=len(assistant_response or ''))
+    if not streamed:
+        _save_analysis_outputs(assistant_response, output_config, result_name, report_prefix)
+    return assistant_response
+
+def execute_comparison_workflow(analysis_tasks: List[Dict], config: Dict) -> bool:
+    """执行双版本高精度比对分析工作流，返回是否执行成功。各阶段的运行指标保存在报告旁边。"""
+    metrics = WorkflowMetrics('comparison')
+    cache_stats_before = llm_cache.get_cache_stats()['session']
+    success = False
     try:
         # --- 配置提取 ---
         key_columns = config['analysis_params']['key_columns']
@@ -20,101 +137,357 @@ def execute_comparison_workflow(analysis_tasks: List[Dict], config: Dict):
         output_config = config['output']
         log_dir = output_config['log_directory']
 
-        # --- 数据加载 ---
+        # --- 数据加载与预处理 ---
         hist_task, latest_task = analysis_tasks[0], analysis_tasks[1]
         hist_name, latest_name = get_source_name(hist_task), get_source_name(latest_task)
 
-        print(f"  - 正在读取历史版本: {hist_name}...")
-        df_hist_raw = read_and_validate_excel(hist_task['file'], key_columns, hist_task.get('sheet'))
-        print(f"  - 正在读取最新版本: {latest_name}...")
-        df_latest_raw = read_and_validate_excel(latest_task['file'], key_columns, latest_task.get('sheet'))
-
-        # --- 数据预处理 ---
-        print("  - 正在应用自定义格式化规则...")
-        df_hist = apply_formatting_rules(df_hist_raw, formatting_rules)
-        df_latest = apply_formatting_rules(df_latest_raw, formatting_rules)
+        tolerances = get_column_tolerances(config.get('schema'))
+        partition_config = config.get('partitioned_diff') or {}
+        if partition_config.get('enabled'):
+            # 分区比对：逐块读取并按关键键哈希写入磁盘分区，不在内存中保留完整数据
+            print(f"  - 正在分块读取并分区: {hist_name}, {latest_name}...")
+            with metrics.stage('diff') as stage:
+                diff_result = partitioned.compute_partitioned_diff(
+                    iter_task_chunks(hist_task, key_columns, formatting_rules, config),
+                    iter_task_chunks(latest_task, key_columns, formatting_rules, config),
+                    key_columns, hist_name, latest_name, tolerances=tolerances, partition_config=partition_config
+                )
+                stage.update(partitioned=True, changes=len(diff_result.changes), added=diff_result.added_count,
+                             deleted=diff_result.deleted_count, modified=diff_result.modified_count)
+        else:
+            print(f"  - 正在读取并格式化历史版本: {hist_name}...")
+            print(f"  - 正在读取并格式化最新版本: {latest_name}...")
+            with metrics.stage('load') as stage:
+                df_hist, df_latest = load_task_dataframes(
+                    [hist_task, latest_task], key_columns, formatting_rules, config
+                )
+                stage['rows'] = [len(df_hist), len(df_latest)]
+            with metrics.stage('encode'):
+                key_index, (df_hist, df_latest) = encode_key_columns([df_hist, df_latest], key_columns)
 
-        # --- 核心分析 ---
-        print("  - 正在生成差异报告...")
-        diff_report = comparison.generate_precise_diff_report(df_hist, df_latest, key_columns, hist_name, latest_name)
+            # --- 核心分析 ---
+            print("  - 正在生成差异报告...")
+            with metrics.stage('diff') as stage:
+                diff_result = comparison.generate_precise_diff_report(
+                    df_hist, df_latest, key_columns, hist_name, latest_name, key_index=key_index,
+                    tolerances=tolerances
+                )
+                stage.update(changes=len(diff_result.changes), added=diff_result.added_count,
+                             deleted=diff_result.deleted_count, modified=diff_result.modified_count)
+        print(f"  - {diff_result.summary_line}")
 
         # --- LLM 交互 ---
-        prompt = create_comparison_prompt(diff_report, hist_name, latest_name)
-        print("\n📝 正在生成对比分析Prompt...")
-        save_text_file(f'{log_dir}/prompts', 'precise_comparison_prompt', prompt)
-
-        print("🤖 正在请求大模型进行分析...")
-        llm_client = get_llm_client()
-        assistant_response = request_llm_analysis(
-            client=llm_client,
-            model=llm_config['model_name'],
-            system_prompt=llm_config['system_prompts']['comparison'],
-            user_prompt=prompt
-        )
-        save_text_file(f'{log_dir}/results', 'precise_comparison_result', assistant_response)
+        offline = not llm_config.get('enabled', True)
+        export_config = _get_export_config(config, offline)
+        if export_config:
+            with metrics.stage('export'):
+                export_frames(
+                    f'{log_dir}/results', 'precise_comparison_changes',
+                    diff_result.iter_frames(export_config['chunk_size']), export_config['format']
+                )
+                if export_config['full_report']:
+                    save_text_lines(
+                        f'{log_dir}/results', 'precise_comparison_full_report',
+                        _iter_report_lines(diff_result, export_config)
+                    )
+        if not offline and map_reduce.should_use_map_reduce(diff_result, llm_config.get('map_reduce')):
+            # 差异过大时分块并发分析后再汇总，避免超出模型上下文
+            print("\n🤖 差异报告较大，正在以Map-Reduce方式分块请求大模型进行分析...")
+            usage = {}
+            with metrics.stage('llm') as stage:
+                reduce_prompt, partial_findings, assistant_response = map_reduce.run_map_reduce_analysis(
+                    diff_result, hist_name, latest_name, llm_config, usage
+                )
+                stage.update(map_reduce=True, chunks=len(partial_findings), usage=usage)
+            save_text_file(f'{log_dir}/prompts', 'precise_comparison_reduce_prompt', reduce_prompt)
+            save_text_file(
+                f'{log_dir}/results', 'precise_comparison_partial_results',
+                "\n\n".join(f"### {label}\n{text}" for label, text in partial_findings)
+            )
+            # --- 结果保存 ---
+            _save_analysis_outputs(
+                assistant_response, output_config, 'precise_comparison_result', 'Precise_Comparison_Report'
+            )
+        else:
+            with metrics.stage('prompt') as stage:
+                prompt = create_comparison_prompt(
+                    diff_result, hist_name, latest_name, llm_config.get('prompt_compaction')
+                )
+                _record_prompt(stage, prompt)
+            print("\n📝 正在生成对比分析Prompt...")
+            save_text_file(f'{log_dir}/prompts', 'precise_comparison_prompt', prompt)
 
-        # --- 结果保存 ---
-        print(f"\n✅ **最终综合分析报告**:\n{assistant_response}")
-        save_markdown_report(output_config['report_directory'], 'Precise_Comparison_Report', assistant_response)
+            # --- 请求分析并保存结果 ---
+            if offline:
+                print("ℹ️ 离线模式：已保存差异明细和Prompt，跳过大模型分析。")
+            else:
+                print("🤖 正在请求大模型进行分析...")
+                _request_and_save_analysis(
+                    prompt, llm_config['system_prompts']['comparison'], llm_config, output_config,
+                    'precise_comparison_result', 'Precise_Comparison_Report', metrics
+                )
+
+        success = True
 
     except Exception as e:
         print(f"❌ 在执行对比分析工作流时发生严重错误: {e}")
         import traceback
         traceback.print_exc()
 
-def execute_historical_workflow(analysis_tasks: List[Dict], config: Dict):
-    """执行多版本历史追溯分析工作流。"""
+    _save_metrics(metrics, config, 'Precise_Comparison_Metrics', success, cache_stats_before)
+    return success
+
+def _build_incremental_trace(
+    analysis_tasks: List[Dict], key_columns: List[str], value_column: str,
+    formatting_rules: Dict, top_n: int, tolerance: float, config: Dict
+):
+    """基于本地持久化的追溯状态增量生成轨迹表和首尾版本摘要。"""
+    base_dir = config['incremental'].get('state_directory') or trace_state.DEFAULT_STATE_DIRECTORY
+    state_dir = trace_state.get_state_directory(
+        base_dir, analysis_tasks[0], key_columns, value_column, formatting_rules, config.get('schema'), tolerance
+    )
+
+    n_stored = trace_state.prepare_trace_state(state_dir, analysis_tasks, key_columns, value_column, tolerance)
+    pending_tasks = analysis_tasks[n_stored:]
+    print(f"  - 增量模式：已有 {n_stored} 个版本的追溯状态，需新读取 {len(pending_tasks)} 个版本")
+    for i, task in enumerate(pending_tasks, start=n_stored):
+        print(f"  - 正在读取版本 {i + 1}: {get_source_name(task)}")
+
+    new_dfs = load_task_dataframes(pending_tasks, key_columns, formatting_rules, config) if pending_tasks else []
+    for task, df in zip(pending_tasks, new_dfs):
+        trace_state.append_version(state_dir, df, task, get_source_name(task))
+
+    trace_df = trace_state.generate_trace_table_from_state(state_dir, top_n, tolerance, config.get('anomaly_scoring'))
+    return trace_df, trace_state.summarize_first_last(state_dir, tolerance)
+
+def execute_historical_workflow(analysis_tasks: List[Dict], config: Dict) -> bool:
+    """执行多版本历史追溯分析工作流，返回是否执行成功。各阶段的运行指标保存在报告旁边。"""
+    metrics = WorkflowMetrics('historical')
+    cache_stats_before = llm_cache.get_cache_stats()['session']
+    success = False
     try:
         # --- 配置提取 ---
         params = config['analysis_params']
         key_columns, value_column = params['key_columns'], params['value_column']
         formatting_rules, top_n = params['formatting_rules'], params['top_n_for_analysis']
+        tolerances = get_column_tolerances(config.get('schema'))
+        tolerance = tolerances.get(value_column, 0.0)
         llm_config = config['llm']
         output_config = config['output']
         log_dir = output_config['log_directory']
 
-        # --- 数据加载与预处理 ---
-        all_dfs = []
-        for i, task in enumerate(analysis_tasks):
-            source_name = get_source_name(task)
-            print(f"  - 正在读取版本 {i + 1}: {source_name}")
-            df_raw = read_and_validate_excel(task['file'], key_columns, task.get('sheet'))
-            df_formatted = apply_formatting_rules(df_raw, formatting_rules)
-            all_dfs.append(df_formatted)
-
-        # --- 核心分析 ---
-        trace_df = historical.generate_historical_trace_table(all_dfs, key_columns, value_column, top_n)
-        md_trace_table = historical.create_historical_trace_markdown(trace_df, key_columns)
-
-        # 为摘要准备首尾版本对比
-        df_first = all_dfs[0]
-        df_last = all_dfs[-1]
-        summary_diff_report = comparison.generate_precise_diff_report(df_first, df_last, key_columns, columns_to_check=[value_column])
-        summary_line = summary_diff_report.split('\n')[0]
+        nway = None
+        if (config.get('incremental') or {}).get('enabled'):
+            # --- 增量模式：只读取尚未入库的新版本 ---
+            with metrics.stage('incremental_trace') as stage:
+                trace_df, summary_line = _build_incremental_trace(
+                    analysis_tasks, key_columns, value_column, formatting_rules, top_n, tolerance, config
+                )
+                stage['trace_rows'] = len(trace_df)
+        else:
+            # --- 数据加载与预处理 ---
+            for i, task in enumerate(analysis_tasks):
+                print(f"  - 正在读取版本 {i + 1}: {get_source_name(task)}")
+            with metrics.stage('load') as stage:
+                all_dfs = load_task_dataframes(analysis_tasks, key_columns, formatting_rules, config)
+                stage['rows'] = [len(df) for df in all_dfs]
+            with metrics.stage('encode'):
+                key_index, all_dfs = encode_key_columns(all_dfs, key_columns)
+
+            # --- 核心分析：所有版本只对齐一次，得出相邻版本的全列差异、首尾摘要和追溯矩阵 ---
+            print("  - 正在对齐所有版本并计算相邻版本的全列差异...")
+            with metrics.stage('diff') as stage:
+                nway = comparison.compute_nway_diff(
+                    all_dfs, key_columns, [get_source_name(task) for task in analysis_tasks], key_index, tolerances
+                )
+                summary_line = nway.summary_line([value_column])
+                stage.update(steps=len(nway.steps), changes=sum(len(step.changes) for step in nway.steps))
+            print(f"  - 首尾版本{summary_line}")
+
+            with metrics.stage('trace') as stage:
+                keys_df, values, present = nway.version_matrix(value_column)
+                trace_df = historical.score_trace_matrix(
+                    keys_df, values, present, top_n, key_index, tolerance, config.get('anomaly_scoring')
+                )
+                stage['trace_rows'] = len(trace_df)
+
+        with metrics.stage('render'):
+            md_trace_table = historical.create_historical_trace_markdown(trace_df, key_columns)
+            md_step_summary = historical.create_step_summary_markdown(nway.step_summary()) if nway else None
         source_names = " -> ".join([get_source_name(task) for task in analysis_tasks])
 
         # --- LLM 交互 ---
-        prompt = create_historical_prompt(
-            md_trace_table, summary_line, source_names, value_column, len(trace_df)
-        )
+        with metrics.stage('prompt') as stage:
+            prompt = create_historical_prompt(
+                md_trace_table, summary_line, source_names, value_column, len(trace_df), md_step_summary,
+                historical.describe_anomaly_scoring(config.get('anomaly_scoring'))
+            )
+            _record_prompt(stage, prompt)
         print("\n📝 正在生成历史追溯Prompt...")
         save_text_file(f'{log_dir}/prompts', 'historical_trace_prompt', prompt)
 
-        print("🤖 正在请求大模型进行分析...")
-        llm_client = get_llm_client()
-        assistant_response = request_llm_analysis(
-            client=llm_client,
-            model=llm_config['model_name'],
-            system_prompt=llm_config['system_prompts']['historical'],
-            user_prompt=prompt
-        )
-        save_text_file(f'{log_dir}/results', 'historical_trace_result', assistant_response)
+        # --- 请求分析并保存结果 ---
+        offline = not llm_config.get('enabled', True)
+        export_config = _get_export_config(config, offline)
+        if export_config:
+            with metrics.stage('export'):
+                export_frames(f'{log_dir}/results', 'historical_trace_table', [trace_df], export_config['format'])
+                if nway is not None:
+                    export_frames(
+                        f'{log_dir}/results', 'historical_adjacent_changes',
+                        nway.iter_frames(export_config['chunk_size']), export_config['format']
+                    )
+                    if export_config['full_report']:
+                        save_text_lines(
+                            f'{log_dir}/results', 'historical_adjacent_full_report',
+                            _iter_step_report_lines(nway.steps, export_config)
+                        )
+        if offline:
+            print("ℹ️ 离线模式：已保存追溯轨迹表和Prompt，跳过大模型分析。")
+        else:
+            print("🤖 正在请求大模型进行分析...")
+            _request_and_save_analysis(
+                prompt, llm_config['system_prompts']['historical'], llm_config, output_config,
+                'historical_trace_result', 'Historical_Trace_Report', metrics
+            )
 
-        # --- 结果保存 ---
-        print(f"\n✅ **最终综合分析报告**:\n{assistant_response}")
-        save_markdown_report(output_config['report_directory'], 'Historical_Trace_Report', assistant_response)
+        success = True
 
     except Exception as e:
         print(f"❌ 在执行历史追溯工作流时发生严重错误: {e}")
         import traceback
-        traceback.print_exc()
\ No newline at end of file
+        traceback.print_exc()
+
+    _save_metrics(metrics, config, 'Historical_Trace_Metrics', success, cache_stats_before)
+    return success
+
+def _run_sampled_estimate(analysis_tasks: List[Dict], config: Dict, metrics: WorkflowMetrics):
+    """在抽样数据上执行比对（或多版本追溯），返回 (预估报告行, 预估的变更记录总数)。"""
+    params = config['analysis_params']
+    key_columns, formatting_rules = params['key_columns'], params['formatting_rules']
+    sampling_config = config.get('sampling') or {}
+    fraction = sampling_config.get('fraction') or sampling.DEFAULT_SAMPLE_FRACTION
+    confidence = sampling_config.get('confidence') or sampling.DEFAULT_CONFIDENCE
+    if not 0 < fraction <= 1:
+        raise ValueError(f"sampling.fraction 必须在 (0, 1] 之间，当前为 {fraction}。")
+    group_by = sampling_config.get('group_by')
+    tolerances = get_column_tolerances(config.get('schema'))
+    names = [get_source_name(task) for task in analysis_tasks]
+
+    for i, name in enumerate(names):
+        print(f"  - 正在读取版本 {i + 1}: {name}")
+    with metrics.stage('load') as stage:
+        all_dfs = load_task_dataframes(analysis_tasks, key_columns, formatting_rules, config)
+        stage['rows'] = [len(df) for df in all_dfs]
+    with metrics.stage('sample') as stage:
+        samples = sampling.sample_frames(all_dfs, key_columns, fraction)
+        del all_dfs
+        stage.update(fraction=fraction, rows=[len(df) for df in samples])
+    print(f"  - 已按关键键哈希抽取 {fraction:.1%} 的唯一键，样本行数: {', '.join(str(len(df)) for df in samples)}")
+    with metrics.stage('encode'):
+        key_index, samples = encode_key_columns(samples, key_columns)
+
+    lines = [f"抽样预估（按关键键哈希抽取 {fraction:.1%} 的唯一键，括号内为 {confidence:.0%} 置信区间）"]
+    with metrics.stage('diff') as stage:
+        if len(samples) == 2:
+            result = comparison.generate_precise_diff_report(
+                samples[0], samples[1], key_columns, names[0], names[1], key_index=key_index, tolerances=tolerances
+            )
+            groups = None
+        else:
+            value_column = params['value_column']
+            nway = comparison.compute_nway_diff(samples, key_columns, names, key_index, tolerances)
+            result = nway.compare(0, len(samples) - 1, [value_column])
+            keys_df, values, present = nway.version_matrix(value_column)
+            trace_df = historical.score_trace_matrix(
+                keys_df, values, present, None, key_index, tolerances.get(value_column, 0.0),
+                config.get('anomaly_scoring')
+            )
+            groups = sampling.estimate_trace_groups(trace_df, group_by, fraction, confidence)
+        estimates = sampling.estimate_diff(result, fraction, confidence, None if groups is not None else group_by)
+        stage.update(added=result.added_count, deleted=result.deleted_count, modified=result.modified_count)
+
+    prefix = '首尾版本' if len(samples) > 2 else ''
+    lines.append(f"  样本{prefix}{result.summary_line}")
+    lines.append(f"  {prefix}{sampling.format_estimated_summary(estimates)}")
+    if len(samples) > 2:
+        trace_estimate = sampling.estimate_count(len(trace_df), fraction, confidence)
+        lines.append(f"  历史中有变化的记录数（预估）：{trace_estimate.format()}")
+    lines.extend(f"  {line}" for line in sampling.format_breakdown(estimates, group_by, groups))
+    return lines, sampling.estimated_total_changes(estimates)
+
+def execute_sampled_workflow(analysis_tasks: List[Dict], config: Dict) -> bool:
+    """
+    抽样快速预估工作流：在按关键键哈希抽取的样本上执行比对或追溯，输出带置信区间的预估变更数，不请求大模型。
+    启用 `sampling.escalate` 且预估的变更记录总数达到 `escalate_threshold` 时，继续执行完整分析；
+    此时数据只解析一次，完整分析复用抽样阶段已读取的数据。
+    """
+    metrics = WorkflowMetrics('sampled')
+    cache_stats_before = llm_cache.get_cache_stats()['session']
+    sampling_config = config.get('sampling') or {}
+    escalate = sampling_config.get('escalate', False)
+    temporary_cache = escalate and get_resident_cache() is None
+    if temporary_cache:
+        set_resident_cache(ResidentFrameCache(sampling_config.get('max_memory_mb') or DEFAULT_SAMPLING_MEMORY_MB))
+    success, escalated = False, False
+    try:
+        lines, total = _run_sampled_estimate(analysis_tasks, config, metrics)
+        threshold = sampling_config.get('escalate_threshold') or 0
+        escalated = escalate and total >= threshold
+        if escalate:
+            decision = '继续执行完整分析' if escalated else '无需执行完整分析'
+            lines.append(f"  预估变更记录总数约 {total:.0f} 条，升级阈值为 {threshold} 条：{decision}。")
+        report = "\n".join(lines)
+        print(f"\n📊 {report}")
+        save_text_file(f"{config['output']['log_directory']}/results", 'sampled_estimate', report)
+        metrics.add(estimated_changes=round(total), escalated=escalated)
+        success = True
+
+    except Exception as e:
+        print(f"❌ 在执行抽样预估工作流时发生严重错误: {e}")
+        import traceback
+        traceback.print_exc()
+
+    _save_metrics(metrics, config, 'Sampled_Estimate_Metrics', success, cache_stats_before)
+    if escalated:
+        print("\n🚀 预估变更数达到阈值，正在执行完整分析...")
+        if len(analysis_tasks) == 2:
+            success = execute_comparison_workflow(analysis_tasks, config)
+        else:
+            success = execute_historical_workflow(analysis_tasks, config)
+    if temporary_cache:
+        set_resident_cache(None)
+    return success
+
+def execute_analysis(analysis_tasks: List[Dict], config: Dict) -> bool:
+    """根据任务数量选择并执行相应的工作流，返回是否执行成功。"""
+    num_tasks = len(analysis_tasks)
+    if num_tasks < 2:
+        print("❌ 错误：至少需要提供两个数据源才能进行分析。")
+        return False
+
+    metrics_config = config.get('metrics') or {}
+    profiler = None
+    if metrics_config.get('profile'):
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        if (config.get('sampling') or {}).get('enabled'):
+            print(f"\n🚀 检测到 {num_tasks} 个数据源，已启动【抽样快速预估】工作流...")
+            return execute_sampled_workflow(analysis_tasks, config)
+        if num_tasks == 2:
+            print(f"\n🚀 检测到 {num_tasks} 个数据源，已启动【双版本高精度比对分析】工作流...")
+            return execute_comparison_workflow(analysis_tasks, config)
+        else:
+            print(f"\n🚀 检测到 {num_tasks} 个数据源，已启动【多版本历史追溯分析】工作流...")
+            return execute_historical_workflow(analysis_tasks, config)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            prefix = 'Precise_Comparison_Profile' if num_tasks == 2 else 'Historical_Trace_Profile'
+            directory = metrics_config.get('directory') or config['output']['report_directory']
+            profile_path = os.path.join(directory, f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.prof")
+            os.makedirs(directory, exist_ok=True)
+            profiler.dump_stats(profile_path)
+            print(f"📊 cProfile 性能剖析已保存至: {profile_path}（可使用 `python -m pstats` 或 snakeviz 查看）")
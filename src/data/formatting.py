@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+"""
+读取时的格式化与规范化规则。
+
+`analysis_params.formatting_rules` 为每列配置一条规则（字典）或按顺序执行的多条规则（列表）：
+    zfill    前置补零到 `width` 位
+    trim     去除首尾空白
+    case     大小写规范化，`mode` 为 'lower'（默认）、'upper' 或 'casefold'
+    date     日期规范化：按 `input_format`（未配置时自动识别）解析后以 `format`（默认 '%Y%m%d'）输出；
+             空单元格和无法解析的取值保持原样
+    numeric  转换为数值列：去除首尾空白和千分位分隔符 `thousands` 后解析，空单元格和无法解析的取值为缺失值
+
+规则在读取前编译一次；同一列的所有文本规则合并为一次处理，且只作用于该列的不同取值
+（低基数列中相同取值只处理一次）。格式化结果为新的DataFrame，未配置规则的列与输入共享数据，不复制整表，
+也不修改输入。
+"""
+
+import pandas as pd
+from typing import Callable, Dict, List, Optional
+
+DEFAULT_DATE_FORMAT = '%Y%m%d'
+
+# 不同取值数不超过行数的该比例时，先对不同取值应用规则再按编码展开
+_UNIQUE_RATIO = 0.5
+
+ColumnStep = Callable[[pd.Series], pd.Series]
+
+
+def _zfill_step(rule: Dict) -> Optional[ColumnStep]:
+    width = rule.get('width', 0)
+    return (lambda s: s.str.zfill(width)) if width > 0 else None
+
+
+def _trim_step(rule: Dict) -> ColumnStep:
+    return lambda s: s.str.strip()
+
+
+def _case_step(rule: Dict) -> ColumnStep:
+    mode = rule.get('mode', 'lower')
+    if mode not in ('lower', 'upper', 'casefold'):
+        raise ValueError(f"case 规则的 mode 只能为 'lower'、'upper' 或 'casefold'，当前为 '{mode}'。")
+    return lambda s: getattr(s.str, mode)()
+
+
+def _date_step(rule: Dict) -> ColumnStep:
+    output_format = rule.get('format') or DEFAULT_DATE_FORMAT
+    input_format = rule.get('input_format') or 'mixed'
+
+    def normalize(s: pd.Series) -> pd.Series:
+        parsed = pd.to_datetime(s.where(s != ''), format=input_format, errors='coerce')
+        return parsed.dt.strftime(output_format).where(parsed.notna(), s)
+    return normalize
+
+
+def _numeric_step(rule: Dict) -> ColumnStep:
+    thousands = rule.get('thousands')
+
+    def cast(s: pd.Series) -> pd.Series:
+        text = s.str.strip()
+        if thousands:
+            text = text.str.replace(thousands, '', regex=False)
+        return pd.to_numeric(text, errors='coerce')
+    return cast
+
+
+# 规则类型 -> 由规则配置生成列处理函数（返回None表示该规则不做任何处理）
+RULE_BUILDERS: Dict[str, Callable[[Dict], Optional[ColumnStep]]] = {
+    'zfill': _zfill_step,
+    'trim': _trim_step,
+    'case': _case_step,
+    'date': _date_step,
+    'numeric': _numeric_step,
+}
+
+
+def _column_rules(spec) -> List[Dict]:
+    if not spec:
+        return []
+    return list(spec) if isinstance(spec, (list, tuple)) else [spec]
+
+
+def get_numeric_columns(rules: Optional[Dict]) -> List[str]:
+    """由 `numeric` 规则转换为数值列的列名。"""
+    return [
+        col for col, spec in (rules or {}).items()
+        if any(rule.get('type') == 'numeric' for rule in _column_rules(spec))
+    ]
+
+
+def _compile_column(col: str, spec) -> List[ColumnStep]:
+    steps = []
+    for rule in _column_rules(spec):
+        builder = RULE_BUILDERS.get(rule.get('type'))
+        if builder is None:
+            raise ValueError(
+                f"列 '{col}' 的格式化规则类型 '{rule.get('type')}' 无效（可选: {', '.join(RULE_BUILDERS)}）。"
+            )
+        step = builder(rule)
+        if step is not None:
+            steps.append(step)
+    return steps
+
+
+def _apply_steps(values: pd.Series, steps: List[ColumnStep]) -> pd.Series:
+    """依次执行同一列的所有规则；低基数列只对不同取值执行后再按编码展开。"""
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    if len(uniques) <= len(values) * _UNIQUE_RATIO:
+        result = pd.Series(uniques, dtype=object)
+        for step in steps:
+            result = step(result)
+        return pd.Series(result.to_numpy()[codes], index=values.index)
+    for step in steps:
+        values = step(values)
+    return values
+
+
+def compile_formatting_rules(rules: Optional[Dict]) -> Callable[[pd.DataFrame], pd.DataFrame]:
+    """
+    将格式化规则编译为一个处理函数，返回的函数对每个DataFrame生成格式化后的新DataFrame
+    （没有需要处理的列时为共享数据的浅拷贝），不修改输入。
+    只处理字符串类型的列；规则类型无效时在编译时抛出 ValueError。
+    """
+    compiled = {}
+    for col, spec in (rules or {}).items():
+        steps = _compile_column(col, spec)
+        if steps:
+            compiled[col] = steps
+
+    def apply(df: pd.DataFrame) -> pd.DataFrame:
+        targets = [
+            col for col in compiled if col in df.columns and pd.api.types.is_string_dtype(df[col])
+        ]
+        if not targets:
+            return df.copy(deep=False)
+        formatted = {col: _apply_steps(df[col], compiled[col]) for col in targets}
+        return pd.DataFrame(
+            {col: formatted[col] if col in formatted else df[col] for col in df.columns}, copy=False
+        )
+    return apply
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+# 附加在每个版本DataFrame上的整数复合键列名
+KEY_CODE_COLUMN = '_key_code'
+
+_INT64_MAX = np.iinfo(np.int64).max
+
+
+@dataclass
+class KeyIndex:
+    """
+    一次运行内所有版本共享的关键列字典编码。
+
+    每个关键列的取值被编码为有序字典中的位置，多列编码再按混合进制组合为单个int64复合键，
+    因此复合键的整数顺序与关键列的字典序一致。当各列基数之积超出int64范围时，
+    改为对编码元组做稠密排名（`tuples` 保存排名对应的编码元组）。
+    """
+    key_columns: List[str]
+    categories: List[pd.Index]
+    radix: Optional[np.ndarray] = None
+    tuples: Optional[np.ndarray] = None
+
+    def decode(self, codes, index: Optional[pd.Index] = None) -> pd.DataFrame:
+        """将复合键还原为关键列的原始取值，仅在渲染报告时调用。"""
+        codes = np.asarray(codes, dtype=np.int64)
+        if self.radix is not None:
+            column_codes = [
+                (codes // self.radix[i]) % len(self.categories[i]) for i in range(len(self.key_columns))
+            ]
+        else:
+            column_codes = list(self.tuples[codes].T)
+        return pd.DataFrame(
+            {col: cats.take(col_codes).to_numpy() for col, cats, col_codes
+             in zip(self.key_columns, self.categories, column_codes)},
+            index=index,
+        )
+
+    def column_codes(self, codes, column: str) -> np.ndarray:
+        """取出复合键中单个关键列的编码（有序字典中的位置），用于按该列分组而无需解码取值。"""
+        codes = np.asarray(codes, dtype=np.int64)
+        i = self.key_columns.index(column)
+        if self.radix is not None:
+            return (codes // self.radix[i]) % len(self.categories[i])
+        return self.tuples[codes][:, i]
+
+
+def _factorize_shared(values: pd.Series) -> Tuple[np.ndarray, pd.Index]:
+    """对所有版本拼接后的单列做一次编码，并将字典排序后重映射编码，返回每行的编码及有序字典。"""
+    codes, uniques = pd.factorize(values)
+    uniques = pd.Index(uniques)
+    try:
+        order = uniques.argsort()
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        # 空值的编码为-1，恰好取到追加在末尾的 len(uniques)
+        codes, uniques = np.append(rank, len(uniques))[codes], uniques.take(order)
+    except TypeError:
+        # 混合类型无法排序时保留出现顺序
+        codes = np.where(codes < 0, len(uniques), codes).astype(np.int64)
+    if (codes == len(uniques)).any():
+        # 空值作为字典中的最后一个取值参与编码（与按关键列排序时空值排在最后一致）
+        uniques = uniques.append(pd.Index([np.nan], dtype=object))
+    return codes, uniques
+
+
+def encode_key_columns(
+    frames: List[pd.DataFrame], key_columns: List[str]
+) -> Tuple[KeyIndex, List[pd.DataFrame]]:
+    """
+    为所有版本的关键列构建共享字典编码，返回 (编码, 编码后的各版本)。
+    编码后的DataFrame附加 `_key_code` 复合键列，关键列转换为共享类别的分类类型以降低内存占用；
+    其余列与输入共享数据，不复制整表，也不修改输入。
+    """
+    bounds = np.cumsum([len(df) for df in frames])[:-1]
+    categories, all_codes = [], []
+    for col in key_columns:
+        # 读取时已转换为分类类型的关键列（见 `src.data.schema`）按原始取值统一编码
+        values = pd.concat([
+            df[col].astype(object) if isinstance(df[col].dtype, pd.CategoricalDtype) else df[col] for df in frames
+        ], ignore_index=True)
+        codes, cats = _factorize_shared(values)
+        categories.append(cats)
+        all_codes.append(codes)
+
+    cardinalities = [max(len(cats), 1) for cats in categories]
+    if float(np.prod(cardinalities, dtype=float)) < _INT64_MAX:
+        radix = np.ones(len(key_columns), dtype=np.int64)
+        for i in range(len(key_columns) - 2, -1, -1):
+            radix[i] = radix[i + 1] * cardinalities[i + 1]
+        key_index = KeyIndex(list(key_columns), categories, radix=radix)
+        composite = np.zeros(len(all_codes[0]) if all_codes else 0, dtype=np.int64)
+        for codes, multiplier in zip(all_codes, radix):
+            composite += codes * multiplier
+    else:
+        tuples, composite = np.unique(np.column_stack(all_codes), axis=0, return_inverse=True)
+        key_index = KeyIndex(list(key_columns), categories, tuples=tuples)
+        composite = composite.astype(np.int64).ravel()
+
+    split_codes = [np.split(codes, bounds) for codes in all_codes]
+    encoded = []
+    for i, (df, frame_composite) in enumerate(zip(frames, np.split(composite, bounds))):
+        columns = {col: df[col] for col in df.columns}
+        for col, cats, codes in zip(key_columns, categories, split_codes):
+            if not cats.hasnans:
+                columns[col] = pd.Categorical.from_codes(codes[i], categories=cats)
+        columns[KEY_CODE_COLUMN] = frame_composite
+        encoded.append(pd.DataFrame(columns, index=df.index, copy=False))
+    return key_index, encoded
+
+
+def warn_duplicate_keys(key_ids: np.ndarray, version_ids: np.ndarray, n_versions: int, version_names=None) -> int:
+    """
+    统计同一版本内关键键重复的多余行数并打印警告，返回重复行总数。
+    对齐为“键 × 版本”结构时每个键在每个版本中只保留最后一行，重复行不参与比对和追溯。
+    """
+    if len(key_ids) == 0:
+        return 0
+    cells = np.asarray(key_ids, dtype=np.int64).ravel() * n_versions + version_ids
+    unique_cells = np.unique(cells)
+    n_duplicates = len(cells) - len(unique_cells)
+    if n_duplicates:
+        per_version = np.bincount(version_ids, minlength=n_versions) - np.bincount(
+            unique_cells % n_versions, minlength=n_versions
+        )
+        names = version_names or [f"版本{i + 1}" for i in range(n_versions)]
+        detail = "，".join(f"{name}: {count} 行" for name, count in zip(names, per_version) if count)
+        print(f"⚠️ 有 {n_duplicates} 行的关键键在同一版本内重复（{detail}），每个键只保留该版本中的最后一行。")
+    return n_duplicates
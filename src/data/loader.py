@@ -1,14 +1,156 @@
 # -*- coding: utf-8 -*-
 
 import os
+import json
+import hashlib
+import tempfile
 import pandas as pd
-from typing import List, Dict, Optional
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Optional, Iterator, Tuple
 
-def read_and_validate_excel(
-    file_path: str, key_columns: List[str], sheet_name: Optional[str] = None
-) -> pd.DataFrame:
+from src.data.formatting import compile_formatting_rules
+from src.data.schema import apply_schema
+
+DEFAULT_CACHE_DIRECTORY = './.cache/ingest'
+DEFAULT_CACHE_MAX_SIZE_MB = 1024
+_CACHE_SUFFIX = '.arrow'
+
+DEFAULT_STREAM_CHUNK_SIZE = 50000
+MIN_STREAM_CHUNK_SIZE = 1000
+# 流式读取时估算内存占用所用的经验值：字符串化后每个单元格约占用的字节数，
+# 以及原始行元组 + 转换中间结果相对于最终DataFrame分块的倍数
+_EST_BYTES_PER_CELL = 80
+_RAW_CHUNK_OVERHEAD = 2
+# 流式读取时判断文本列基数的抽样行数
+_CARDINALITY_SAMPLE_SIZE = 10000
+# pandas读取时默认视为空值的文本（与 `pd.read_csv` / `pd.read_excel` 的默认 na_values 相同）
+_STR_NA_VALUES = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>',
+    'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+}
+# Excel错误值，pandas读取时会将其视为空值
+_EXCEL_ERROR_CODES = {'#NULL!', '#DIV/0!', '#VALUE!', '#REF!', '#NAME?', '#NUM!', '#N/A'}
+
+# 批量运行时由父进程预先读取并格式化、供各任务共享的数据：共享键 -> Arrow文件路径
+_shared_frames: Dict[str, str] = {}
+# 常驻服务模式下的内存数据缓存（`src.data.resident.ResidentFrameCache`），未启用时为None
+_resident_cache = None
+# 已计算的文件内容哈希：绝对路径 -> (大小, 修改时间, 内容哈希)
+_content_hashes: Dict[str, Tuple[int, int, str]] = {}
+
+def _file_content_hash(file_path: str, chunk_size: int = 1 << 20) -> str:
+    """分块计算文件内容哈希，避免一次性读入大文件。"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def get_file_content_hash(file_path: str) -> str:
     """
-    健壮地从Excel文件读取数据，并将所有列统一读取为字符串。
+    返回文件的内容哈希。同一进程内按 (绝对路径, 大小, 修改时间) 记录已计算的哈希，
+    文件大小和修改时间都未变化时直接复用，不再重新读取文件。
+    """
+    stat = os.stat(file_path)
+    path = os.path.abspath(file_path)
+    known = _content_hashes.get(path)
+    if known is not None and known[:2] == (stat.st_size, stat.st_mtime_ns):
+        return known[2]
+    digest = _file_content_hash(file_path)
+    _content_hashes[path] = (stat.st_size, stat.st_mtime_ns, digest)
+    return digest
+
+def get_known_content_hashes() -> Dict[str, Tuple[int, int, str]]:
+    """返回本进程已计算的文件内容哈希（绝对路径 -> (大小, 修改时间, 内容哈希)），可传给其他进程复用。"""
+    return dict(_content_hashes)
+
+def register_content_hashes(hashes: Dict[str, Tuple[int, int, str]]):
+    """登记其他进程已计算的文件内容哈希；文件大小和修改时间不一致的条目在使用时会重新计算。"""
+    _content_hashes.update(hashes)
+
+def _file_fingerprint(file_path: str) -> str:
+    """由路径、文件大小、修改时间和内容哈希生成文件指纹。"""
+    stat = os.stat(file_path)
+    parts = [
+        os.path.abspath(file_path),
+        str(stat.st_size),
+        str(stat.st_mtime_ns),
+        get_file_content_hash(file_path),
+    ]
+    return '\x1f'.join(parts)
+
+def _build_cache_key(fingerprint: str, sheet_name: Optional[str]) -> str:
+    """由文件指纹和工作表名生成缓存键。"""
+    sheet_part = str(sheet_name if sheet_name is not None else 0)
+    return hashlib.sha256(f"{fingerprint}\x1f{sheet_part}".encode('utf-8')).hexdigest()
+
+def _load_cached_frame(cache_dir: str, cache_key: str) -> Optional[pd.DataFrame]:
+    """
+    读取Arrow缓存文件；未命中时返回None。
+    文件以内存映射方式打开，列数据直接从页缓存转换，不会先把整个文件读入堆内存；
+    但结果仍是完整物化的pandas字符串列（下游的格式化和比对依赖该类型），内存占用与解析Excel得到的DataFrame相同。
+    按列分块转换（split_blocks），不额外合并成大块，避免转换时再多占一份内存。
+    """
+    from pyarrow import feather
+
+    cache_path = os.path.join(cache_dir, cache_key + _CACHE_SUFFIX)
+    if not os.path.exists(cache_path):
+        return None
+    table = feather.read_table(cache_path, memory_map=True)
+    # 刷新修改时间，作为LRU淘汰的“最近使用”标记
+    os.utime(cache_path)
+    return table.to_pandas(split_blocks=True)
+
+def _evict_cache(cache_dir: str, max_size_mb: float):
+    """当缓存目录超过容量上限时，按最近使用时间淘汰最旧的条目。"""
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.is_file() and entry.name.endswith(_CACHE_SUFFIX):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total_size = sum(size for _, size, _ in entries)
+    limit = max_size_mb * 1024 * 1024
+    for _, size, path in sorted(entries):
+        if total_size <= limit:
+            break
+        os.remove(path)
+        total_size -= size
+
+def _store_cached_frame(cache_dir: str, cache_key: str, df: pd.DataFrame, max_size_mb: float):
+    """将解析后的DataFrame写入未压缩的Arrow文件（读取时可直接内存映射，无需解压），并执行容量淘汰。"""
+    from pyarrow import feather
+
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_path = os.path.join(cache_dir, cache_key + _CACHE_SUFFIX)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    feather.write_feather(df, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, cache_path)
+    _evict_cache(cache_dir, max_size_mb)
+
+def _read_excel_sheets_as_strings(file_path: str, sheet_names: List[Optional[str]]) -> Dict:
+    """只打开一次工作簿，将请求的所有工作表读取为全字符串DataFrame。"""
+    targets = [s if s is not None else 0 for s in sheet_names]
+    parsed = pd.read_excel(file_path, sheet_name=targets, dtype=str)
+    frames = {}
+    for sheet_name, target in zip(sheet_names, targets):
+        df = parsed[target]
+        df.fillna('', inplace=True)
+        frames[sheet_name] = df
+    return frames
+
+def read_and_validate_excel_sheets(
+    file_path: str,
+    key_columns: List[str],
+    sheet_names: List[Optional[str]],
+    cache_config: Optional[Dict] = None
+) -> List[pd.DataFrame]:
+    """
+    从同一个Excel文件中读取多个工作表，并将所有列统一读取为字符串。
+
+    所有未命中缓存的工作表在一次打开工作簿的过程中一并解析。
+    若 `cache_config` 启用，解析结果会以Arrow列式格式缓存到本地磁盘，
+    命中缓存时将完全跳过Excel解析；关键列校验仍对缓存结果执行。
 
     Raises:
         FileNotFoundError: 如果文件路径不存在。
@@ -19,37 +161,442 @@ def read_and_validate_excel(
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"文件未找到 '{file_path}'。")
 
-        df = pd.read_excel(file_path, sheet_name=sheet_name or 0, dtype=str)
-        df.fillna('', inplace=True)
+        frames = {}
+        cache_keys = {}
+        cache_enabled = bool(cache_config and cache_config.get('enabled'))
+        cache_dir = (cache_config or {}).get('directory') or DEFAULT_CACHE_DIRECTORY
+        if cache_enabled:
+            try:
+                fingerprint = _file_fingerprint(file_path)
+                for sheet_name in sheet_names:
+                    cache_keys[sheet_name] = _build_cache_key(fingerprint, sheet_name)
+                    df = _load_cached_frame(cache_dir, cache_keys[sheet_name])
+                    if df is not None:
+                        frames[sheet_name] = df
+            except Exception as e:
+                print(f"⚠️ 读取解析缓存失败，将重新解析Excel: {e}")
+
+        missing_sheets = [s for s in dict.fromkeys(sheet_names) if s not in frames]
+        if missing_sheets:
+            parsed = _read_excel_sheets_as_strings(file_path, missing_sheets)
+            frames.update(parsed)
+            for sheet_name, df in parsed.items():
+                if sheet_name not in cache_keys:
+                    continue
+                try:
+                    max_size_mb = cache_config.get('max_size_mb', DEFAULT_CACHE_MAX_SIZE_MB)
+                    _store_cached_frame(cache_dir, cache_keys[sheet_name], df, max_size_mb)
+                except Exception as e:
+                    print(f"⚠️ 写入解析缓存失败: {e}")
 
         required_cols = set(key_columns)
-        missing_cols = required_cols - set(df.columns)
+        for sheet_name in sheet_names:
+            missing_cols = required_cols - set(frames[sheet_name].columns)
+            if missing_cols:
+                location_str = f"文件 '{os.path.basename(file_path)}'"
+                if sheet_name:
+                    location_str += f" 的工作表 '{sheet_name}'"
+                raise ValueError(f"{location_str} 中缺少必要的列: {', '.join(missing_cols)}")
+
+        return [frames[s] for s in sheet_names]
+    except Exception as e:
+        sheet_desc = ', '.join(str(s or '默认') for s in sheet_names)
+        raise Exception(f"读取或验证 '{file_path}' (工作表: {sheet_desc}) 时发生错误: {e}")
+
+def read_and_validate_excel(
+    file_path: str,
+    key_columns: List[str],
+    sheet_name: Optional[str] = None,
+    cache_config: Optional[Dict] = None
+) -> pd.DataFrame:
+    """
+    健壮地从Excel文件读取数据，并将所有列统一读取为字符串。
+
+    若 `cache_config` 启用，解析结果会以Arrow列式格式缓存到本地磁盘，
+    命中缓存时将完全跳过Excel解析；关键列校验仍对缓存结果执行。
+
+    Raises:
+        FileNotFoundError: 如果文件路径不存在。
+        ValueError: 如果缺少必要的关键列。
+        Exception: 其他读取或验证错误。
+    """
+    return read_and_validate_excel_sheets(file_path, key_columns, [sheet_name], cache_config)[0]
+
+def _cell_to_str(value) -> str:
+    """将openpyxl单元格值转换为字符串，规则与 `pd.read_excel(dtype=str)` + `fillna('')` 保持一致。"""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    text = str(value)
+    return '' if text in _STR_NA_VALUES or text in _EXCEL_ERROR_CODES else text
+
+def _share_repeated_strings(chunk: pd.DataFrame) -> pd.DataFrame:
+    """让低基数列中相同的字符串共享同一个对象，降低分块拼接后的常驻内存。"""
+    for col in chunk.columns:
+        codes, uniques = pd.factorize(chunk[col])
+        if len(uniques) * 2 < len(codes):
+            chunk[col] = uniques.take(codes)
+    return chunk
+
+def _build_header(raw_header: Tuple) -> List:
+    """生成与pandas一致的表头：空表头补为 'Unnamed: i'，重复列名追加 '.n' 后缀。"""
+    values = [int(v) if isinstance(v, float) and v.is_integer() else v for v in raw_header]
+    values = [None if v is None or v == '' else v for v in values]
+    while values and values[-1] is None:
+        values.pop()
+
+    header, seen = [], {}
+    for i, v in enumerate(values):
+        name = f'Unnamed: {i}' if v is None else v
+        if name in seen:
+            seen[name] += 1
+            name = f'{name}.{seen[name]}'
+        else:
+            seen[name] = 0
+        header.append(name)
+    return header
+
+def _resolve_stream_chunk_size(
+    n_rows: Optional[int], n_cols: int, chunk_size: int, memory_target_mb: Optional[float], location_str: str
+) -> int:
+    """根据峰值内存目标和工作表尺寸，估算每个分块可容纳的行数。"""
+    if not memory_target_mb or not n_rows:
+        return chunk_size
+
+    target_bytes = memory_target_mb * 1024 * 1024
+    frame_bytes = n_rows * n_cols * _EST_BYTES_PER_CELL
+    budget_bytes = target_bytes - frame_bytes
+    if budget_bytes <= 0:
+        print(
+            f"⚠️ {location_str} 预计占用约 {frame_bytes / 1024 / 1024:.0f} MB，"
+            f"已超过峰值内存目标 {memory_target_mb} MB，将以最小分块继续读取。"
+        )
+        return MIN_STREAM_CHUNK_SIZE
+
+    rows = int(budget_bytes / (max(n_cols, 1) * _EST_BYTES_PER_CELL * _RAW_CHUNK_OVERHEAD))
+    return max(MIN_STREAM_CHUNK_SIZE, min(chunk_size, rows))
+
+def iter_excel_chunks(
+    file_path: str,
+    key_columns: List[str],
+    sheet_name: Optional[str] = None,
+    chunk_size: int = DEFAULT_STREAM_CHUNK_SIZE,
+    memory_target_mb: Optional[float] = None
+) -> Iterator[pd.DataFrame]:
+    """
+    以openpyxl只读、仅取值模式流式读取工作表，按分块产出全字符串的DataFrame。
+
+    读取任何数据行之前先校验表头中的关键列。末尾的全空行会被丢弃，
+    单元格转换规则与 `read_and_validate_excel` 一致。
+
+    Raises:
+        FileNotFoundError: 如果文件路径不存在。
+        ValueError: 如果缺少必要的关键列。
+    """
+    from openpyxl import load_workbook
+
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"文件未找到 '{file_path}'。")
+
+    location_str = f"文件 '{os.path.basename(file_path)}'"
+    if sheet_name:
+        location_str += f" 的工作表 '{sheet_name}'"
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+    try:
+        worksheet = workbook[sheet_name] if sheet_name else workbook.worksheets[0]
+        declared_rows = worksheet.max_row
+        # 工作表声明的尺寸可能不准确，重置后按实际内容迭代
+        worksheet.reset_dimensions()
+        rows = worksheet.iter_rows(values_only=True)
 
+        header = _build_header(next(rows, ()))
+        missing_cols = set(key_columns) - set(header)
         if missing_cols:
-            location_str = f"文件 '{os.path.basename(file_path)}'"
-            if sheet_name:
-                location_str += f" 的工作表 '{sheet_name}'"
             raise ValueError(f"{location_str} 中缺少必要的列: {', '.join(missing_cols)}")
 
-        return df
-    except Exception as e:
-        raise Exception(f"读取或验证 '{file_path}' (工作表: {sheet_name or '默认'}) 时发生错误: {e}")
+        width = len(header)
+        rows_per_chunk = _resolve_stream_chunk_size(
+            declared_rows, width, chunk_size, memory_target_mb, location_str
+        )
+
+        buffer, pending_empty = [], []
+        yielded = False
+        for row in rows:
+            values = [_cell_to_str(v) for v in row[:width]]
+            values.extend([''] * (width - len(values)))
+            if not any(values):
+                # 暂存空行，只有其后出现非空行时才保留（与pandas丢弃末尾空行的行为一致）
+                pending_empty.append(values)
+                continue
+            if pending_empty:
+                buffer.extend(pending_empty)
+                pending_empty = []
+            buffer.append(values)
+            if len(buffer) >= rows_per_chunk:
+                yield _share_repeated_strings(pd.DataFrame(buffer, columns=header, dtype=object))
+                buffer = []
+                yielded = True
+
+        # 没有任何数据行时也产出一个仅含表头的空分块，便于下游保留列结构
+        if buffer or not yielded:
+            yield _share_repeated_strings(pd.DataFrame(buffer, columns=header, dtype=object))
+    finally:
+        workbook.close()
+
+def _spill_table(table, path: str):
+    """将Arrow表写入磁盘文件并以内存映射方式重新打开，数据由操作系统按需换入换出，不计入常驻内存。"""
+    import pyarrow as pa
+
+    with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    return pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+
+def _arrow_column_to_series(column, compact_text: bool) -> pd.Series:
+    """
+    将Arrow列转换为pandas列。`compact_text` 时低基数的文本列直接由Arrow数据构造为类别按字典序排列的分类类型
+    （与 `schema` 对文本列的转换结果相同），不为每个单元格生成Python字符串；其余列按常规转换
+    （抽样判断为高基数、实际为低基数的列之后仍由 `schema` 转换）。
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if compact_text and (pa.types.is_string(column.type) or pa.types.is_large_string(column.type)):
+        # 先以开头的部分行快速排除高基数列，避免为其生成与整列一样大的去重结果
+        head = column.slice(0, _CARDINALITY_SAMPLE_SIZE)
+        if pc.count_distinct(head).as_py() * 2 >= len(head) > 0:
+            return column.to_pandas()
+        uniques = pc.unique(column)
+        if len(uniques) * 2 < len(column):
+            categories = uniques.take(pc.sort_indices(uniques)).drop_null()
+            codes = pc.fill_null(pc.index_in(column, value_set=categories), -1).to_numpy()
+            categories = pd.Index(categories.to_pylist(), dtype=object)
+            return pd.Series(pd.Categorical.from_codes(codes, categories=categories))
+    return column.to_pandas()
+
+def read_excel_streaming(
+    file_path: str,
+    key_columns: List[str],
+    sheet_name: Optional[str] = None,
+    formatting_rules: Optional[Dict] = None,
+    streaming_config: Optional[Dict] = None,
+    compact_text: bool = False
+) -> pd.DataFrame:
+    """
+    以有界内存的方式读取工作表：逐块读取并应用格式化规则，每块立即转换为Arrow列式数据（字符串按紧凑的UTF-8存储）
+    并释放原分块。已读取的数据超过 `memory_target_mb` 后，此前及此后的分块都写入临时文件并以内存映射方式保留，
+    读取过程中内存中保留的分块数据不超过该目标加一个分块（openpyxl在读取期间整体保留的共享字符串表不受此限制）。
+
+    最后逐列转换为DataFrame，每转换一列即释放该列的Arrow数据。`compact_text` 时（启用 `schema` 时由调用方传入）
+    低基数的文本列直接转换为分类类型，只有高基数的文本列展开为Python字符串，返回结果小于原始工作表的字符串数据；
+    否则所有文本列都展开为字符串，结果与整表读取相同。`memory_target_mb` 不能降低返回结果本身的大小，
+    高基数文本列较多时峰值内存主要由结果决定。
+    """
+    import pyarrow as pa
+
+    streaming_config = streaming_config or {}
+    memory_target_mb = streaming_config.get('memory_target_mb')
+    max_retained_bytes = memory_target_mb * 1024 * 1024 if memory_target_mb else None
+    format_chunk = compile_formatting_rules(formatting_rules)
+    with tempfile.TemporaryDirectory(prefix='dqct_stream_', ignore_cleanup_errors=True) as spill_dir:
+        tables, retained_bytes, spilled = [], 0, False
+        try:
+            for chunk in iter_excel_chunks(
+                file_path,
+                key_columns,
+                sheet_name,
+                chunk_size=streaming_config.get('chunk_size') or DEFAULT_STREAM_CHUNK_SIZE,
+                memory_target_mb=memory_target_mb,
+            ):
+                table = pa.Table.from_pandas(format_chunk(chunk), preserve_index=False)
+                del chunk
+                if not spilled and max_retained_bytes and retained_bytes + table.nbytes > max_retained_bytes:
+                    print(f"  - 已读取的数据超过峰值内存目标 {memory_target_mb} MB，后续分块暂存到磁盘")
+                    tables = [_spill_table(t, os.path.join(spill_dir, f'{n}.arrow')) for n, t in enumerate(tables)]
+                    spilled = True
+                if spilled:
+                    table = _spill_table(table, os.path.join(spill_dir, f'{len(tables)}.arrow'))
+                else:
+                    retained_bytes += table.nbytes
+                tables.append(table)
+            # 各分块的列类型可能不同（如数值列某一块全为空），拼接时统一提升为兼容的类型
+            table = pa.concat_tables(tables, promote_options='permissive')
+            del tables
+            columns = {}
+            for name in table.column_names:
+                columns[name] = _arrow_column_to_series(table.column(name), compact_text)
+                table = table.drop_columns([name])
+            return pd.DataFrame(columns, copy=False)
+        except Exception as e:
+            raise Exception(f"流式读取 '{file_path}' (工作表: {sheet_name or '默认'}) 时发生错误: {e}")
 
 def apply_formatting_rules(df: pd.DataFrame, rules: Optional[Dict]) -> pd.DataFrame:
     """
-    根据预定义规则对DataFrame的特定列应用格式化（如前置补零等）。
+    根据预定义规则对DataFrame的特定列应用格式化（如前置补零、去除空白、日期规范化等，见 `src.data.formatting`）。
+    返回新的DataFrame，不修改输入；需要格式化多个DataFrame时应先用 `compile_formatting_rules` 编译一次。
+    """
+    return compile_formatting_rules(rules)(df)
+
+def _resolve_max_workers(config: Dict) -> int:
+    """读取并行加载的进程数配置；未配置时使用CPU核数。"""
+    max_workers = (config.get('loading') or {}).get('max_workers')
+    return max(1, int(max_workers or os.cpu_count() or 1))
+
+def _load_file_sheets(
+    file_path: str,
+    sheet_names: List[Optional[str]],
+    key_columns: List[str],
+    formatting_rules: Optional[Dict],
+    config: Dict
+) -> List[pd.DataFrame]:
     """
-    if not rules:
-        return df
+    读取同一文件中的一组工作表并应用格式化规则。
+
+    启用 `streaming` 时逐表流式读取并格式化；否则一次打开工作簿整表读取（可命中解析缓存）后再格式化。
+    """
+    streaming_config = config.get('streaming') or {}
+    if streaming_config.get('enabled'):
+        compact_text = bool((config.get('schema') or {}).get('enabled'))
+        return [
+            read_excel_streaming(file_path, key_columns, sheet_name, formatting_rules, streaming_config, compact_text)
+            for sheet_name in sheet_names
+        ]
+    raw_frames = read_and_validate_excel_sheets(file_path, key_columns, sheet_names, config.get('cache'))
+    format_frame = compile_formatting_rules(formatting_rules)
+    return [format_frame(df) for df in raw_frames]
+
+def load_task_dataframe(
+    task: Dict, key_columns: List[str], formatting_rules: Optional[Dict], config: Dict
+) -> pd.DataFrame:
+    """按配置读取单个分析任务的数据并应用格式化规则。"""
+    return _load_file_sheets(task['file'], [task.get('sheet')], key_columns, formatting_rules, config)[0]
+
+def iter_task_chunks(
+    task: Dict, key_columns: List[str], formatting_rules: Optional[Dict], config: Dict
+) -> Iterator[pd.DataFrame]:
+    """
+    逐块产出单个分析任务格式化后的数据（不转换列类型），供分区比对等不需要完整数据的场景使用。
+
+    启用 `streaming` 时边读取边格式化，内存中只保留当前分块；否则整表读取（可命中解析缓存、
+    共享数据或常驻缓存）后按 `streaming.chunk_size` 切分产出。
+    """
+    streaming_config = config.get('streaming') or {}
+    chunk_size = streaming_config.get('chunk_size') or DEFAULT_STREAM_CHUNK_SIZE
+    if not streaming_config.get('enabled'):
+        df = load_task_dataframes([task], key_columns, formatting_rules, dict(config, schema=None))[0]
+        for start in range(0, max(len(df), 1), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+        return
+    format_chunk = compile_formatting_rules(formatting_rules)
+    try:
+        for chunk in iter_excel_chunks(
+            task['file'], key_columns, task.get('sheet'),
+            chunk_size=chunk_size, memory_target_mb=streaming_config.get('memory_target_mb'),
+        ):
+            yield format_chunk(chunk)
+    except Exception as e:
+        raise Exception(f"流式读取 '{task['file']}' (工作表: {task.get('sheet') or '默认'}) 时发生错误: {e}")
+
+def get_shared_frame_key(task: Dict, key_columns: List[str], formatting_rules: Optional[Dict]) -> str:
+    """由任务指纹、关键列和格式化规则生成共享数据的键；三者一致的任务可以复用同一份格式化结果。"""
+    payload = json.dumps(
+        [get_task_fingerprint(task), list(key_columns), formatting_rules or {}], ensure_ascii=False, sort_keys=True
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def write_shared_frame(df: pd.DataFrame, path: str):
+    """将格式化后的DataFrame写入未压缩的Arrow文件，供其他进程以内存映射方式读取。"""
+    from pyarrow import feather
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    feather.write_feather(df, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, path)
+
+def register_shared_frames(shared_frames: Dict[str, str]):
+    """登记可共享的预加载数据（共享键 -> Arrow文件路径），之后的 `load_task_dataframes` 将优先从中读取。"""
+    _shared_frames.update(shared_frames)
+
+def set_resident_cache(cache):
+    """登记常驻服务的内存数据缓存，之后的 `load_task_dataframes` 将优先从中读取；传入None则停用。"""
+    global _resident_cache
+    _resident_cache = cache
+
+def get_resident_cache():
+    """返回当前登记的内存数据缓存，未登记时返回None。"""
+    return _resident_cache
+
+def _read_shared_frame(path: str) -> pd.DataFrame:
+    from pyarrow import feather
+
+    return feather.read_table(path, memory_map=True).to_pandas()
+
+def load_task_dataframes(
+    tasks: List[Dict], key_columns: List[str], formatting_rules: Optional[Dict], config: Dict
+) -> List[pd.DataFrame]:
+    """
+    并行读取所有分析任务的数据，并按任务的配置顺序返回格式化后的DataFrame。
+
+    同一文件中的多个工作表会被划分为至多 `loading.max_workers` 个批次，每个批次只打开一次工作簿；
+    各批次在进程池中并发执行。重复出现的任务只读取一次，后续出现时返回副本。
+    已通过 `register_shared_frames` 登记的任务直接读取共享的格式化结果，不再解析Excel；
+    登记了常驻内存缓存时，已驻留且文件未变化的任务直接返回内存中的副本。
+    启用 `schema` 时，所有任务读取完成后统一转换列类型（见 `src.data.schema`）。
+    """
+    if _resident_cache is not None:
+        frames = _resident_cache.load(tasks, key_columns, formatting_rules, config, _load_task_dataframes_from_files)
+    elif not _shared_frames:
+        frames = _load_task_dataframes_from_files(tasks, key_columns, formatting_rules, config)
+    else:
+        shared_paths = [_shared_frames.get(get_shared_frame_key(t, key_columns, formatting_rules)) for t in tasks]
+        missing = [task for task, path in zip(tasks, shared_paths) if path is None]
+        loaded = iter(
+            _load_task_dataframes_from_files(missing, key_columns, formatting_rules, config) if missing else []
+        )
+        frames = [_read_shared_frame(path) if path else next(loaded) for path in shared_paths]
+    return apply_schema(frames, key_columns, config.get('schema'), formatting_rules)
+
+def _load_task_dataframes_from_files(
+    tasks: List[Dict], key_columns: List[str], formatting_rules: Optional[Dict], config: Dict
+) -> List[pd.DataFrame]:
+    sheets_by_file: Dict[str, List[Optional[str]]] = {}
+    for task in tasks:
+        sheets = sheets_by_file.setdefault(task['file'], [])
+        if task.get('sheet') not in sheets:
+            sheets.append(task.get('sheet'))
+
+    max_workers = _resolve_max_workers(config)
+    batches = []
+    for file_path, sheets in sheets_by_file.items():
+        n_batches = min(len(sheets), max_workers)
+        batches.extend((file_path, sheets[i::n_batches]) for i in range(n_batches))
+
+    if max_workers == 1 or len(batches) == 1:
+        results = [_load_file_sheets(f, s, key_columns, formatting_rules, config) for f, s in batches]
+    else:
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(batches))) as executor:
+            futures = [
+                executor.submit(_load_file_sheets, f, s, key_columns, formatting_rules, config)
+                for f, s in batches
+            ]
+            results = [future.result() for future in futures]
+
+    frames = {}
+    for (file_path, sheets), dfs in zip(batches, results):
+        for sheet_name, df in zip(sheets, dfs):
+            frames[(file_path, sheet_name)] = df
+
+    ordered, seen = [], set()
+    for task in tasks:
+        task_key = (task['file'], task.get('sheet'))
+        df = frames[task_key]
+        ordered.append(df.copy() if task_key in seen else df)
+        seen.add(task_key)
+    return ordered
 
-    df_formatted = df.copy()
-    for col, rule in rules.items():
-        if col in df_formatted.columns and pd.api.types.is_string_dtype(df_formatted[col]):
-            if rule.get('type') == 'zfill':
-                width = rule.get('width', 0)
-                if width > 0:
-                    df_formatted[col] = df_formatted[col].str.zfill(width)
-    return df_formatted
+def get_task_fingerprint(task: Dict) -> str:
+    """根据文件指纹和工作表名生成任务的唯一标识；文件内容变化时标识随之变化。"""
+    return _build_cache_key(_file_fingerprint(task['file']), task.get('sheet'))
 
 def get_source_name(task: Dict) -> str:
     """根据分析任务字典生成一个人类可读的数据源名称。"""
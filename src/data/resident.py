@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+"""
+常驻服务模式下的内存数据缓存。
+
+按 (文件, 工作表, 关键列, 格式化规则) 缓存格式化后的DataFrame，总内存超过上限时按最近最少使用(LRU)淘汰。
+每次取用前比较文件的大小和修改时间，文件在磁盘上变化后自动重新读取。
+"""
+
+import os
+import json
+import threading
+import pandas as pd
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_MAX_MEMORY_MB = 2048
+
+def _stat_signature(file_path: str) -> Tuple[int, int]:
+    stat = os.stat(file_path)
+    return stat.st_size, stat.st_mtime_ns
+
+class ResidentFrameCache:
+    """
+    内存中的格式化数据缓存，通过 `load_task_dataframes` 透明使用（见 `src.data.loader.set_resident_cache`）。
+    返回与缓存共享数据的浅拷贝，不复制数据：调用方可以增删列，但不得就地修改其中的值（工作流的各阶段均不修改输入数据）。
+    """
+
+    def __init__(self, max_memory_mb: float = DEFAULT_MAX_MEMORY_MB):
+        self.max_bytes = max_memory_mb * 1024 * 1024
+        # 条目键 -> (文件签名, DataFrame, 内存占用字节数)
+        self._frames: 'OrderedDict[str, Tuple[Tuple[int, int], pd.DataFrame, int]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    @staticmethod
+    def _entry_key(task: Dict, key_columns: List[str], formatting_rules: Optional[Dict]) -> str:
+        return json.dumps(
+            [os.path.abspath(task['file']), task.get('sheet'), list(key_columns), formatting_rules or {}],
+            ensure_ascii=False, sort_keys=True
+        )
+
+    @property
+    def memory_bytes(self) -> int:
+        return sum(nbytes for _, _, nbytes in self._frames.values())
+
+    def _store(self, entry_key: str, signature: Tuple[int, int], df: pd.DataFrame):
+        self._frames[entry_key] = (signature, df, int(df.memory_usage(deep=True).sum()))
+        self._frames.move_to_end(entry_key)
+        total = self.memory_bytes
+        # 至少保留刚加载的条目，即使它本身已超过上限
+        while total > self.max_bytes and len(self._frames) > 1:
+            evicted_key, (_, _, nbytes) = self._frames.popitem(last=False)
+            total -= nbytes
+            print(f"  - 常驻数据超过内存上限，已淘汰: {json.loads(evicted_key)[0]}")
+
+    def load(
+        self, tasks: List[Dict], key_columns: List[str], formatting_rules: Optional[Dict], config: Dict,
+        load_fn
+    ) -> List[pd.DataFrame]:
+        """
+        返回各任务格式化后的DataFrame（浅拷贝）。未缓存或文件已变化的任务通过 `load_fn`
+        （签名与 `load_task_dataframes` 相同）一次性读取后写入缓存。
+        """
+        with self._lock:
+            entry_keys = [self._entry_key(task, key_columns, formatting_rules) for task in tasks]
+            frames, missing = {}, {}
+            for task, entry_key in zip(tasks, entry_keys):
+                if entry_key in frames or entry_key in missing:
+                    continue
+                signature = _stat_signature(task['file'])
+                entry = self._frames.get(entry_key)
+                if entry is not None and entry[0] == signature:
+                    self._frames.move_to_end(entry_key)
+                    frames[entry_key] = entry[1]
+                    self.hits += 1
+                    continue
+                if entry is not None:
+                    print(f"  - 检测到文件已变化，重新加载: {os.path.basename(task['file'])}")
+                    self.reloads += 1
+                self.misses += 1
+                missing[entry_key] = (task, signature)
+
+            if missing:
+                loaded = load_fn([task for task, _ in missing.values()], key_columns, formatting_rules, config)
+                for (entry_key, (_, signature)), df in zip(missing.items(), loaded):
+                    frames[entry_key] = df
+                    self._store(entry_key, signature, df)
+            return [frames[entry_key].copy(deep=False) for entry_key in entry_keys]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'frames': len(self._frames),
+                'memory_mb': round(self.memory_bytes / 1024 / 1024, 1),
+                'max_memory_mb': round(self.max_bytes / 1024 / 1024, 1),
+                'hits': self.hits,
+                'misses': self.misses,
+                'reloads': self.reloads,
+                'files': [json.loads(k)[0] for k in self._frames],
+            }
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+"""
+读取后的列类型推断与转换。
+
+读取器产出的DataFrame所有列均为字符串。启用 `schema` 后，在所有版本读取完成时统一确定每列的类型：
+    - 数值列：转换为 int64/float64 数组，空单元格为NaN，之后的比对和追溯不再逐次解析字符串；
+    - 文本列（含关键列）：低基数列转换为分类类型（类别按字典序排列），相同取值只保存一份。
+
+列类型在所有版本之间保持一致：只有在每个版本中都满足条件的列才会被推断为数值列。
+由于推断需要看到所有版本，类型转换在全部版本读取完成后进行：读取期间的峰值内存仍为所有版本的字符串数据，
+转换只降低之后比对和追溯阶段的常驻内存。启用流式读取时，低基数的文本列在读取每个版本时即已转换为分类类型
+（见 `loader.read_excel_streaming`），这里不再重复转换。
+比较语义不变（'123' 与 123、100 与 100.0 视为相等）。数值列渲染为文本时整数值不带小数部分，
+与读取时的字符串一致；个别带有末位浮点误差的取值（如 '0.30000000000000004'）按 `pd.to_numeric`
+解析后的数值显示，与比较时采用的数值相同。
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+
+from src.data.formatting import get_numeric_columns
+
+NUMERIC = 'numeric'
+TEXT = 'text'
+
+# 带前导零的取值（如 '0010'）视为编码，不推断为数值，避免丢失前导零
+_LEADING_ZERO_PATTERN = r'^[+-]?0\d'
+# float64 能精确表示的最大整数；超出时（如身份证号等长编码）不推断为数值
+_MAX_EXACT_FLOAT = 2 ** 53
+_INFER_SAMPLE_SIZE = 1000
+
+def get_column_tolerances(schema_config: Optional[Dict]) -> Dict[str, float]:
+    """读取各列声明的数值比较容差；未声明容差的列不出现在结果中。"""
+    columns = (schema_config or {}).get('columns') or {}
+    return {col: float(spec['tolerance']) for col, spec in columns.items() if (spec or {}).get('tolerance')}
+
+def format_numeric_text(values) -> np.ndarray:
+    """将数值还原为与 `pd.read_excel(dtype=str)` + `fillna('')` 一致的文本：缺失值为''，整数值不带小数部分。"""
+    values = np.asarray(values)
+    if values.dtype.kind in 'iu':
+        return values.astype(str).astype(object)
+    return np.array(
+        ['' if v != v else str(int(v)) if v.is_integer() else str(v) for v in values.astype(float).tolist()],
+        dtype=object
+    )
+
+def to_float_array(series: pd.Series) -> np.ndarray:
+    """取出一列的float64数值：数值列直接取用，文本列按 `pd.to_numeric` 解析（无法解析时为NaN）。"""
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series.to_numpy(dtype=float)
+    return pd.to_numeric(series, errors='coerce').to_numpy(dtype=float)
+
+def _has_leading_zero(values: np.ndarray) -> bool:
+    """以Arrow向量化正则检查是否存在带前导零的取值。"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    try:
+        text = pa.array(values, type=pa.string())
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        text = pa.array(values.astype(str), type=pa.string())
+    return bool(pc.any(pc.match_substring_regex(text, _LEADING_ZERO_PATTERN)).as_py())
+
+def _parse_numeric(series: pd.Series, strict: bool):
+    """
+    将一列解析为数值。`strict` 时存在无法解析的非空单元格、带前导零的取值或超出精确范围的整数则返回None；
+    否则无法解析的单元格按NaN处理。返回 (数值Series, 无法解析的非空单元格数)。
+    """
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series, 0
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # 分类列只需解析类别
+        categories = pd.Series(series.cat.categories, dtype=object)
+        parsed = _parse_numeric(categories, strict)
+        if parsed is None:
+            return None
+        codes = series.cat.codes.to_numpy()
+        category_values = parsed[0].to_numpy(dtype=float)
+        category_invalid = np.isnan(category_values) & (categories.to_numpy() != '')
+        # 缺失值的编码为-1，恰好取到追加在末尾的NaN
+        values = np.append(category_values, np.nan)[codes]
+        return pd.Series(values, index=series.index), int(category_invalid[codes[codes >= 0]].sum())
+
+    if strict:
+        # 先用开头的少量非空单元格快速排除明显的文本列
+        head = series.iloc[:_INFER_SAMPLE_SIZE]
+        head = head[head.notna() & (head != '')]
+        if pd.to_numeric(head, errors='coerce').isna().any():
+            return None
+
+    numeric = pd.to_numeric(series, errors='coerce')
+    blank = series.isna().to_numpy() | (series.to_numpy() == '')
+    invalid = numeric.isna().to_numpy() & ~blank
+    if strict:
+        if invalid.any():
+            return None
+        if _has_leading_zero(series.to_numpy()[~blank]):
+            return None
+        if numeric.dtype.kind == 'f' and (np.abs(numeric.to_numpy()) >= _MAX_EXACT_FLOAT).any():
+            return None
+    return numeric, int(invalid.sum())
+
+def _to_compact_text(series: pd.Series) -> pd.Series:
+    """将文本列转换为类别按字典序排列的分类类型；高基数列保持原样。数值列先还原为文本。"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        series = pd.Series(format_numeric_text(series.to_numpy()), index=series.index)
+    codes, uniques = pd.factorize(series)
+    if len(uniques) * 2 >= len(codes):
+        return series
+    try:
+        order = uniques.argsort()
+    except TypeError:
+        return series
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    codes = np.where(codes < 0, -1, np.append(rank, -1)[codes])
+    return pd.Series(pd.Categorical.from_codes(codes, categories=uniques.take(order)), index=series.index)
+
+def resolve_column_types(
+    frames: List[pd.DataFrame], key_columns: List[str], schema_config: Dict, formatting_rules: Optional[Dict] = None,
+    parsed: Optional[Dict[str, List]] = None
+) -> Dict[str, str]:
+    """
+    确定每列的类型：关键列和配置了格式化规则的列为文本列（`numeric` 规则转换的列为数值列），
+    其余列优先采用 `schema.columns` 中的声明，
+    未声明的列在启用 `infer` 时按所有版本的内容推断。
+    传入 `parsed` 字典时，推断为数值的列在各版本中的解析结果会存入其中，供转换时复用。
+    """
+    declared = schema_config.get('columns') or {}
+    infer = schema_config.get('infer', True)
+    # 配置了格式化规则的列保持文本，`numeric` 规则已转换的列除外
+    rule_numeric = set(get_numeric_columns(formatting_rules))
+    protected = set(key_columns) | (set(formatting_rules or {}) - rule_numeric)
+
+    column_types = {}
+    for col in dict.fromkeys(col for df in frames for col in df.columns):
+        declared_type = (declared.get(col) or {}).get('type')
+        if col in key_columns:
+            column_types[col] = TEXT
+        elif declared_type in (NUMERIC, TEXT):
+            column_types[col] = declared_type
+        elif col in rule_numeric:
+            column_types[col] = NUMERIC
+        elif infer and col not in protected:
+            results = []
+            for df in frames:
+                if col in df.columns:
+                    results.append(_parse_numeric(df[col], strict=True))
+                    if results[-1] is None:
+                        break
+            column_types[col] = NUMERIC if results and results[-1] is not None else TEXT
+            if column_types[col] == NUMERIC and parsed is not None:
+                parsed[col] = results
+        else:
+            column_types[col] = TEXT
+    return column_types
+
+def apply_schema(
+    frames: List[pd.DataFrame], key_columns: List[str], schema_config: Optional[Dict],
+    formatting_rules: Optional[Dict] = None
+) -> List[pd.DataFrame]:
+    """
+    按 `schema` 配置转换所有版本的列类型，返回转换后的新DataFrame；未启用时原样返回。
+    结果只替换被转换的列，未转换的列与输入共享数据，输入本身不被修改。
+    声明为数值的列中无法解析的非空单元格按缺失值处理，并给出提示。
+    """
+    if not schema_config or not schema_config.get('enabled') or not frames:
+        return frames
+
+    parsed_columns = {}
+    column_types = resolve_column_types(frames, key_columns, schema_config, formatting_rules, parsed_columns)
+    converted = [{} for _ in frames]
+    for col, column_type in column_types.items():
+        holders = [i for i, df in enumerate(frames) if col in df.columns]
+        if column_type == TEXT:
+            for i in holders:
+                converted[i][col] = _to_compact_text(frames[i][col])
+            continue
+
+        parsed = parsed_columns.get(col) or [_parse_numeric(frames[i][col], strict=False) for i in holders]
+        # 各版本统一为同一数值类型，使相同取值在不同版本中的行哈希一致
+        common_dtype = np.result_type(*[numeric.dtype for numeric, _ in parsed])
+        for i, (numeric, _) in zip(holders, parsed):
+            converted[i][col] = numeric.astype(common_dtype, copy=False)
+        n_invalid = sum(invalid for _, invalid in parsed)
+        if n_invalid:
+            print(f"⚠️ 数值列 '{col}' 中有 {n_invalid} 个单元格无法解析为数值，已按空值处理。")
+
+    numeric_columns = [col for col, column_type in column_types.items() if column_type == NUMERIC]
+    print(f"  - 已按列类型转换数据，数值列: {', '.join(numeric_columns) if numeric_columns else '无'}")
+    return [
+        pd.DataFrame({col: new.get(col, df[col]) for col in df.columns}, index=df.index, copy=False)
+        for df, new in zip(frames, converted)
+    ]
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+"""
+大模型响应的本地内容寻址缓存。
+
+以模型名、System Prompt、用户Prompt和请求参数的哈希作为缓存键，每个条目保存为一个JSON文件。
+条目超过保留天数即视为过期；目录超过容量上限时按最近使用时间(LRU)淘汰。
+命中/未命中次数同时记录在本次运行的统计和缓存目录下的累计统计文件中。
+"""
+
+import os
+import json
+import time
+import hashlib
+from typing import Callable, Dict, Optional
+
+from src.llm.client import REQUEST_PARAMS
+
+DEFAULT_CACHE_DIRECTORY = './.cache/llm'
+DEFAULT_MAX_SIZE_MB = 256
+DEFAULT_MAX_AGE_DAYS = 30
+_ENTRY_SUFFIX = '.json'
+_STATS_FILE = 'stats.json'
+
+# 本次运行的命中统计
+_session_stats = {'hits': 0, 'misses': 0}
+
+def _is_enabled(cache_config: Optional[Dict]) -> bool:
+    return bool(cache_config and cache_config.get('enabled'))
+
+def _cache_directory(cache_config: Dict) -> str:
+    return cache_config.get('directory') or DEFAULT_CACHE_DIRECTORY
+
+def _max_age_seconds(cache_config: Dict) -> Optional[float]:
+    max_age_days = cache_config.get('max_age_days', DEFAULT_MAX_AGE_DAYS)
+    return None if max_age_days is None else max_age_days * 86400
+
+def build_cache_key(model: str, system_prompt: str, user_prompt: str, params: Optional[Dict] = None) -> str:
+    """由模型名、System Prompt、用户Prompt和请求参数生成缓存键。"""
+    payload = json.dumps(
+        [model, system_prompt, user_prompt, REQUEST_PARAMS if params is None else params],
+        ensure_ascii=False, sort_keys=True
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _entry_path(cache_dir: str, cache_key: str) -> str:
+    return os.path.join(cache_dir, cache_key + _ENTRY_SUFFIX)
+
+def _record_stat(cache_dir: str, outcome: str):
+    """更新本次运行及缓存目录下的累计命中统计。"""
+    _session_stats[outcome] += 1
+    stats_path = os.path.join(cache_dir, _STATS_FILE)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        stats = {'hits': 0, 'misses': 0}
+        if os.path.exists(stats_path):
+            with open(stats_path, 'r', encoding='utf-8') as f:
+                stats.update(json.load(f))
+        stats[outcome] += 1
+        tmp_path = f"{stats_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(stats, f)
+        os.replace(tmp_path, stats_path)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ 更新LLM缓存统计失败: {e}")
+
+def get_cache_stats(cache_config: Optional[Dict] = None) -> Dict:
+    """返回本次运行的命中统计；提供 `cache_config` 时一并返回缓存目录下的累计统计。"""
+    stats = {'session': dict(_session_stats)}
+    if cache_config:
+        stats_path = os.path.join(_cache_directory(cache_config), _STATS_FILE)
+        if os.path.exists(stats_path):
+            with open(stats_path, 'r', encoding='utf-8') as f:
+                stats['total'] = json.load(f)
+    return stats
+
+def load_cached_response(cache_config: Optional[Dict], cache_key: str) -> Optional[str]:
+    """读取缓存的响应；未启用、未命中或条目已过期时返回None。"""
+    if not _is_enabled(cache_config):
+        return None
+    cache_dir = _cache_directory(cache_config)
+    path = _entry_path(cache_dir, cache_key)
+    try:
+        if not os.path.exists(path):
+            _record_stat(cache_dir, 'misses')
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+        max_age = _max_age_seconds(cache_config)
+        if max_age is not None and time.time() - entry['created_at'] > max_age:
+            os.remove(path)
+            _record_stat(cache_dir, 'misses')
+            return None
+        # 刷新修改时间，作为LRU淘汰的“最近使用”标记
+        os.utime(path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠️ 读取LLM响应缓存失败，将重新请求: {e}")
+        return None
+    _record_stat(cache_dir, 'hits')
+    return entry['response']
+
+def _evict_cache(cache_dir: str, max_size_mb: float, max_age: Optional[float]):
+    """删除过期条目；目录仍超过容量上限时，按最近使用时间淘汰最旧的条目。"""
+    now = time.time()
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if not (entry.is_file() and entry.name.endswith(_ENTRY_SUFFIX)) or entry.name == _STATS_FILE:
+            continue
+        stat = entry.stat()
+        # 清理时按最近使用时间删除长期未使用的条目，读取时再按创建时间判断是否过期
+        if max_age is not None and now - stat.st_mtime > max_age:
+            os.remove(entry.path)
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total_size = sum(size for _, size, _ in entries)
+    limit = max_size_mb * 1024 * 1024
+    for _, size, path in sorted(entries):
+        if total_size <= limit:
+            break
+        os.remove(path)
+        total_size -= size
+
+def store_cached_response(
+    cache_config: Optional[Dict], cache_key: str, model: str, response: str
+):
+    """写入一条响应缓存并执行过期清理和容量淘汰。"""
+    if not _is_enabled(cache_config) or response is None:
+        return
+    cache_dir = _cache_directory(cache_config)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        path = _entry_path(cache_dir, cache_key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'model': model, 'created_at': time.time(), 'response': response}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        _evict_cache(
+            cache_dir,
+            cache_config.get('max_size_mb', DEFAULT_MAX_SIZE_MB),
+            _max_age_seconds(cache_config),
+        )
+    except OSError as e:
+        print(f"⚠️ 写入LLM响应缓存失败: {e}")
+
+def cached_llm_request(
+    cache_config: Optional[Dict], model: str, system_prompt: str, user_prompt: str,
+    request_fn: Callable[[], str]
+) -> str:
+    """
+    先查询响应缓存，命中时直接返回；未命中时调用 `request_fn` 发起请求并写入缓存。
+    `request_fn` 负责创建客户端，因此命中缓存时无需初始化客户端。
+    """
+    cache_key = build_cache_key(model, system_prompt, user_prompt)
+    response = load_cached_response(cache_config, cache_key)
+    if response is not None:
+        print(f"  - 命中大模型响应缓存，跳过请求（本次运行命中 {_session_stats['hits']} 次，未命中 {_session_stats['misses']} 次）")
+        return response
+    response = request_fn()
+    store_cached_response(cache_config, cache_key, model, response)
+    return response
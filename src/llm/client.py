@@ -1,13 +1,58 @@
 # -*- coding: utf-8 -*-
 
 import os
-from openai import OpenAI
-from dotenv import load_dotenv
+import time
+import random
+import asyncio
+from typing import TYPE_CHECKING, Callable, Dict, Optional, Tuple
 
-# 加载 .env 文件中的环境变量
-load_dotenv()
+# openai 与 dotenv 在首次创建客户端时才导入，不请求大模型的运行（配置检查、离线模式）无需承担其导入耗时
+if TYPE_CHECKING:
+    from openai import OpenAI, AsyncOpenAI
 
-def get_llm_client() -> OpenAI:
+# 默认服务地址；可通过环境变量 LLM_BASE_URL 覆盖（例如指向本地兼容OpenAI API的服务或测试桩）
+DEFAULT_BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+
+# 除模型和消息外的请求参数（同时作为响应缓存键的一部分）
+REQUEST_PARAMS = {'extra_body': {'enable_thinking': False}}
+
+_env_loaded = False
+
+def _load_env():
+    """首次调用时加载 .env 文件中的环境变量。"""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+
+def _retryable_errors() -> Tuple[type, ...]:
+    """可重试的错误类型：网络错误、超时、限流以及服务端错误。"""
+    import openai
+    return (
+        openai.APIConnectionError,
+        openai.APITimeoutError,
+        openai.RateLimitError,
+        openai.InternalServerError,
+    )
+
+def _accumulate_usage(usage: Optional[Dict], completion_usage):
+    """将一次请求的Token用量累加到 `usage` 中；未提供 `usage` 或服务端未返回用量时忽略。"""
+    if usage is None or completion_usage is None:
+        return
+    for key in ('prompt_tokens', 'completion_tokens', 'total_tokens'):
+        usage[key] = usage.get(key, 0) + (getattr(completion_usage, key, None) or 0)
+    usage['requests'] = usage.get('requests', 0) + 1
+
+def get_client_settings():
+    """读取客户端的API密钥和服务地址。"""
+    _load_env()
+    api_key = os.getenv("DASHSCOPE_API_KEY")
+    if not api_key:
+        raise ValueError("环境变量 DASHSCOPE_API_KEY 未设置或为空。")
+    return api_key, os.getenv("LLM_BASE_URL") or DEFAULT_BASE_URL
+
+def get_llm_client() -> 'OpenAI':
     """
     初始化并返回一个配置好的OpenAI客户端，用于调用兼容服务（如DashScope）。
 
@@ -16,22 +61,37 @@ def get_llm_client() -> OpenAI:
         Exception: 客户端初始化失败。
     """
     try:
-        api_key = os.getenv("DASHSCOPE_API_KEY")
-        if not api_key:
-            raise ValueError("环境变量 DASHSCOPE_API_KEY 未设置或为空。")
+        from openai import OpenAI
 
+        api_key, base_url = get_client_settings()
         client = OpenAI(
             api_key=api_key,
-            base_url="https://dashscope.aliyuncs.com/compatible-mode/v1", # 如果用本地部署的大模型服务，修改为对应的URL
+            base_url=base_url, # 如果用本地部署的大模型服务，设置环境变量 LLM_BASE_URL 为对应的URL
         )
         return client
     except Exception as e:
         print(f"❌ LLM客户端初始化失败: {e}")
         raise
 
-def request_llm_analysis(client: OpenAI, model: str, system_prompt: str, user_prompt: str) -> str:
+def get_async_llm_client() -> 'AsyncOpenAI':
+    """
+    初始化并返回异步OpenAI客户端，供并发的分块分析使用。
+    重试由 `request_llm_analysis_async` 统一控制，因此关闭客户端内置的重试。
+    """
+    try:
+        from openai import AsyncOpenAI
+
+        api_key, base_url = get_client_settings()
+        return AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+    except Exception as e:
+        print(f"❌ LLM客户端初始化失败: {e}")
+        raise
+
+def request_llm_analysis(
+    client: 'OpenAI', model: str, system_prompt: str, user_prompt: str, usage: Optional[Dict] = None
+) -> str:
     """
-    向大语言模型发送分析请求并返回结果。
+    向大语言模型发送分析请求并返回结果。提供 `usage` 时将本次请求的Token用量累加到其中。
     """
     try:
         completion = client.chat.completions.create(
@@ -40,13 +100,97 @@ def request_llm_analysis(client: OpenAI, model: str, system_prompt: str, user_pr
                 {'role': 'system', 'content': system_prompt},
                 {'role': 'user', 'content': user_prompt}
             ], # type: ignore
-            extra_body={'enable_thinking': False}
+            **REQUEST_PARAMS
         )
+        _accumulate_usage(usage, completion.usage)
         return completion.choices[0].message.content
     except Exception as e:
         print(f"❌ 请求大模型分析时发生错误: {e}")
         raise
 
+def stream_llm_analysis(
+    client: 'OpenAI', model: str, system_prompt: str, user_prompt: str, on_token: Callable[[str], None],
+    usage: Optional[Dict] = None
+) -> Tuple[str, Dict]:
+    """
+    以流式方式请求大模型，每收到一个内容片段即调用 `on_token`。
+
+    Returns:
+        content: 完整的响应文本。
+        timings: {'ttft_seconds': 首个内容片段的到达耗时, 'total_seconds': 总耗时, 'usage': Token用量（服务端提供时）}。
+    若流式传输中途失败，已收到的片段均已交给 `on_token` 处理，异常继续向上抛出。
+    """
+    start = time.perf_counter()
+    timings = {'ttft_seconds': None, 'total_seconds': None, 'usage': None}
+    parts = []
+    try:
+        stream = client.chat.completions.create(
+            model=model,
+            messages=[
+                {'role': 'system', 'content': system_prompt},
+                {'role': 'user', 'content': user_prompt}
+            ], # type: ignore
+            stream=True,
+            stream_options={'include_usage': True},
+            **REQUEST_PARAMS
+        )
+        for chunk in stream:
+            if getattr(chunk, 'usage', None):
+                timings['usage'] = chunk.usage.model_dump()
+                _accumulate_usage(usage, chunk.usage)
+            if not chunk.choices:
+                continue
+            text = chunk.choices[0].delta.content
+            if not text:
+                continue
+            if timings['ttft_seconds'] is None:
+                timings['ttft_seconds'] = time.perf_counter() - start
+            parts.append(text)
+            on_token(text)
+        return ''.join(parts), timings
+    except Exception as e:
+        print(f"\n❌ 流式请求大模型分析时发生错误（已接收 {len(''.join(parts))} 个字符）: {e}")
+        raise
+    finally:
+        timings['total_seconds'] = time.perf_counter() - start
+
+async def request_llm_analysis_async(
+    client: 'AsyncOpenAI',
+    model: str,
+    system_prompt: str,
+    user_prompt: str,
+    max_retries: int = 3,
+    backoff_seconds: float = 1.0,
+    usage: Optional[Dict] = None
+) -> str:
+    """
+    异步发送分析请求。遇到网络错误、超时、限流或服务端错误时按指数退避（带随机抖动）重试，
+    最多重试 `max_retries` 次。提供 `usage` 时将Token用量累加到其中。
+    """
+    retryable_errors = _retryable_errors()
+    for attempt in range(max_retries + 1):
+        try:
+            completion = await client.chat.completions.create(
+                model=model,
+                messages=[
+                    {'role': 'system', 'content': system_prompt},
+                    {'role': 'user', 'content': user_prompt}
+                ], # type: ignore
+                **REQUEST_PARAMS
+            )
+            _accumulate_usage(usage, completion.usage)
+            return completion.choices[0].message.content
+        except retryable_errors as e:
+            if attempt >= max_retries:
+                print(f"❌ 请求大模型分析时发生错误（已重试 {max_retries} 次）: {e}")
+                raise
+            delay = backoff_seconds * (2 ** attempt) * (1 + random.random())
+            print(f"⚠️ 请求大模型失败，{delay:.1f} 秒后进行第 {attempt + 1} 次重试: {e}")
+            await asyncio.sleep(delay)
+        except Exception as e:
+            print(f"❌ 请求大模型分析时发生错误: {e}")
+            raise
+
 
 '''
 如果使用本地部署的大模型服务，可直接使用下面代码，并注释掉上面的代码
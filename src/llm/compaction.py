@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+"""
+按Token预算压缩差异报告，使比对分析Prompt的长度不随差异规模增长。
+
+压缩后的报告包含三部分：
+    1. 对比摘要与各列的修改数量（精确值）；
+    2. 按配置维度（如省份、行业编码）统计的新增/删除/修改数量（精确值，取值过多时合并尾部）；
+    3. 在剩余预算内按“变化幅度 × 新颖度”排序列出的逐条变更，并注明被省略的数量。
+完整报告本身不超过预算时原样返回。
+"""
+
+import numpy as np
+import pandas as pd
+from typing import List, Optional
+
+from src.analysis.comparison import (
+    DiffResult, CHANGE_MODIFIED, CHANGE_KINDS, COL_NAME, COL_OLD, COL_NEW, COL_KIND, format_change_lines
+)
+
+DEFAULT_TOKEN_BUDGET = 12000
+DEFAULT_DIMENSIONS = ['省份', '行业编码']
+DEFAULT_MAX_DIMENSION_ROWS = 20
+
+def estimate_tokens(text) -> np.ndarray:
+    """
+    粗略估算Token数：中文等多字节字符约1个Token，其余字符约4个对应1个Token。
+    接受单个字符串或字符串Series，返回对应的估算值。
+    """
+    texts = pd.Series([text] if isinstance(text, str) else text, dtype=object)
+    n_chars = texts.str.len().to_numpy()
+    n_bytes = texts.str.encode('utf-8').str.len().to_numpy()
+    # UTF-8 中中文字符占3个字节
+    wide = (n_bytes - n_chars) // 2
+    return wide + np.ceil((n_chars - wide) / 4).astype(int)
+
+def _score_changes(diff_result: DiffResult, dimensions: List[str]) -> np.ndarray:
+    """
+    为每条变更计算排序得分 = 变化幅度 × (1 + 新颖度)。
+
+    变化幅度：数值修改取 log1p(|新值-旧值| / |旧值|)（旧值为0时以1为分母），
+    非数值修改、新增与删除按100%的变化计。
+    新颖度：同一列、同一维度取值下的修改越少越新颖，取各维度 1/√组内条数 的平均值；
+    批量的同类修改因此排在孤立的异常修改之后。
+    """
+    changes = diff_result.changes
+    kind = changes[COL_KIND].astype(object).to_numpy()
+    magnitude = np.full(len(changes), np.log1p(1.0))
+
+    old = pd.to_numeric(changes[COL_OLD], errors='coerce').to_numpy(dtype=float)
+    new = pd.to_numeric(changes[COL_NEW], errors='coerce').to_numpy(dtype=float)
+    numeric = (kind == CHANGE_MODIFIED) & ~np.isnan(old) & ~np.isnan(new)
+    denominator = np.where(np.abs(old) > 0, np.abs(old), 1.0)
+    magnitude[numeric] = np.log1p(np.abs(new[numeric] - old[numeric]) / denominator[numeric])
+
+    novelty = np.zeros(len(changes))
+    if dimensions:
+        keys = diff_result.keys
+        group_base = changes[COL_NAME].astype(str).where(kind == CHANGE_MODIFIED, changes[COL_KIND].astype(str))
+        for dim in dimensions:
+            group = group_base + '\x1f' + keys[dim].astype(str)
+            group_sizes = group.map(group.value_counts()).to_numpy(dtype=float)
+            novelty += 1.0 / np.sqrt(group_sizes)
+        novelty /= len(dimensions)
+    # 'inf' 等特殊数值按最大幅度处理
+    return np.nan_to_num(magnitude * (1.0 + novelty), nan=0.0, posinf=np.finfo(float).max)
+
+def _format_column_section(diff_result: DiffResult) -> List[str]:
+    counts = diff_result.column_counts
+    lines = ["--- 各列修改统计 ---"]
+    lines += [f"列 '{col}': {count} 处修改" for col, count in counts.items() if count]
+    return lines if len(lines) > 1 else []
+
+def _format_dimension_section(diff_result: DiffResult, dim: str, max_rows: int) -> List[str]:
+    """按单个维度精确统计各类变更数量，超过 `max_rows` 个取值时合并其余取值。"""
+    table = pd.crosstab(diff_result.keys[dim].astype(str), diff_result.changes[COL_KIND].astype(object))
+    table = table.reindex(columns=CHANGE_KINDS, fill_value=0)
+    totals = table.sum(axis=1)
+    table = table.loc[totals.sort_values(ascending=False, kind='stable').index]
+
+    def fmt(counts) -> str:
+        return " / ".join(f"{kind} {int(counts[kind])}" for kind in CHANGE_KINDS)
+
+    lines = [f"--- 按 {dim} 统计（新增/删除为记录数，修改为单元格数）---"]
+    lines += [f"{value}: {fmt(row)}" for value, row in table.head(max_rows).iterrows()]
+    if len(table) > max_rows:
+        rest = table.iloc[max_rows:]
+        lines.append(f"（其余 {len(rest)} 个取值合计: {fmt(rest.sum())}）")
+    return lines
+
+def compact_diff_report(
+    diff_result: DiffResult,
+    token_budget: int = DEFAULT_TOKEN_BUDGET,
+    dimensions: Optional[List[str]] = None,
+    max_dimension_rows: int = DEFAULT_MAX_DIMENSION_ROWS
+) -> str:
+    """
+    生成不超过 `token_budget`（估算值）的差异报告文本。完整报告不超过预算时原样返回。
+    逐条变更按得分排序后依次装入，直到用完扣除统计部分和说明文字后的剩余预算。
+    """
+    changes = diff_result.changes
+    all_lines = format_change_lines(diff_result)
+    line_tokens = estimate_tokens(all_lines) + 1  # 每行的换行符
+    if int(line_tokens.sum()) + int(estimate_tokens(diff_result.summary_line)[0]) + 20 <= token_budget:
+        return diff_result.render()
+
+    dimensions = [d for d in (DEFAULT_DIMENSIONS if dimensions is None else dimensions)
+                  if d in diff_result.key_columns]
+    header = [f"  {diff_result.summary_line}", ""]
+    header += _format_column_section(diff_result)
+    for dim in dimensions:
+        header += [""] + _format_dimension_section(diff_result, dim, max_dimension_rows)
+
+    # --- 在剩余预算内按得分从高到低装入逐条变更 ---
+    kind = changes[COL_KIND].astype(object).to_numpy()
+    order = np.lexsort((np.arange(len(changes)), -_score_changes(diff_result, dimensions)))
+    lines, line_tokens = all_lines.to_numpy()[order], line_tokens[order]
+
+    # 预留说明文字的预算（按最长的可能说明估算）
+    note_template = "--- 详细变更记录（已按Token预算压缩）---\n说明：共 {total} 条变更记录，以下按变化幅度与新颖度从高到低列出其中 {shown} 条；已省略 {omitted}。上方的统计数据包含全部变更。"
+    worst_note = note_template.format(
+        total=len(changes), shown=len(changes),
+        omitted="、".join(f"【{k}】{len(changes)}条" for k in CHANGE_KINDS)
+    )
+    remaining = token_budget - int(estimate_tokens("\n".join(header))[0]) - int(estimate_tokens(worst_note)[0])
+    n_shown = int(np.searchsorted(np.cumsum(line_tokens), max(remaining, 0), side='right'))
+
+    omitted_kinds = pd.Series(kind[order[n_shown:]]).value_counts()
+    omitted = "、".join(f"【{k}】{int(omitted_kinds.get(k, 0))}条" for k in CHANGE_KINDS if omitted_kinds.get(k, 0))
+    note = note_template.format(total=len(changes), shown=n_shown, omitted=omitted or "0条")
+
+    return "\n".join(header + ["", note] + list(lines[:n_shown]))
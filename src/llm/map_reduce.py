@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+"""
+超大差异报告的 Map-Reduce 分析。
+
+    1. Map：按关键列（如省份）或被修改的列将结构化差异拆分为多个分块，过大的分块再按条数切分；
+    2. 以 asyncio 并发分析各分块，受并发上限约束，网络错误/限流/服务端错误时指数退避重试；
+    3. Reduce：将各分块的中间结论汇总为一次请求，生成最终报告。
+
+并发上限不小于分块数时，端到端耗时约为最慢分块的耗时加上 Reduce 的耗时。
+"""
+
+import asyncio
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+
+from src.analysis.comparison import DiffResult, COL_NAME, COL_KIND, CHANGE_MODIFIED
+from src.llm import cache as llm_cache
+from src.llm.client import get_async_llm_client, request_llm_analysis_async
+from src.llm.prompts import create_chunk_analysis_prompt, create_reduce_prompt
+
+DEFAULT_MIN_CHANGES = 5000
+DEFAULT_CHUNK_BY = '省份'
+DEFAULT_MAX_CHANGES_PER_CHUNK = 2000
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_SECONDS = 1.0
+
+def should_use_map_reduce(diff_result: DiffResult, map_reduce_config: Dict) -> bool:
+    """启用了 Map-Reduce 且变更条数超过阈值时返回 True。"""
+    if not (map_reduce_config or {}).get('enabled'):
+        return False
+    min_changes = map_reduce_config.get('min_changes')
+    min_changes = DEFAULT_MIN_CHANGES if min_changes is None else min_changes
+    return len(diff_result.changes) > min_changes
+
+def _chunk_labels(diff_result: DiffResult, chunk_by: str) -> pd.Series:
+    """为每条变更生成所属分块的标签。"""
+    if chunk_by == COL_NAME:
+        is_modified = (diff_result.changes[COL_KIND] == CHANGE_MODIFIED).to_numpy()
+        column_labels = "列 '" + diff_result.changes[COL_NAME].astype(str) + "' 的修改"
+        return column_labels.where(is_modified, '新增与删除记录')
+    if chunk_by in diff_result.key_columns:
+        return f"{chunk_by} = '" + diff_result.keys[chunk_by].astype(str) + "'"
+    raise ValueError(f"不支持的分块维度: '{chunk_by}'，应为关键列之一或 '{COL_NAME}'。")
+
+def split_diff_result(
+    diff_result: DiffResult, chunk_by: str = DEFAULT_CHUNK_BY,
+    max_changes_per_chunk: int = DEFAULT_MAX_CHANGES_PER_CHUNK
+) -> List[Tuple[str, DiffResult]]:
+    """
+    将差异结果拆分为 (分块标签, 分块DiffResult) 列表。
+    先按 `chunk_by` 分组，单组变更数超过 `max_changes_per_chunk` 时再按顺序切分为多个分块。
+    """
+    codes, labels = pd.factorize(_chunk_labels(diff_result, chunk_by), sort=True)
+    chunks = []
+    for group, label in enumerate(labels):
+        positions = np.flatnonzero(codes == group)
+        n_parts = -(-len(positions) // max_changes_per_chunk) if max_changes_per_chunk else 1
+        for part, part_positions in enumerate(np.array_split(positions, n_parts), start=1):
+            mask = np.zeros(len(codes), dtype=bool)
+            mask[part_positions] = True
+            part_label = f"{label}（第 {part}/{n_parts} 部分）" if n_parts > 1 else label
+            chunks.append((part_label, diff_result.subset(mask)))
+    return chunks
+
+async def _analyze_map_reduce(
+    chunks: List[Tuple[str, DiffResult]], summary_line: str, hist_name: str, latest_name: str,
+    model: str, system_prompt: str, concurrency: int, max_retries: int, backoff_seconds: float,
+    cache_config: Optional[Dict] = None, usage: Optional[Dict] = None
+):
+    # 客户端在首次未命中缓存时才创建，全部命中缓存时无需凭据
+    client = None
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    total = len(chunks)
+
+    async def request(prompt: str) -> str:
+        nonlocal client
+        # 已缓存的请求（例如重跑时未变化的分块）直接返回，不占用并发名额
+        cache_key = llm_cache.build_cache_key(model, system_prompt, prompt)
+        response = llm_cache.load_cached_response(cache_config, cache_key)
+        if response is None:
+            if client is None:
+                client = get_async_llm_client()
+            async with semaphore:
+                response = await request_llm_analysis_async(
+                    client, model, system_prompt, prompt, max_retries, backoff_seconds, usage
+                )
+            llm_cache.store_cached_response(cache_config, cache_key, model, response)
+        return response
+
+    async def analyze_chunk(index: int, label: str, chunk: DiffResult) -> str:
+        prompt = create_chunk_analysis_prompt(chunk, label, index, total, hist_name, latest_name)
+        print(f"  - 正在分析分块 {index}/{total}: {label}（{len(chunk.changes)} 条变更）")
+        return await request(prompt)
+
+    try:
+        results = await asyncio.gather(
+            *(analyze_chunk(i, label, chunk) for i, (label, chunk) in enumerate(chunks, start=1)),
+            return_exceptions=True
+        )
+        partial_findings = []
+        for (label, _), result in zip(chunks, results):
+            if isinstance(result, Exception):
+                print(f"⚠️ 分块 '{label}' 分析失败，将在汇总时标注: {result}")
+                partial_findings.append((label, f"（该分块分析失败，未能获得结论：{result}）"))
+            else:
+                partial_findings.append((label, result))
+        if all(isinstance(result, Exception) for result in results):
+            raise RuntimeError("所有分块的分析请求均失败。")
+
+        print(f"  - 正在汇总 {total} 个分块的分析结论...")
+        reduce_prompt = create_reduce_prompt(partial_findings, summary_line, hist_name, latest_name)
+        response = await request(reduce_prompt)
+        return reduce_prompt, partial_findings, response
+    finally:
+        if client is not None:
+            await client.close()
+
+def run_map_reduce_analysis(
+    diff_result: DiffResult, hist_name: str, latest_name: str, llm_config: Dict, usage: Optional[Dict] = None
+) -> Tuple[str, List[Tuple[str, str]], str]:
+    """
+    对差异结果执行 Map-Reduce 分析。提供 `usage` 时将所有请求的Token用量累加到其中。
+
+    Returns:
+        reduce_prompt: 汇总阶段的Prompt。
+        partial_findings: 各分块的 (标签, 中间结论) 列表。
+        response: 最终分析报告。
+    """
+    settings = llm_config.get('map_reduce') or {}
+    chunks = split_diff_result(
+        diff_result,
+        settings.get('chunk_by') or DEFAULT_CHUNK_BY,
+        settings.get('max_changes_per_chunk') or DEFAULT_MAX_CHANGES_PER_CHUNK,
+    )
+    print(f"  - 已将 {len(diff_result.changes)} 条变更拆分为 {len(chunks)} 个分块")
+    max_retries = settings.get('max_retries')
+    backoff_seconds = settings.get('backoff_seconds')
+    return asyncio.run(_analyze_map_reduce(
+        chunks, diff_result.summary_line, hist_name, latest_name,
+        llm_config['model_name'], llm_config['system_prompts']['comparison'],
+        settings.get('concurrency') or DEFAULT_CONCURRENCY,
+        DEFAULT_MAX_RETRIES if max_retries is None else max_retries,
+        DEFAULT_BACKOFF_SECONDS if backoff_seconds is None else backoff_seconds,
+        llm_config.get('response_cache'), usage,
+    ))
@@ -1,7 +1,26 @@
 # -*- coding: utf-8 -*-
 
-def create_comparison_prompt(diff_report: str, hist_name: str, latest_name: str) -> str:
-    """构建双版本比对分析的Prompt。"""
+from typing import Dict, List, Optional, Tuple
+
+from src.analysis.comparison import DiffResult
+from src.llm import compaction
+
+def create_comparison_prompt(
+    diff_result: DiffResult, hist_name: str, latest_name: str, compaction_config: Optional[Dict] = None
+) -> str:
+    """
+    构建双版本比对分析的Prompt。差异文本在此处才按需渲染；
+    若启用了 `compaction_config`，差异文本会按Token预算压缩。
+    """
+    if compaction_config and compaction_config.get('enabled'):
+        diff_report = compaction.compact_diff_report(
+            diff_result,
+            compaction_config.get('token_budget') or compaction.DEFAULT_TOKEN_BUDGET,
+            compaction_config.get('dimensions'),
+            compaction_config.get('max_dimension_rows') or compaction.DEFAULT_MAX_DIMENSION_ROWS,
+        )
+    else:
+        diff_report = diff_result.render()
     return (
         f"### **分析任务：精确比对历史与最新数据**\n"
         f"**历史版本**: `{hist_name}`\n"
@@ -18,25 +37,86 @@ def create_comparison_prompt(diff_report: str, hist_name: str, latest_name: str)
         "3.  **结论与建议**: 综合所有信息，给出初步结论，并提供初步建议。"
     )
 
+def create_chunk_analysis_prompt(
+    chunk_result: DiffResult, chunk_label: str, chunk_index: int, chunk_total: int,
+    hist_name: str, latest_name: str
+) -> str:
+    """构建分块（Map阶段）分析的Prompt，只包含当前分块的变更日志。"""
+    diff_report = chunk_result.render()
+    return (
+        f"### **分析任务：精确比对历史与最新数据（分块 {chunk_index}/{chunk_total}）**\n"
+        f"**历史版本**: `{hist_name}`\n"
+        f"**最新版本**: `{latest_name}`\n"
+        f"**分块范围**: {chunk_label}\n"
+        f"---\n"
+        f"#### **数据差异项**\n"
+        f"以下是该分块范围内由高精度比对模块生成的详细变更日志，仅为全部变更的一部分。\n"
+        f"```text\n{diff_report}\n```\n"
+        f"---\n"
+        f"### **你的任务**\n"
+        "作为一名资深数据分析专家，请仅基于该分块的变更日志，输出简洁的要点式中间结论，供后续汇总使用：\n"
+        "1.  **分块变更概况**: 概括该分块内新增、删除、修改的规模和主要集中的对象。\n"
+        "2.  **关键风险变更**: 列出该分块内最值得关注或潜在风险最高的变更（保留唯一键和新旧值）。\n"
+        "3.  **异常模式**: 指出可能的系统性问题（例如同一列批量变化、某一时间段集中变化等）。"
+    )
+
+def create_reduce_prompt(
+    partial_findings: List[Tuple[str, str]], summary_line: str, hist_name: str, latest_name: str
+) -> str:
+    """构建汇总（Reduce阶段）分析的Prompt，基于各分块的中间结论生成最终报告。"""
+    findings = "\n\n".join(
+        f"#### 分块 {i}: {label}\n{text}" for i, (label, text) in enumerate(partial_findings, start=1)
+    )
+    return (
+        f"### **分析任务：精确比对历史与最新数据（汇总）**\n"
+        f"**历史版本**: `{hist_name}`\n"
+        f"**最新版本**: `{latest_name}`\n"
+        f"---\n"
+        f"#### **整体对比摘要**\n"
+        f"{summary_line}\n"
+        f"---\n"
+        f"#### **各分块的中间分析结论**\n"
+        f"由于变更日志过长，系统已将其拆分为 {len(partial_findings)} 个分块分别分析，结论如下：\n\n"
+        f"{findings}\n"
+        f"---\n"
+        f"### **你的任务**\n"
+        "作为一名资深数据分析专家，请综合以上整体摘要和各分块结论，撰写一份完整的分析报告。报告必须包含以下部分：\n"
+        "1.  **变更摘要解读**: 基于“整体对比摘要”，概括本次数据变更的总体情况。\n"
+        "2.  **关键风险识别**: 汇总各分块中最值得关注或潜在风险最高的变更，合并跨分块的共性问题。\n"
+        "3.  **结论与建议**: 综合所有信息，给出初步结论，并提供初步建议。"
+    )
+
 def create_historical_prompt(
     md_trace_table: str,
     summary_line: str,
     source_names: str,
     value_column: str,
-    top_n: int
+    top_n: int,
+    md_step_summary: Optional[str] = None,
+    score_description: str = '修改频率和变化幅度'
 ) -> str:
-    """构建多版本历史追溯分析的Prompt。"""
+    """
+    构建多版本历史追溯分析的Prompt。提供 `md_step_summary` 时附加相邻版本的全列变更统计；
+    `score_description` 为异常得分构成的说明（见 `historical.describe_anomaly_scoring`）。
+    """
+    step_section = (
+        f"#### **3. 相邻版本全列变更统计**\n"
+        f"以下为每一对相邻版本在所有列（含 `{value_column}` 以外的列）上的变更数量，可用于发现中间版本的批量变更：\n"
+        f"{md_step_summary}\n"
+        f"---\n"
+    ) if md_step_summary else ""
     return (
         f"### **分析任务：数据质量链式追溯综合分析**\n"
         f"**分析对象**: 从 `{source_names}` 的演变过程中的核心指标 `{value_column}`。\n"
         f"---\n"
         f"#### **1. Top {top_n} 显著异常变更记录**\n"
-        f"为保证分析质量和聚焦重点，系统已通过'异常得分'(综合修改频率和变化幅度)预筛选出以下最值得关注的记录，请你基于**此表**进行分析：\n"
+        f"为保证分析质量和聚焦重点，系统已通过'异常得分'(综合{score_description})预筛选出以下最值得关注的记录，请你基于**此表**进行分析：\n"
         f"{md_trace_table}\n"
         f"---\n"
         f"#### **2. 记录级别变更摘要 (仅对比首尾版本)**\n"
         f"{summary_line}\n"
         f"---\n"
+        f"{step_section}"
         f"### **你的任务**\n"
         "作为一名资深数据质量分析专家，请严格根据上方提供的【显著异常变更记录】表格，撰写一份精准、无遗漏的分析报告。报告必须包含：\n"
         "1.  **高频/高风险变动识别**: **完整列出并分析**上表中所有【总修改次数】最高的记录。如果有多条记录的修改次数并列最高，必须全部列出。\n"
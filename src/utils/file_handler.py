@@ -1,7 +1,14 @@
 # -*- coding: utf-8 -*-
 
 import os
+import json
+import heapq
+import tempfile
 from datetime import datetime
+from typing import Iterable, Iterator, List, Optional
+
+# 结构化导出支持的格式及对应的文件扩展名
+EXPORT_FORMATS = {'csv': '.csv', 'jsonl': '.jsonl', 'parquet': '.parquet'}
 
 def save_text_file(directory: str, filename: str, content: str, add_timestamp: bool = True):
     """
@@ -46,4 +53,153 @@ def save_markdown_report(directory: str, prefix: str, content: str) -> str:
         return filepath
     except IOError as e:
         print(f"❌ 保存最终报告失败: {e}")
-        return ""
\ No newline at end of file
+        return ""
+
+def save_dataframe_csv(directory: str, filename: str, df) -> str:
+    """将DataFrame保存为带时间戳的CSV文件（UTF-8 BOM编码，便于直接用Excel打开）。"""
+    return export_frames(directory, filename, [df], 'csv')
+
+def save_text_lines(directory: str, filename: str, lines: Iterable[str]) -> str:
+    """将逐行产出的文本流式写入带时间戳的 .txt 文件，内存中只保留当前行。"""
+    try:
+        os.makedirs(directory, exist_ok=True)
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        filepath = os.path.join(directory, f"{filename}_{timestamp}.txt")
+        with open(filepath, 'w', encoding='utf-8') as f:
+            for i, line in enumerate(lines):
+                f.write(line if i == 0 else '\n' + line)
+        print(f"  - 内容已保存到: {filepath}")
+        return filepath
+    except IOError as e:
+        print(f"❌ 保存文件失败: {e}")
+        return ""
+
+def _parquet_schema(table):
+    """以第一块的结构作为Parquet文件结构；第一块中全为空的列按字符串类型处理。"""
+    import pyarrow as pa
+
+    return pa.schema([
+        field.with_type(pa.string()) if pa.types.is_null(field.type) else field for field in table.schema
+    ])
+
+def export_frames(directory: str, filename: str, frames: Iterable, fmt: str = 'csv') -> str:
+    """
+    将逐块产出的DataFrame写入带时间戳的结构化文件，每次只在内存中保留一块。
+
+    支持的格式：
+        csv      UTF-8 BOM编码，便于直接用Excel打开
+        jsonl    每行一个JSON对象（UTF-8，不转义中文）
+        parquet  列式存储，各块依次写为行组；列结构以第一块为准
+    """
+    if fmt not in EXPORT_FORMATS:
+        print(f"❌ 不支持的导出格式: '{fmt}'（可选: {', '.join(EXPORT_FORMATS)}）")
+        return ""
+    writer = None
+    try:
+        os.makedirs(directory, exist_ok=True)
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        filepath = os.path.join(directory, f"{filename}_{timestamp}{EXPORT_FORMATS[fmt]}")
+        if fmt == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            for df in frames:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(filepath, _parquet_schema(table))
+                writer.write_table(table.cast(writer.schema))
+            if writer is None:
+                raise ValueError("没有可导出的数据。")
+        else:
+            with open(filepath, 'w', encoding='utf-8-sig' if fmt == 'csv' else 'utf-8', newline='') as f:
+                for i, df in enumerate(frames):
+                    if fmt == 'csv':
+                        df.to_csv(f, index=False, header=(i == 0), lineterminator='\n')
+                    elif len(df):
+                        # lines=True 时每条记录（包括最后一条）都以换行符结尾
+                        df.to_json(f, orient='records', lines=True, force_ascii=False)
+        print(f"  - 结构化结果已保存到: {filepath}")
+        return filepath
+    except (IOError, ValueError, TypeError, ImportError) as e:
+        print(f"❌ 保存结构化结果失败: {e}")
+        return ""
+    finally:
+        if writer is not None:
+            writer.close()
+
+def _write_sorted_run(lines: Iterable[str], directory: str) -> str:
+    """将一段已排序的行写入临时文件（每行以JSON字符串保存，文本中的换行符不影响分隔）。"""
+    fd, path = tempfile.mkstemp(suffix='.jsonl', dir=directory)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        for line in lines:
+            f.write(json.dumps(line, ensure_ascii=False))
+            f.write('\n')
+    return path
+
+def _read_sorted_run(path: str) -> Iterator[str]:
+    with open(path, 'r', encoding='utf-8') as f:
+        for record in f:
+            yield json.loads(record)
+
+def merge_sorted_runs(runs: Iterable[List[str]], max_lines_in_memory: Optional[int] = None) -> Iterator[str]:
+    """
+    按顺序产出多个已排序行块归并后的结果。
+
+    内存中累积的行数超过 `max_lines_in_memory` 时，先将已累积的块归并写入临时文件，
+    最后再与磁盘上的各段一起做多路归并，因此内存占用与总行数无关。临时文件在迭代结束时删除。
+    """
+    with tempfile.TemporaryDirectory(prefix='dqct_sort_') as tmp_dir:
+        in_memory, n_lines, spilled = [], 0, []
+        for run in runs:
+            in_memory.append(run)
+            n_lines += len(run)
+            if max_lines_in_memory and n_lines > max_lines_in_memory:
+                spilled.append(_write_sorted_run(heapq.merge(*in_memory), tmp_dir))
+                in_memory, n_lines = [], 0
+        if not spilled and len(in_memory) <= 1:
+            yield from (in_memory[0] if in_memory else [])
+        else:
+            yield from heapq.merge(*in_memory, *[_read_sorted_run(path) for path in spilled])
+
+class StreamingReportWriter:
+    """
+    将流式输出的内容逐片段追加写入结果日志（.txt）和Markdown报告（.md），每次写入后立即刷新，
+    可选同步回显到控制台。即使输出中途失败，已写入的部分内容也会保留在两个文件中。
+
+    用法：
+        with StreamingReportWriter(log_dir, 'xxx_result', report_dir, 'Xxx_Report') as writer:
+            writer.write(text)
+    """
+
+    def __init__(self, log_directory: str, log_filename: str, report_directory: str, report_prefix: str,
+                 echo: bool = True):
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.log_path = os.path.join(log_directory, f"{log_filename}_{timestamp}.txt")
+        self.report_path = os.path.join(report_directory, f"{report_prefix}_{timestamp}.md")
+        self.echo = echo
+        self._files = []
+
+    def __enter__(self):
+        for path in (self.log_path, self.report_path):
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            self._files.append(open(path, 'w', encoding='utf-8'))
+        return self
+
+    def write(self, text: str):
+        if self.echo:
+            print(text, end='', flush=True)
+        for f in self._files:
+            f.write(text)
+            f.flush()
+
+    def __exit__(self, exc_type, exc, tb):
+        for f in self._files:
+            f.close()
+        if self.echo:
+            print()
+        if exc_type is not None:
+            print(f"⚠️ 输出中断，已接收的部分内容已保存至: {self.log_path} 和 {self.report_path}")
+            return False
+        print(f"  - 内容已保存到: {self.log_path}")
+        print(f"\n📄 报告已成功保存至: {self.report_path}")
+        return False
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+"""
+工作流的分阶段性能指标记录。
+
+每个阶段记录墙钟耗时、CPU耗时（含已结束的子进程，如并行加载的工作进程）和峰值常驻内存(RSS)，
+以及调用方附加的行数、Token用量、缓存命中等计数。结果以JSON保存在报告旁边，便于容量规划和回归告警。
+
+峰值内存在Linux上读取 /proc/self/status 的 VmHWM，并在每个阶段开始时通过 /proc/self/clear_refs 重置，
+因此为该阶段内的峰值；无法重置时退化为进程启动以来的峰值。子进程的内存不计入。
+没有 /proc 的平台（如macOS）使用 resource 模块；Windows 上没有该模块，峰值内存记为0。
+"""
+
+import os
+import sys
+import json
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, Optional
+
+def _reset_peak_rss() -> bool:
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def _peak_rss_mb() -> float:
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    # ru_maxrss 在Linux上以KB为单位，在macOS上以字节为单位
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+def _cpu_seconds() -> float:
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+class WorkflowMetrics:
+    """
+    记录一次工作流运行的分阶段指标。
+
+    用法：
+        metrics = WorkflowMetrics('comparison')
+        with metrics.stage('diff') as stage:
+            ...
+            stage['changes'] = len(diff_result.changes)
+        metrics.save(report_dir, 'Precise_Comparison_Metrics', success=True)
+    """
+
+    def __init__(self, workflow: str):
+        self.workflow = workflow
+        self.started_at = datetime.now()
+        self._start_wall = time.perf_counter()
+        self._start_cpu = _cpu_seconds()
+        self.stages = []
+        self.counters: Dict = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[Dict]:
+        """计时一个阶段；产出的字典用于附加该阶段的计数，阶段出错时同样记录并标注。"""
+        record = {'stage': name}
+        peak_is_per_stage = _reset_peak_rss()
+        start_wall, start_cpu = time.perf_counter(), _cpu_seconds()
+        try:
+            yield record
+        except BaseException:
+            record['failed'] = True
+            raise
+        finally:
+            record['wall_seconds'] = round(time.perf_counter() - start_wall, 4)
+            record['cpu_seconds'] = round(_cpu_seconds() - start_cpu, 4)
+            record['peak_rss_mb'] = round(_peak_rss_mb(), 1)
+            record['peak_rss_scope'] = 'stage' if peak_is_per_stage else 'process'
+            self.stages.append(record)
+
+    def add(self, **counters):
+        """附加运行级的计数（如Token用量、缓存命中）。"""
+        self.counters.update(counters)
+
+    def to_dict(self, success: bool) -> Dict:
+        return {
+            'workflow': self.workflow,
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'success': success,
+            'wall_seconds': round(time.perf_counter() - self._start_wall, 4),
+            'cpu_seconds': round(_cpu_seconds() - self._start_cpu, 4),
+            'stages': self.stages,
+            **self.counters,
+        }
+
+    def save(self, directory: str, prefix: str, success: bool) -> Optional[str]:
+        """将指标保存为带时间戳的JSON文件。"""
+        try:
+            os.makedirs(directory, exist_ok=True)
+            timestamp = self.started_at.strftime('%Y%m%d_%H%M%S')
+            filepath = os.path.join(directory, f"{prefix}_{timestamp}.json")
+            with open(filepath, 'w', encoding='utf-8') as f:
+                json.dump(self.to_dict(success), f, ensure_ascii=False, indent=2)
+            print(f"📊 运行指标已保存至: {filepath}")
+            return filepath
+        except (IOError, TypeError, ValueError) as e:
+            print(f"❌ 保存运行指标失败: {e}")
+            return None
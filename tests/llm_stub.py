@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+"""
+测试用的本地 OpenAI 兼容桩服务（/chat/completions），无需联网。
+
+    - 按请求内容决定回复，可为匹配的请求预设若干次错误状态码（如 429、503）；
+    - 记录所有请求及同时处理中的最大请求数，用于检查并发上限；
+    - 支持 `stream=True` 的 SSE 响应，可在指定位置写入损坏的数据块以模拟中途失败。
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+
+class StubLLMServer:
+    """
+    Args:
+        reply: 根据用户Prompt生成回复内容的函数。
+        failures: {Prompt中的子串: [状态码, ...]}，匹配的请求依次返回这些错误状态码，用完后正常回复。
+        delay: 非流式请求的处理耗时（秒）。
+        stream_parts: 流式响应依次发送的内容片段。
+        first_token_delay / part_delay: 流式响应首个片段前、各片段之间的等待时间（秒）。
+        fail_after: 流式响应在发送该数量的片段后写入损坏的数据块并断开连接。
+    """
+
+    def __init__(
+        self, reply: Optional[Callable[[str], str]] = None, failures: Optional[Dict[str, List[int]]] = None,
+        delay: float = 0.0, stream_parts: Optional[List[str]] = None, first_token_delay: float = 0.0,
+        part_delay: float = 0.0, fail_after: Optional[int] = None
+    ):
+        self.reply = reply or (lambda prompt: f"已分析 {len(prompt)} 字符")
+        self.failures = {key: list(codes) for key, codes in (failures or {}).items()}
+        self.delay = delay
+        self.stream_parts = stream_parts or []
+        self.first_token_delay = first_token_delay
+        self.part_delay = part_delay
+        self.fail_after = fail_after
+        self.requests = []  # (用户Prompt, 状态码)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._server.shutdown()
+        self._server.server_close()
+        return False
+
+    def prompts(self, status: Optional[int] = None) -> List[str]:
+        """返回收到的用户Prompt，提供 `status` 时只返回以该状态码响应的请求。"""
+        return [prompt for prompt, code in self.requests if status is None or code == status]
+
+    def _next_status(self, prompt: str) -> int:
+        with self._lock:
+            for key, codes in self.failures.items():
+                if key in prompt and codes:
+                    return codes.pop(0)
+        return 200
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status: int, payload: Dict):
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_event(self, payload):
+                data = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)
+                self.wfile.write(f"data: {data}\n\n".encode('utf-8'))
+                self.wfile.flush()
+
+            def _stream(self):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                self.close_connection = True
+                time.sleep(stub.first_token_delay)
+                for i, part in enumerate(stub.stream_parts):
+                    if stub.fail_after is not None and i == stub.fail_after:
+                        self._send_event('{broken json')
+                        return
+                    if i:
+                        time.sleep(stub.part_delay)
+                    self._send_event({
+                        'id': 'stub', 'object': 'chat.completion.chunk', 'created': 0, 'model': 'stub',
+                        'choices': [{'index': 0, 'delta': {'content': part}, 'finish_reason': None}],
+                    })
+                n_parts = len(stub.stream_parts)
+                self._send_event({
+                    'id': 'stub', 'object': 'chat.completion.chunk', 'created': 0, 'model': 'stub', 'choices': [],
+                    'usage': {'prompt_tokens': 10, 'completion_tokens': n_parts, 'total_tokens': 10 + n_parts},
+                })
+                self._send_event('[DONE]')
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                prompt = body['messages'][-1]['content']
+                status = stub._next_status(prompt)
+                with stub._lock:
+                    stub.requests.append((prompt, status))
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                try:
+                    if status != 200:
+                        self._send_json(status, {'error': {'message': f'stub error {status}', 'type': 'stub'}})
+                    elif body.get('stream'):
+                        self._stream()
+                    else:
+                        time.sleep(stub.delay)
+                        self._send_json(200, {
+                            'id': 'stub', 'object': 'chat.completion', 'created': 0, 'model': 'stub',
+                            'choices': [{'index': 0, 'finish_reason': 'stop',
+                                         'message': {'role': 'assistant', 'content': stub.reply(prompt)}}],
+                            'usage': {'prompt_tokens': 10, 'completion_tokens': 5, 'total_tokens': 15},
+                        })
+                finally:
+                    with stub._lock:
+                        stub.in_flight -= 1
+
+        return Handler
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+"""Map-Reduce 分析的分块、并发上限、重试退避与汇总测试（使用本地桩服务，无需联网）。"""
+
+import asyncio
+import io
+import os
+import re
+import unittest
+import contextlib
+from unittest import mock
+
+import pandas as pd
+
+from src.analysis import comparison
+from src.llm import map_reduce
+from tests.llm_stub import StubLLMServer
+
+KEY_COLUMNS = ['省份', '编码']
+PROVINCES = ['A', 'B', 'C', 'D', 'E']
+REDUCE_REPLY = '最终综合报告'
+
+
+def _make_diff(rows_per_province: int = 4) -> comparison.DiffResult:
+    """每个省份的每条记录都修改了电量，变更条数为 省份数 × rows_per_province。"""
+    keys = [(province, f'{i:04d}') for province in PROVINCES for i in range(rows_per_province)]
+    df_hist = pd.DataFrame(keys, columns=KEY_COLUMNS).assign(电量=[str(i) for i in range(len(keys))])
+    df_latest = df_hist.assign(电量=[str(i + 100) for i in range(len(keys))])
+    return comparison.compute_diff(df_hist, df_latest, KEY_COLUMNS, 'v1', 'v2')
+
+
+def _reply(prompt: str) -> str:
+    """分块请求回复 "结论[分块标签]"，汇总请求回复固定的最终报告。"""
+    match = re.search(r'\*\*分块范围\*\*: (.+)', prompt)
+    return f"结论[{match.group(1)}]" if match else REDUCE_REPLY
+
+
+def _llm_config(**map_reduce_settings) -> dict:
+    return {
+        'model_name': 'stub-model',
+        'system_prompts': {'comparison': '你是数据分析助手。'},
+        'response_cache': {'enabled': False},
+        'map_reduce': {'enabled': True, 'chunk_by': '省份', 'concurrency': 2, 'max_retries': 3,
+                       'backoff_seconds': 0.01, **map_reduce_settings},
+    }
+
+
+class SplitDiffResultTest(unittest.TestCase):
+    def test_one_chunk_per_province(self):
+        chunks = map_reduce.split_diff_result(_make_diff(), '省份', 100)
+        self.assertEqual([label for label, _ in chunks], [f"省份 = '{p}'" for p in PROVINCES])
+        self.assertTrue(all(len(chunk.changes) == 4 for _, chunk in chunks))
+
+    def test_large_groups_are_split_by_max_changes(self):
+        chunks = map_reduce.split_diff_result(_make_diff(), '省份', 3)
+        self.assertEqual(len(chunks), 2 * len(PROVINCES))
+        self.assertEqual(chunks[0][0], "省份 = 'A'（第 1/2 部分）")
+        self.assertEqual(chunks[1][0], "省份 = 'A'（第 2/2 部分）")
+        self.assertEqual(sum(len(chunk.changes) for _, chunk in chunks), 4 * len(PROVINCES))
+
+
+class MapReduceStubServerTest(unittest.TestCase):
+    def _run(self, stub: StubLLMServer, llm_config: dict):
+        """对桩服务执行 Map-Reduce 分析，返回 (结果, 用量, 退避等待时间列表)。"""
+        delays = []
+        sleep = asyncio.sleep
+
+        async def record_sleep(delay, *args, **kwargs):
+            delays.append(delay)
+            return await sleep(delay, *args, **kwargs)
+
+        usage = {}
+        env = {'DASHSCOPE_API_KEY': 'stub-key', 'LLM_BASE_URL': stub.base_url}
+        with mock.patch.dict(os.environ, env), \
+                mock.patch('src.llm.client.random.random', return_value=0.0), \
+                mock.patch('src.llm.client.asyncio.sleep', record_sleep), \
+                contextlib.redirect_stdout(io.StringIO()):
+            result = map_reduce.run_map_reduce_analysis(_make_diff(), 'v1', 'v2', llm_config, usage)
+        return result, usage, delays
+
+    def test_chunks_concurrency_retry_and_reduce(self):
+        failures = {"**分块范围**: 省份 = 'B'": [429, 503]}
+        with StubLLMServer(reply=_reply, failures=failures, delay=0.2) as stub:
+            (reduce_prompt, findings, response), usage, delays = self._run(stub, _llm_config())
+
+        # 每个分块一个请求，加上 B 分块的两次重试和一次汇总请求
+        chunk_prompts = [prompt for prompt in stub.prompts(200) if '**分块范围**' in prompt]
+        self.assertEqual(len(chunk_prompts), len(PROVINCES))
+        self.assertEqual(len(stub.requests), len(PROVINCES) + 2 + 1)
+        self.assertEqual([code for _, code in stub.requests if code != 200], [429, 503])
+
+        # 并发上限为 2
+        self.assertEqual(stub.max_in_flight, 2)
+
+        # 429 与 503 后按指数退避重试：backoff * 2 ** attempt
+        self.assertEqual(delays, [0.01, 0.02])
+        self.assertEqual(dict(findings)["省份 = 'B'"], "结论[省份 = 'B']")
+
+        # 汇总请求在所有分块完成之后发出，包含全部分块结论，最终报告为汇总请求的回复
+        self.assertEqual(stub.requests[-1][0], reduce_prompt)
+        for province in PROVINCES:
+            self.assertIn(f"结论[省份 = '{province}']", reduce_prompt)
+        self.assertEqual(response, REDUCE_REPLY)
+        self.assertEqual(usage['total_tokens'], 15 * (len(PROVINCES) + 1))
+
+    def test_failed_chunk_is_marked_in_reduce_prompt(self):
+        failures = {"**分块范围**: 省份 = 'C'": [500] * 3}
+        with StubLLMServer(reply=_reply, failures=failures) as stub:
+            (reduce_prompt, findings, response), _, delays = self._run(stub, _llm_config(max_retries=2))
+
+        self.assertEqual(delays, [0.01, 0.02])
+        self.assertEqual([code for _, code in stub.requests if code != 200], [500, 500, 500])
+        self.assertIn('该分块分析失败', dict(findings)["省份 = 'C'"])
+        self.assertIn('该分块分析失败', reduce_prompt)
+        self.assertIn("结论[省份 = 'D']", reduce_prompt)
+        self.assertEqual(response, REDUCE_REPLY)
+
+    def test_all_chunks_failing_raises(self):
+        failures = {'**分块范围**': [500] * len(PROVINCES)}
+        with StubLLMServer(reply=_reply, failures=failures) as stub:
+            with self.assertRaises(RuntimeError):
+                self._run(stub, _llm_config(max_retries=0))
+        self.assertFalse(any('（汇总）' in prompt for prompt in stub.prompts()))
+
+
+if __name__ == '__main__':
+    unittest.main()
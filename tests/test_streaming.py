@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+"""流式分析输出的测试：逐片段写入报告、中途失败时保留已接收内容、首Token耗时记录（使用本地SSE桩服务）。"""
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import contextlib
+from unittest import mock
+
+from src.core import workflow
+from src.llm.client import get_llm_client, stream_llm_analysis
+from src.utils.file_handler import StreamingReportWriter
+from src.utils.metrics import WorkflowMetrics
+from tests.llm_stub import StubLLMServer
+
+PARTS = ['## 分析报告\n', '第一段内容。', '第二段内容。', '第三段', '内容。\n', '结束。']
+
+
+class StreamingReportTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.log_dir = os.path.join(self.tmp_dir, 'logs')
+        self.report_dir = os.path.join(self.tmp_dir, 'reports')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _env(self, stub: StubLLMServer):
+        return mock.patch.dict(os.environ, {'DASHSCOPE_API_KEY': 'stub-key', 'LLM_BASE_URL': stub.base_url})
+
+    def _stream_to_writer(self, stub: StubLLMServer):
+        """流式请求桩服务并写入报告，返回 (写入器, 每次写入后两个文件的内容, 结果或异常)。"""
+        snapshots = []
+        with self._env(stub), contextlib.redirect_stdout(io.StringIO()):
+            writer = StreamingReportWriter(self.log_dir, 'result', self.report_dir, 'Report', echo=False)
+
+            def on_token(text: str):
+                writer.write(text)
+                snapshots.append(tuple(_read(path) for path in (writer.log_path, writer.report_path)))
+
+            try:
+                with writer:
+                    outcome = stream_llm_analysis(get_llm_client(), 'stub-model', '系统', '用户', on_token)
+            except Exception as e:
+                outcome = e
+        return writer, snapshots, outcome
+
+    def test_report_is_written_incrementally(self):
+        with StubLLMServer(stream_parts=PARTS, part_delay=0.02) as stub:
+            writer, snapshots, (content, timings) = self._stream_to_writer(stub)
+
+        self.assertEqual(content, ''.join(PARTS))
+        # 每个片段到达后两个文件都已包含截至该片段的全部内容，而不是在结束时一次性写入
+        self.assertEqual(snapshots, [(''.join(PARTS[:i + 1]),) * 2 for i in range(len(PARTS))])
+        self.assertEqual(_read(writer.log_path), content)
+        self.assertEqual(_read(writer.report_path), content)
+        self.assertEqual(timings['usage']['completion_tokens'], len(PARTS))
+
+    def test_partial_output_survives_mid_stream_failure(self):
+        with StubLLMServer(stream_parts=PARTS, fail_after=3) as stub:
+            writer, snapshots, error = self._stream_to_writer(stub)
+
+        self.assertIsInstance(error, Exception)
+        self.assertEqual(len(snapshots), 3)
+        self.assertEqual(_read(writer.log_path), ''.join(PARTS[:3]))
+        self.assertEqual(_read(writer.report_path), ''.join(PARTS[:3]))
+
+    def test_time_to_first_token_is_recorded(self):
+        with StubLLMServer(stream_parts=PARTS, first_token_delay=0.3, part_delay=0.05) as stub:
+            _, _, (_, timings) = self._stream_to_writer(stub)
+
+        self.assertGreaterEqual(timings['ttft_seconds'], 0.3)
+        self.assertGreater(timings['total_seconds'], timings['ttft_seconds'])
+
+    def test_workflow_records_ttft_in_metrics(self):
+        llm_config = {'model_name': 'stub-model', 'streaming': {'enabled': True}, 'response_cache': {'enabled': False}}
+        output_config = {'log_directory': self.log_dir, 'report_directory': self.report_dir}
+        metrics = WorkflowMetrics('comparison')
+        with StubLLMServer(stream_parts=PARTS, first_token_delay=0.2) as stub:
+            with self._env(stub), contextlib.redirect_stdout(io.StringIO()):
+                response = workflow._request_and_save_analysis(
+                    '用户', '系统', llm_config, output_config, 'result', 'Report', metrics
+                )
+
+        self.assertEqual(response, ''.join(PARTS))
+        stage = metrics.stages[-1]
+        self.assertEqual(stage['stage'], 'llm')
+        self.assertTrue(stage['streaming'])
+        self.assertGreaterEqual(stage['ttft_seconds'], 0.2)
+        self.assertGreater(stage['stream_total_seconds'], stage['ttft_seconds'])
+        reports = os.listdir(self.report_dir)
+        self.assertEqual(len(reports), 1)
+        self.assertEqual(_read(os.path.join(self.report_dir, reports[0])), response)
+
+
+def _read(path: str) -> str:
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+if __name__ == '__main__':
+    unittest.main()
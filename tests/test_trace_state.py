@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+"""增量追溯状态与全量计算的一致性测试。"""
+
+import io
+import os
+import tempfile
+import unittest
+import contextlib
+import numpy as np
+import pandas as pd
+
+from src.analysis import comparison, historical, trace_state
+from src.data.keys import encode_key_columns
+from src.data.schema import apply_schema
+
+KEY_COLUMNS = ['省份', '编码']
+VALUE_COLUMN = '电量'
+SCHEMA_CONFIG = {'enabled': True, 'infer': True}
+
+
+def _make_versions(n_versions: int, n_keys: int, seed: int):
+    """生成带有空单元格、缺失键和数值变化的多个版本（全字符串，与读取器的输出一致）。"""
+    rng = np.random.default_rng(seed)
+    base = rng.integers(1, 50, n_keys).astype(float)
+    frames = []
+    for _ in range(n_versions):
+        values = base.copy()
+        changed = rng.random(n_keys) < 0.2
+        values[changed] += rng.normal(0, 3, changed.sum()).round(1)
+        text = ['' if blank else format(value, 'g') for value, blank in zip(values, rng.random(n_keys) < 0.1)]
+        df = pd.DataFrame({
+            '省份': [f'P{i % 5}' for i in range(n_keys)],
+            '编码': [f'{i:04d}' for i in range(n_keys)],
+            VALUE_COLUMN: text,
+        })
+        frames.append(df[rng.random(n_keys) > 0.1].reset_index(drop=True))
+    return frames
+
+
+class IncrementalTraceTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _tasks(self, n_versions: int):
+        tasks = []
+        for i in range(n_versions):
+            path = os.path.join(self._tmp.name, f'v{i}.xlsx')
+            with open(path, 'w') as f:
+                f.write(str(i))
+            tasks.append({'file': path})
+        return tasks
+
+    def _full(self, frames, tolerance: float):
+        """与 `execute_historical_workflow` 的非增量路径相同的计算。"""
+        frames = apply_schema(frames, KEY_COLUMNS, SCHEMA_CONFIG)
+        key_index, frames = encode_key_columns(frames, KEY_COLUMNS)
+        names = [f'v{i}' for i in range(len(frames))]
+        nway = comparison.compute_nway_diff(
+            frames, KEY_COLUMNS, names, key_index, {VALUE_COLUMN: tolerance} if tolerance else {}
+        )
+        keys_df, values, present = nway.version_matrix(VALUE_COLUMN)
+        trace_df = historical.score_trace_matrix(keys_df, values, present, None, key_index, tolerance)
+        return trace_df, nway.summary_line([VALUE_COLUMN])
+
+    def _incremental(self, frames, tasks, tolerance: float):
+        """每次运行追加一个版本，模拟逐个到达的新版本。"""
+        state_dir = os.path.join(self._tmp.name, f'state_{tolerance}')
+        for i, df in enumerate(frames):
+            stored = trace_state.prepare_trace_state(state_dir, tasks[:i + 1], KEY_COLUMNS, VALUE_COLUMN, tolerance)
+            self.assertEqual(stored, i)
+            trace_state.append_version(state_dir, df, tasks[i], f'v{i}')
+        trace_df = trace_state.generate_trace_table_from_state(state_dir, None, tolerance)
+        return trace_df, trace_state.summarize_first_last(state_dir, tolerance)
+
+    def test_matches_full_computation_with_blank_cells(self):
+        for tolerance in (0.0, 0.5):
+            with self.subTest(tolerance=tolerance):
+                frames = _make_versions(n_versions=4, n_keys=300, seed=7)
+                self.assertTrue(any((df[VALUE_COLUMN] == '').any() for df in frames))
+                with contextlib.redirect_stdout(io.StringIO()):
+                    full_trace, full_summary = self._full(frames, tolerance)
+                    inc_trace, inc_summary = self._incremental(frames, self._tasks(len(frames)), tolerance)
+                self.assertEqual(inc_summary, full_summary)
+                pd.testing.assert_frame_equal(inc_trace.astype(str), full_trace[inc_trace.columns].astype(str))
+
+    def test_blank_in_first_and_last_version_is_not_modified(self):
+        frames = [
+            pd.DataFrame({'省份': ['A', 'A'], '编码': ['1', '2'], VALUE_COLUMN: ['', '5']}),
+            pd.DataFrame({'省份': ['A', 'A'], '编码': ['1', '2'], VALUE_COLUMN: ['3', '5']}),
+            pd.DataFrame({'省份': ['A', 'A'], '编码': ['1', '2'], VALUE_COLUMN: ['', '5']}),
+        ]
+        with contextlib.redirect_stdout(io.StringIO()):
+            _, summary = self._incremental(frames, self._tasks(len(frames)), 0.0)
+            _, full_summary = self._full(frames, 0.0)
+        self.assertEqual(summary, full_summary)
+        self.assertIn('【修改】0条', summary)
+
+
+if __name__ == '__main__':
+    unittest.main()